@@ -0,0 +1,31 @@
+import importlib
+
+# Public names are imported on first access, so that importing the package
+# (or a single module from it) does not pull in pydantic or celery unless
+# they are actually used.
+_LAZY_ATTRIBUTES = {
+    'AppConfigurator': 'flask_container_scaffold.app_configurator',
+    'AppScaffold': 'flask_container_scaffold.app_scaffold',
+    'BaseApiModel': 'flask_container_scaffold.base',
+    'BaseApiView': 'flask_container_scaffold.base',
+    'BaseScaffold': 'flask_container_scaffold.base_scaffold',
+    'CeleryScaffold': 'flask_container_scaffold.celery_scaffold',
+    'json_array_response': 'flask_container_scaffold.responses',
+    'json_response': 'flask_container_scaffold.responses',
+    'ndjson_response': 'flask_container_scaffold.responses',
+    'parse_body': 'flask_container_scaffold.validation',
+    'parse_input': 'flask_container_scaffold.validation',
+    'parse_input_async': 'flask_container_scaffold.validation',
+}
+
+__all__ = sorted(_LAZY_ATTRIBUTES)
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        return getattr(importlib.import_module(_LAZY_ATTRIBUTES[name]), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -1,9 +1,118 @@
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from types import SimpleNamespace
+
+from flask_container_scaffold.config_cache import file_cache
 from flask_container_scaffold.util import load_yaml, load_cfg
 
 
+class IncludeCycleError(ValueError):
+    """
+    Raised when custom settings files include each other in a loop.
+    """
+
+    def __init__(self, cycle):
+        self.cycle = cycle
+        super().__init__('Custom settings files include each other: ' +
+                         ' -> '.join(cycle))
+
+
+class IncludeNode(object):
+    """
+    A single file in an IncludeGraph.
+
+    :ivar str path: The resolved path of the file
+    :ivar str file_type: The type of the file, eg. 'yml' or 'cfg'
+    :ivar list includes: Paths of the files this file references
+    :ivar list included_by: Paths of the files that reference this file
+    :ivar float parse_time: Seconds spent reading and parsing the file the
+        last time it was loaded
+    :ivar int reused: How many times an already parsed copy of the file was
+        reused rather than parsing it again
+    """
+
+    def __init__(self, path, file_type):
+        self.path = path
+        self.file_type = file_type
+        self.includes = []
+        self.included_by = []
+        self.parse_time = None
+        self.reused = 0
+
+    def __repr__(self):
+        return (f'IncludeNode({self.path!r}, parse_time={self.parse_time}, '
+                f'reused={self.reused})')
+
+
+class IncludeGraph(object):
+    """
+    Records which custom settings files were loaded, which files included
+    them, and how long each took to parse.
+    """
+
+    def __init__(self):
+        # All files, in the order they were first reached
+        self.nodes = OrderedDict()
+        # Files referenced directly from CUSTOM_SETTINGS
+        self.roots = []
+
+    def add(self, parent, path, file_type):
+        """
+        Record that parent (or CUSTOM_SETTINGS itself, if parent is None)
+        references path.
+
+        :return: The IncludeNode for path
+        """
+        node = self.nodes.get(path)
+        if node is None:
+            node = self.nodes[path] = IncludeNode(path, file_type)
+        if parent is None:
+            if path not in self.roots:
+                self.roots.append(path)
+        else:
+            if path not in self.nodes[parent].includes:
+                self.nodes[parent].includes.append(path)
+            if parent not in node.included_by:
+                node.included_by.append(parent)
+        return node
+
+    def merge(self, other):
+        """
+        Replace the nodes in this graph with those of another graph, keeping
+        the files that included them here.
+        """
+        for path, node in other.nodes.items():
+            existing = self.nodes.get(path)
+            if existing is not None:
+                node.included_by = existing.included_by
+            self.nodes[path] = node
+
+    def format(self):
+        """
+        Render the graph as an indented tree, with the parse time of each
+        file, for logging or debugging.
+        """
+        lines = []
+
+        def render(path, depth):
+            node = self.nodes[path]
+            parse_time = ('-' if node.parse_time is None
+                          else f'{node.parse_time * 1000:.2f}ms')
+            lines.append(f"{'  ' * depth}{path} [{parse_time}]")
+            for child in node.includes:
+                render(child, depth + 1)
+
+        for root in self.roots:
+            render(root, 0)
+        return '\n'.join(lines)
+
+
 class AppConfigurator(object):
 
-    def __init__(self, app, relative=True):
+    def __init__(self, app, relative=True, cache=file_cache,
+                 max_workers=None):
         """
         This class handles loading and parsing of custom configuration
         for your Flask app.
@@ -12,42 +121,117 @@ class AppConfigurator(object):
         :param bool relative: Whether filenames found in configuration are
             assumed to be relative to instance path rather than application
             root.
+        :param ConfigFileCache cache: Cache used to avoid re-parsing files
+            that have not changed. Defaults to the process-wide cache, pass
+            None to always read files from disk.
+        :param int max_workers: If greater than 1, the files referenced by a
+            dictionary are read and parsed concurrently on a thread pool of
+            this size. They are still merged into the config one at a time,
+            in order, so the result is the same as loading them sequentially.
         """
         self.app = app
         self.relative = relative
+        self.cache = cache
+        self.max_workers = max_workers
+        # Whether files that fail to parse raise, rather than loading as
+        # empty. Set when reloading, so a broken file can not remove keys.
+        self.strict = False
+        self._executor = None
+        self._pending = {}
+        # Every file loaded, in the order it was applied to the config,
+        # mapped to its file type and the top level keys it set.
+        self.loaded_files = OrderedDict()
+        self.include_graph = IncludeGraph()
+        # Settings overridden from the environment, applied on top of any
+        # reloaded keys. See flask_container_scaffold.overrides.
+        self.overrides = {}
+        # Files parsed during the current call to parse, and the chain of
+        # files currently being loaded, used to find include cycles.
+        self._parsed = {}
+        self._loading = []
 
     def parse(self, custom):
         """
         Parse any custom configuration passed in for the app
 
+        Each file is only parsed once per call, however many times it is
+        referenced, and every file loaded is recorded in include_graph.
+
         :param obj custom: A String or dictionary to parse and add to the
             application config.
+        :raises: IncludeCycleError if files include each other in a loop
         """
+        try:
+            if not (self.max_workers or 0) > 1:
+                self._parse(custom)
+                return
+            with ThreadPoolExecutor(self.max_workers) as executor:
+                self._executor = executor
+                try:
+                    self._parse(custom)
+                finally:
+                    self._executor = None
+                    for future in self._pending.values():
+                        future.cancel()
+                    self._pending.clear()
+        finally:
+            self._parsed = {}
+            self._loading = []
+
+    def _parse(self, custom):
         if isinstance(custom, dict):
+            if self._executor is not None:
+                self._prefetch(custom)
             for key in custom:
-                self.parse(custom[key])
+                self._parse(custom[key])
         else:
             self._parse_conf_item(custom)
 
+    def _prefetch(self, custom):
+        """
+        Start reading every file referenced anywhere in a dictionary on the
+        thread pool, so they are ready by the time they are merged.
+        """
+        for value in custom.values():
+            if isinstance(value, dict):
+                self._prefetch(value)
+                continue
+            file_type = self._file_type(value)
+            if file_type is None:
+                continue
+            path = self._detect_path(value)
+            if path not in self._pending and path not in self._parsed:
+                self._pending[path] = self._executor.submit(
+                    self._timed_read, path, file_type)
+
     def _parse_conf_item(self, item):
         """
         Check if the config item is a string pointing to a file.
         If it is, and we support the filetype, call the appropriate
         function to add the contents of the file to app.config object
         """
-        supported_extensions = ['cfg', 'yaml', 'yml']
-        if isinstance(item, str):
-            item_type = item.rsplit(".")[-1]
-        else:
-            item_type = 'not a file'
+        item_type = self._file_type(item)
         # If this is a file reference, and we support the type,
         # detect the path, and the read the file and add the contents
         # to the app config.
-        if item_type in supported_extensions:
+        if item_type is not None:
             item = self._detect_path(item)
             self._add_to_config(item, item_type)
         return item
 
+    @staticmethod
+    def _file_type(item):
+        """
+        Return the type of file a config item references, or None if it is
+        not a reference to a file type we support.
+        """
+        supported_extensions = ['cfg', 'yaml', 'yml']
+        if isinstance(item, str):
+            item_type = item.rsplit(".")[-1]
+            if item_type in supported_extensions:
+                return item_type
+        return None
+
     def _detect_path(self, path):
         """
         When preparing to parse a file, determine if we have a explicit path
@@ -67,10 +251,105 @@ class AppConfigurator(object):
         """
         Call the appropriate parser based on filetype
         """
+        if file in self._loading:
+            cycle = self._loading[self._loading.index(file):] + [file]
+            raise IncludeCycleError(cycle)
+        parent = self._loading[-1] if self._loading else None
+        node = self.include_graph.add(parent, file, file_type)
+        if file in self._parsed:
+            current_dict = self._parsed[file]
+            node.reused += 1
+        else:
+            pending = self._pending.pop(file, None)
+            if pending is not None:
+                current_dict, node.parse_time = pending.result()
+            else:
+                current_dict, node.parse_time = self._timed_read(file,
+                                                                 file_type)
+            self._parsed[file] = current_dict
+        self._loading.append(file)
+        try:
+            self._parse(current_dict)
+        finally:
+            self._loading.pop()
+        self.app.config.update(current_dict)
+        self.loaded_files.pop(file, None)
+        self.loaded_files[file] = (file_type, list(current_dict))
+
+    def _timed_read(self, file, file_type):
+        """
+        Read and parse a file, returning its contents and the seconds taken
+        """
+        start = time.perf_counter()
+        current_dict = self._read_file(file, file_type)
+        return current_dict, time.perf_counter() - start
+
+    def _read_file(self, file, file_type):
+        """
+        Read and parse a file, based on its type
+        """
         current_dict = {}
         if file_type in ['yaml', 'yml']:
-            current_dict = load_yaml(file)
+            current_dict = self._load_file(
+                file, partial(load_yaml, strict=True) if self.strict
+                else load_yaml)
         elif file_type == 'cfg':
-            current_dict = load_cfg(file)
-        self.parse(current_dict)
-        self.app.config.update(current_dict)
+            current_dict = self._load_file(file, load_cfg)
+        return current_dict
+
+    def _load_file(self, file, loader):
+        """
+        Load a file with the given loader, going through the cache if enabled
+        """
+        if self.cache is None:
+            return loader(file)
+        return self.cache.load(file, loader)
+
+    def reload(self, path):
+        """
+        Re-parse a file that was previously loaded, along with any files it
+        includes, and swap the keys it owns into app.config in one update.
+        Keys that a later file overrides are left untouched, and keys that
+        were removed from the file are removed from app.config.
+
+        :param str path: The path of a file in loaded_files
+        :return: A sorted list of the keys that were updated or removed
+        :raises: KeyError if the file was never loaded by this configurator,
+            or the parser's error if it, or a file it includes, is invalid
+        """
+        file_type = self.loaded_files[path][0]
+        # Parse into a throwaway configurator, so nothing is applied to the
+        # real config until the whole file has been read successfully.
+        staging = AppConfigurator(
+            SimpleNamespace(config={}, instance_path=self.app.instance_path),
+            self.relative, self.cache)
+        staging.strict = True
+        staging._add_to_config(path, file_type)
+        old_owners = self._key_owners()
+        self.include_graph.merge(staging.include_graph)
+        self.loaded_files.update(staging.loaded_files)
+        owners = self._key_owners()
+        updates = {key: value for key, value in staging.app.config.items()
+                   if owners.get(key) in staging.loaded_files}
+        removed = [key for key, owner in old_owners.items()
+                   if owner in staging.loaded_files and key not in owners]
+        if self.overrides:
+            from flask_container_scaffold.overrides import merge_overrides
+
+            merge_overrides(updates, {key: override for key, override
+                                      in self.overrides.items()
+                                      if key in updates})
+        self.app.config.update(updates)
+        for key in removed:
+            self.app.config.pop(key, None)
+        return sorted(list(updates) + removed)
+
+    def _key_owners(self):
+        """
+        Map each top level key to the last loaded file that set it
+        """
+        owners = {}
+        for file, (_, keys) in self.loaded_files.items():
+            for key in keys:
+                owners[key] = file
+        return owners
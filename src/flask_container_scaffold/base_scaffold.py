@@ -51,11 +51,296 @@ class BaseScaffold(object):
         self.config = config
         self.silent = not settings_required
         self.relative = instance_relative_config
+        self.configurator = None
+        self.settings_watcher = None
+        # A read only view of the config, see build_settings
+        self.settings = None
+        # Every settings file read while configuring the app
+        self.config_sources = []
+        self._finalized = False
         self._init_app()
 
     def _init_app(self):
-        self._load_flask_settings()
-        self._load_custom_settings()
+        from flask_container_scaffold.logging import mark_request_start
+
+        if not self._load_config_snapshot():
+            self._load_flask_settings()
+            self._load_custom_settings()
+        if self.env_prefix():
+            self.apply_env_overrides()
+        if self.flask_app.config.get('SCAFFOLD_TRUSTED_PROXIES'):
+            from flask_container_scaffold.network import trusted_networks
+
+            # Compiled, and cached for requests, now, so that an invalid
+            # address fails at startup rather than on every request.
+            try:
+                trusted_networks(
+                    self.flask_app.config['SCAFFOLD_TRUSTED_PROXIES'])
+            except ValueError as exc:
+                raise ValueError(
+                    f'Invalid SCAFFOLD_TRUSTED_PROXIES: {exc}') from exc
+        # Lets metrics and log formatters report how long a request has been
+        # running. Registered before any other hooks, so that they are
+        # included, and only once per app.
+        if ((self.flask_app.config.get('SCAFFOLD_METRICS') or
+             self.flask_app.config.get('SCAFFOLD_LOG_LATENCY')) and
+                mark_request_start not in (
+                    self.flask_app.before_request_funcs.get(None, ()))):
+            self.flask_app.before_request(mark_request_start)
+        if (self.flask_app.config.get('SCAFFOLD_FROZEN_SETTINGS') or
+                self.flask_app.config.get('SCAFFOLD_SETTINGS_SCHEMA')):
+            self.build_settings()
+        # An app shared with another scaffold may already be instrumented.
+        if (self.flask_app.config.get('SCAFFOLD_INSTRUMENTATION') and
+                'scaffold_instrumentation' not in self.flask_app.extensions):
+            from flask_container_scaffold.instrumentation import (
+                RequestInstrumentation)
+
+            RequestInstrumentation(self.flask_app, server_timing=(
+                self.flask_app.config.get('SCAFFOLD_SERVER_TIMING', True)))
+        # An app shared with another scaffold may already have metrics.
+        if (self.flask_app.config.get('SCAFFOLD_METRICS') and
+                'scaffold_metrics' not in self.flask_app.extensions):
+            from flask_container_scaffold.metrics import ScaffoldMetrics
+
+            ScaffoldMetrics(
+                self.flask_app,
+                directory=self.flask_app.config.get('SCAFFOLD_METRICS_DIR'),
+                path=self.flask_app.config.get('SCAFFOLD_METRICS_PATH',
+                                               '/metrics'))
+        if self.flask_app.config.get('SCAFFOLD_WATCH_SETTINGS'):
+            self.watch_custom_settings(
+                self.flask_app.config.get('SCAFFOLD_WATCH_INTERVAL', 1.0))
+
+    def watch_custom_settings(self, interval=1.0, use_inotify=True):
+        """
+        Start watching the custom settings files that were loaded, reloading
+        any that change into app.config without restarting the process.
+        This is also started automatically if the SCAFFOLD_WATCH_SETTINGS
+        setting is true. Subscribe to
+        flask_container_scaffold.signals.custom_settings_reloaded to be told
+        when a reload happens.
+
+        :param float interval: Seconds between checks, if polling is used
+            because inotify is unavailable.
+        :param bool use_inotify: Set to False to always poll.
+        :return: The running SettingsWatcher
+        """
+        from flask_container_scaffold.watcher import SettingsWatcher
+
+        if self.settings_watcher is None:
+            self.settings_watcher = SettingsWatcher(self.configurator,
+                                                    interval=interval,
+                                                    use_inotify=use_inotify)
+        return self.settings_watcher.start()
+
+    def build_settings(self, schema=None):
+        """
+        Build a read only, attribute access view of the app's config, as
+        scaffold.settings (and for request code, as
+        flask_container_scaffold.settings.get_settings()). It is rebuilt
+        whenever the settings watcher reloads a file. This is done
+        automatically if the SCAFFOLD_FROZEN_SETTINGS or
+        SCAFFOLD_SETTINGS_SCHEMA setting is set.
+
+        Without a schema, the config is frozen into nested FrozenSettings.
+        With one, the config is validated against it, so misconfiguration
+        fails at startup rather than on first use, and the validated object
+        is used as the settings. Make the schema frozen, eg. with
+        model_config = ConfigDict(frozen=True), for it to be read only.
+
+        :param schema: A pydantic model (or any type pydantic can validate)
+            or an import path to one, eg. 'myapp.config:Settings'. Defaults
+            to the SCAFFOLD_SETTINGS_SCHEMA setting.
+        :return: The settings
+        :raises: pydantic.ValidationError if the config does not match schema
+        """
+        from flask_container_scaffold.signals import custom_settings_reloaded
+
+        app = self.flask_app
+        if schema is None:
+            schema = app.config.get('SCAFFOLD_SETTINGS_SCHEMA')
+        self._settings_schema = self._resolve_schema(schema)
+        self._set_settings()
+        custom_settings_reloaded.connect(self._rebuild_settings, app)
+        return self.settings
+
+    @staticmethod
+    def _resolve_schema(schema):
+        if isinstance(schema, str):
+            from werkzeug.utils import import_string
+
+            return import_string(schema)
+        return schema
+
+    def _set_settings(self):
+        app = self.flask_app
+        if self._settings_schema is None:
+            from flask_container_scaffold.settings import freeze_settings
+
+            settings = freeze_settings(app.config)
+        else:
+            from flask_container_scaffold.validation import get_validator
+
+            settings = get_validator(self._settings_schema).validate_python(
+                dict(app.config))
+        # Readers hold on to whichever object they looked up, so swapping in
+        # the new one is safe without locking.
+        self.settings = app.extensions['scaffold_settings'] = settings
+
+    def _rebuild_settings(self, sender, **kwargs):
+        try:
+            self._set_settings()
+        except Exception:
+            self.flask_app.logger.exception(
+                'Reloaded settings are invalid, keeping the previous ones')
+
+    def env_prefix(self):
+        """
+        :return: The prefix of environment variables that override settings,
+            from SCAFFOLD_ENV_PREFIX in the config mapping or the environment,
+            or None if overrides are disabled.
+        """
+        return ((self.config or {}).get('SCAFFOLD_ENV_PREFIX') or
+                os.environ.get('SCAFFOLD_ENV_PREFIX'))
+
+    def apply_env_overrides(self, prefix=None, schema=None):
+        """
+        Override individual settings from environment variables, after every
+        settings file has been loaded. This is done automatically if the
+        SCAFFOLD_ENV_PREFIX setting is set. With a prefix of SCAFFOLD,
+        SCAFFOLD__DB__POOL_SIZE=20 sets app.config['DB']['pool_size'] to 20,
+        matching keys without regard to case and converting the value to the
+        type of the setting it replaces. Overridden settings keep their value
+        when the file that set them is reloaded.
+
+        :param str prefix: Defaults to env_prefix()
+        :param schema: A pydantic model whose field types the values are
+            converted to, or an import path to one. Defaults to the
+            SCAFFOLD_SETTINGS_SCHEMA setting.
+        :return: The overrides applied, as a dict
+        :raises: ValueError if a value can not be converted
+        """
+        from flask_container_scaffold.overrides import (merge_overrides,
+                                                        read_env_overrides)
+
+        config = self.flask_app.config
+        if schema is None:
+            schema = config.get('SCAFFOLD_SETTINGS_SCHEMA')
+        overrides = read_env_overrides(prefix or self.env_prefix(), config,
+                                       self._resolve_schema(schema))
+        merge_overrides(config, overrides)
+        self.configurator.overrides = overrides
+        return overrides
+
+    def finalize(self, models=(), freeze=True):
+        """
+        Prepare the scaffold to be shared by forked worker processes, eg.
+        under gunicorn --preload. Call this last, once the app and its views
+        have been set up, in the process that forks.
+
+        The validators parse_input uses are built for the given models and
+        for every BaseApiView subclass defined so far, so workers do not each
+        build their own. Everything is then frozen out of the garbage
+        collector's reach, so memory shared with the workers is not copied
+        into each of them as the collector runs. In each forked worker,
+        anything that does not survive a fork, like the settings watcher, is
+        started again. Metrics files left by an earlier run are removed.
+        Calling it again only builds validators for any new
+        models, so those hooks do not run twice in each worker.
+
+        :param list models: Extra types to build validators for, eg.
+            List[MyModel]
+        :param bool freeze: Whether to call gc.freeze(). Set to False to
+            manage that yourself.
+        :return: self
+        """
+        from flask_container_scaffold import prefork
+        from flask_container_scaffold.base import BaseApiView
+        from flask_container_scaffold.validation import get_validator
+
+        subclasses = BaseApiView.__subclasses__()
+        while subclasses:
+            model = subclasses.pop()
+            get_validator(model)
+            subclasses.extend(model.__subclasses__())
+        for model in models:
+            get_validator(model)
+        if self._finalized:
+            return self
+        self._finalized = True
+        metrics = self.flask_app.extensions.get('scaffold_metrics')
+        if metrics is not None:
+            # Counts left by an earlier run of the server, not by workers.
+            metrics.registry.clear()
+        prefork.register_after_fork(self._after_fork)
+        if freeze:
+            prefork.freeze()
+        return self
+
+    def _after_fork(self):
+        """
+        Called in each worker forked after finalize.
+        """
+        if self.settings_watcher is not None:
+            self.settings_watcher.restart_after_fork()
+
+    def write_config_snapshot(self, path):
+        """
+        Write the resolved configuration of this scaffold to a snapshot file.
+        If the SCAFFOLD_CONFIG_SNAPSHOT environment variable (or config key)
+        points to that file when a scaffold is next created with the same
+        inputs, the configuration is loaded from it instead of from the
+        settings files, for as long as none of those files have changed.
+
+        :param str path: Where to write the snapshot
+        :raises: flask_container_scaffold.snapshot.SnapshotError if the
+            configuration contains values that can not be stored
+        """
+        from flask_container_scaffold import snapshot
+
+        app = self.flask_app
+        mapping = self.config or {}
+        # Defaults and values straight from the config mapping are set again
+        # when the snapshot is loaded, so only store what the files changed.
+        config = {key: value for key, value in app.config.items()
+                  if not (key in mapping and mapping[key] is value) and
+                  (key not in app.default_config or
+                   app.default_config[key] != value)}
+        sources = self.config_sources + list(self.configurator.loaded_files)
+        loaded_files = [(file, file_type, keys) for file, (file_type, keys)
+                        in self.configurator.loaded_files.items()]
+        snapshot.write_snapshot(path, snapshot.build_inputs(self), sources,
+                                config, loaded_files)
+
+    def _load_config_snapshot(self):
+        """
+        Load the whole configuration from a snapshot, if one is configured
+        and still valid.
+
+        :return: True if the configuration was loaded from a snapshot
+        """
+        path = ((self.config or {}).get('SCAFFOLD_CONFIG_SNAPSHOT') or
+                os.environ.get('SCAFFOLD_CONFIG_SNAPSHOT'))
+        if not path:
+            return False
+        from flask_container_scaffold import snapshot
+
+        loaded = snapshot.read_snapshot(path, snapshot.build_inputs(self))
+        if loaded is None:
+            self.flask_app.logger.info(
+                f'Config snapshot {path} is missing or out of date')
+            return False
+        if self.config is not None:
+            self.flask_app.config.from_mapping(self.config)
+        self.flask_app.config.update(loaded['config'])
+        self.configurator = AppConfigurator(self.flask_app, self.relative)
+        for file, file_type, keys in loaded['loaded_files']:
+            self.configurator.loaded_files[file] = (file_type, list(keys))
+        loaded_files = self.configurator.loaded_files
+        self.config_sources = [source for source, _ in loaded['sources']
+                               if source not in loaded_files]
+        return True
 
     def _load_flask_settings(self):
         """
@@ -72,6 +357,8 @@ class BaseScaffold(object):
             self.flask_app.config.from_mapping(self.config)
             config_not_loaded = False
         # load the instance config, if it exists and/or is required
+        self.config_sources.append(
+            os.path.join(self.flask_app.config.root_path, 'settings.cfg'))
         try:
             self.flask_app.config.from_pyfile('settings.cfg',
                                               silent=self.silent)
@@ -83,6 +370,10 @@ class BaseScaffold(object):
         # required by the app.
         if ((config_not_loaded and not self.silent) or
                 os.environ.get('FLASK_SETTINGS')):
+            if os.environ.get('FLASK_SETTINGS'):
+                self.config_sources.append(os.path.join(
+                    self.flask_app.config.root_path,
+                    os.environ['FLASK_SETTINGS']))
             self.flask_app.config.from_envvar('FLASK_SETTINGS')
 
     def _load_custom_settings(self):
@@ -91,7 +382,10 @@ class BaseScaffold(object):
         - app.config['CUSTOM_SETTINGS']
         - environment variable 'CUSTOM_SETTINGS'
         """
-        configurator = AppConfigurator(self.flask_app, self.relative)
+        configurator = AppConfigurator(
+            self.flask_app, self.relative,
+            max_workers=self.flask_app.config.get('SCAFFOLD_CONFIG_WORKERS'))
+        self.configurator = configurator
         if self.flask_app.config.get('CUSTOM_SETTINGS') is not None:
             # load the config if passed in
             custom = self.flask_app.config.get('CUSTOM_SETTINGS')
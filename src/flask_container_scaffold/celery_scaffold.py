@@ -1,5 +1,3 @@
-from celery import Celery
-
 from flask_container_scaffold.base_scaffold import BaseScaffold
 
 
@@ -18,13 +16,28 @@ class CeleryScaffold(BaseScaffold):
             otherwise we will create a new one using BaseScaffold. This is the same
             as the app parameter in BaseScaffold.
         """
+        from celery import Celery
+
+        from flask_container_scaffold.celery_task import AppContextTask
+
         super().__init__(flask_app, name, config, settings_required,
                          instance_path, instance_relative_config)
         self.flask_app = flask_app or self.flask_app
-        self.celery_app = Celery(self.flask_app.name)
+        # Tasks run inside the flask app context, see AppContextTask.
+        self.celery_app = Celery(self.flask_app.name, task_cls=AppContextTask)
+        self.celery_app.flask_app = self.flask_app
+        if not self.flask_app.config.get('SCAFFOLD_CELERY_REUSE_CONTEXT',
+                                         True):
+            self.celery_app.Task.reuse_app_context = False
         self.celery_app.config_from_object(self.flask_app.config.get("CELERY"))
         self.celery_app.set_default()
         # Add the celery app as an extension to the flask app so it can be easily
         # accessed if a flask application factory pattern is used.
         # see https://flask.palletsprojects.com/en/2.3.x/patterns/celery/ for details.
         self.flask_app.extensions["celery"] = self.celery_app
+
+    def _after_fork(self):
+        super()._after_fork()
+        # Celery only resets its connection pools after forks made by
+        # multiprocessing, so do the same for other pre-fork servers.
+        self.celery_app._after_fork()
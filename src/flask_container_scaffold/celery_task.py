@@ -0,0 +1,99 @@
+import threading
+
+from celery import Task
+from celery.signals import worker_process_init
+from flask import current_app, has_app_context
+from flask.globals import _cv_app
+from flask.signals import appcontext_tearing_down
+
+from flask_container_scaffold.prefork import register_after_fork
+
+"""
+A Celery task base class that runs tasks inside the Flask app context.
+
+Pushing and popping an app context adds to the overhead of every task, which
+matters for small tasks run at a high rate. Worker processes of the prefork and solo pools run one
+task at a time, on their main thread, so there a single context is pushed
+the first time a task runs and kept for the life of the process. After each
+task, the app's teardown_appcontext functions are called and g is emptied,
+as they would be if the context had been popped. Anywhere else, such as
+eager tasks, the thread, gevent and eventlet pools, or tasks called
+directly, a context is pushed for each task, unless the app's context is
+already pushed.
+"""
+
+#: The thread ident of the main thread of this process, once it has become
+#: a worker process of a pool that runs one task at a time.
+_worker_thread = None
+#: The app contexts pushed for the life of this worker process, by app.
+_worker_contexts = {}
+
+
+@worker_process_init.connect(weak=False)
+def _mark_worker_process(**kwargs):
+    # Sent on the main thread of each prefork child, and of the solo pool's
+    # only process.
+    global _worker_thread
+    _worker_thread = threading.get_ident()
+
+
+def _forget_worker_process():
+    global _worker_thread
+    _worker_thread = None
+    _worker_contexts.clear()
+
+
+register_after_fork(_forget_worker_process)
+
+
+class AppContextTask(Task):
+    """
+    Used as the Task class of CeleryScaffold's celery app, whose flask_app
+    attribute is the app whose context tasks run in.
+    """
+
+    #: Set to False, eg. with @celery_app.task(reuse_app_context=False), to
+    #: push a new app context for every run of a task even in a worker.
+    reuse_app_context = True
+
+    def __call__(self, *args, **kwargs):
+        request = self.request_stack.top
+        # Workers and apply() push the request before calling the task, and
+        # only call the task rather than its run method because this class
+        # defines __call__. Pushing it again, as Task.__call__ does for
+        # tasks called directly, would cost more than the app context.
+        call = super().__call__ if request is None else self.run
+        flask_app = getattr(self.app, 'flask_app', None)
+        if flask_app is None:
+            return call(*args, **kwargs)
+        if (_worker_thread == threading.get_ident() and
+                request is not None and not request.is_eager and
+                self.reuse_app_context):
+            return _call_in_worker_context(flask_app, call, args, kwargs)
+        if has_app_context() and current_app._get_current_object() is (
+                flask_app):
+            return call(*args, **kwargs)
+        with flask_app.app_context():
+            return call(*args, **kwargs)
+
+
+def _call_in_worker_context(flask_app, call, args, kwargs):
+    ctx = _worker_contexts.get(flask_app)
+    if ctx is None or _cv_app.get(None) is not ctx:
+        # Never popped, so it lasts as long as the worker process.
+        ctx = _worker_contexts[flask_app] = flask_app.app_context()
+        ctx.push()
+    exc = None
+    try:
+        return call(*args, **kwargs)
+    except BaseException as error:
+        exc = error
+        raise
+    finally:
+        # What popping the context would do, skipping what there is no need
+        # for, as it is done for every task.
+        if flask_app.teardown_appcontext_funcs or (
+                appcontext_tearing_down.receivers):
+            flask_app.do_teardown_appcontext(exc)
+        if ctx.g.__dict__:
+            ctx.g = flask_app.app_ctx_globals_class()
@@ -0,0 +1,55 @@
+import os
+
+import click
+from werkzeug.utils import import_string
+
+from flask_container_scaffold.base_scaffold import BaseScaffold
+from flask_container_scaffold.snapshot import SnapshotError
+
+
+@click.group()
+def main():
+    """
+    Tools for applications built with flask-container-scaffold.
+    """
+
+
+@main.command('compile-config')
+@click.option('--instance-path', type=click.Path(file_okay=False),
+              help='The instance folder of the application.')
+@click.option('--config', 'config_import',
+              help='Import path (module:attribute) of the config mapping the '
+                   'application passes to its scaffold, if any.')
+@click.option('--name', default='flask_container_scaffold.app_scaffold',
+              show_default=True,
+              help='The name the application passes to its scaffold.')
+@click.option('--settings-required', is_flag=True,
+              help='Fail if no settings.cfg or FLASK_SETTINGS is found.')
+@click.option('--app-relative-config', is_flag=True,
+              help='Resolve config files relative to the application root '
+                   'rather than the instance folder.')
+@click.option('--output', '-o', type=click.Path(dir_okay=False),
+              help='Where to write the snapshot. Defaults to '
+                   'config.snapshot in the instance folder.')
+def compile_config(instance_path, config_import, name, settings_required,
+                   app_relative_config, output):
+    """
+    Resolve the whole configuration chain of an application into a snapshot
+    that BaseScaffold will load instead of parsing the settings files, when
+    SCAFFOLD_CONFIG_SNAPSHOT points to it. Run this with the same
+    environment (FLASK_SETTINGS, CUSTOM_SETTINGS) the application will have.
+    """
+    config = import_string(config_import) if config_import else None
+    scaffold = BaseScaffold(name=name, config=config,
+                            settings_required=settings_required,
+                            instance_path=instance_path,
+                            instance_relative_config=not app_relative_config)
+    if scaffold.settings_watcher is not None:
+        scaffold.settings_watcher.stop()
+    output = output or os.path.join(scaffold.flask_app.instance_path,
+                                    'config.snapshot')
+    try:
+        scaffold.write_config_snapshot(output)
+    except SnapshotError as err:
+        raise click.ClickException(str(err))
+    click.echo(f'Wrote config snapshot to {output}')
@@ -0,0 +1,84 @@
+import copy
+import os
+import threading
+from collections import OrderedDict, namedtuple
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+
+class ConfigFileCache(object):
+
+    def __init__(self, maxsize=128):
+        """
+        A process-wide cache of parsed configuration files, so that files
+        which have not changed are not read and parsed again every time an
+        app is configured. Entries are keyed by absolute path, and are only
+        reused while the file's mtime and size are unchanged. The least
+        recently used entries are evicted once maxsize is reached.
+
+        :param int maxsize: The maximum number of parsed files to keep.
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, path, loader):
+        """
+        Return the parsed contents of a file, calling loader to parse it only
+        if it is not cached or has changed since it was cached. A copy is
+        returned each time, so callers are free to modify the result.
+
+        :param str path: The file to load
+        :param callable loader: Called with the path to parse the file on a
+            cache miss.
+        :return: The parsed contents of the file
+        :raises: FileNotFoundError
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        key = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == key:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return copy.deepcopy(entry[1])
+            self.misses += 1
+        data = loader(path)
+        with self._lock:
+            self._entries[path] = (key, data)
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return copy.deepcopy(data)
+
+    def invalidate(self, path=None):
+        """
+        Drop cached entries, forcing them to be parsed again on next load.
+
+        :param str path: A single file to drop from the cache. If not passed,
+            the whole cache is cleared and the counters are reset.
+        """
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+                self.hits = 0
+                self.misses = 0
+            else:
+                self._entries.pop(os.path.abspath(path), None)
+
+    def info(self):
+        """
+        Report cache statistics, in the same form as functools.lru_cache.
+
+        :return: A CacheInfo named tuple of hits, misses, maxsize, currsize
+        """
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.maxsize,
+                             len(self._entries))
+
+
+# Shared by every AppConfigurator in the process.
+file_cache = ConfigFileCache()
@@ -0,0 +1,173 @@
+import threading
+from bisect import bisect_left
+from time import perf_counter_ns
+
+from flask import request
+
+"""
+Optional per-request timing instrumentation.
+
+When enabled (see BaseScaffold and the SCAFFOLD_INSTRUMENTATION setting),
+each request gets a dict of phase timings in its WSGI environ. parse_input
+and parse_body add the time spent validating to it, and the timings are
+reported in a Server-Timing header and recorded in fixed-bucket histograms.
+When disabled, no hooks are registered and parse_input/parse_body only
+check the module level enabled flag.
+"""
+
+#: The WSGI environ key holding the phase timings, in nanoseconds, of the
+#: current request. Only present when instrumentation is enabled.
+TIMINGS_ENVIRON_KEY = 'flask_container_scaffold.timings'
+
+#: Set once any app has been instrumented, so that code in the request path
+#: can skip looking for timings in processes where there are none.
+enabled = False
+
+#: Upper bounds of the default histogram buckets, in milliseconds.
+DEFAULT_BUCKETS_MS = (0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500,
+                      5000, 10000)
+
+
+class Histogram(object):
+
+    def __init__(self, buckets_ms=DEFAULT_BUCKETS_MS):
+        """
+        A histogram of durations, counted into fixed buckets so that
+        recording a value is a binary search and an increment.
+
+        :param tuple buckets_ms: The ascending upper bound of each bucket, in
+            milliseconds. Values above the last bound are counted in an
+            extra, unbounded, bucket.
+        """
+        self.bounds_ns = tuple(int(bound * 1000000) for bound in buckets_ms)
+        self.buckets_ms = tuple(buckets_ms)
+        self.counts = [0] * (len(self.bounds_ns) + 1)
+        self.count = 0
+        self.sum_ns = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value_ns):
+        """
+        Record a duration.
+
+        :param int value_ns: The duration in nanoseconds
+        """
+        index = bisect_left(self.bounds_ns, value_ns)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum_ns += value_ns
+
+    def snapshot(self):
+        """
+        :return: A dict of the bucket bounds in milliseconds (with None for
+            the unbounded bucket), the count in each bucket, the total count
+            and the sum of all values in milliseconds.
+        """
+        with self._lock:
+            counts = list(self.counts)
+            count = self.count
+            sum_ns = self.sum_ns
+        return {'buckets_ms': list(self.buckets_ms) + [None],
+                'counts': counts,
+                'count': count,
+                'sum_ms': sum_ns / 1000000}
+
+
+def add_timing(name, duration_ns):
+    """
+    Add time spent in a phase to the current request's timings, if
+    instrumentation is enabled. Applications can use this to time their own
+    phases, which are then included in the Server-Timing header.
+
+    :param str name: The phase, eg. 'validation'
+    :param int duration_ns: Nanoseconds spent in it
+    """
+    timings = request.environ.get(TIMINGS_ENVIRON_KEY)
+    if timings is not None:
+        timings[name] = timings.get(name, 0) + duration_ns
+
+
+class RequestInstrumentation(object):
+
+    #: The phases that are always recorded. 'app' runs from the first
+    #: before_request hook to the last after_request hook, 'view' is the
+    #: part of that not spent in validation, and 'total' runs until the
+    #: request is torn down.
+    PHASES = ('validation', 'view', 'app', 'total')
+
+    def __init__(self, app=None, server_timing=True,
+                 buckets_ms=DEFAULT_BUCKETS_MS):
+        """
+        Records how long each request spends in each phase, and keeps a
+        histogram of them per phase. Available as
+        app.extensions['scaffold_instrumentation'] once registered.
+
+        :param obj app: The Flask app to instrument
+        :param bool server_timing: Whether to add a Server-Timing header to
+            responses.
+        :param tuple buckets_ms: The histogram bucket bounds, in milliseconds.
+        """
+        self.server_timing = server_timing
+        self.buckets_ms = buckets_ms
+        self.histograms = {phase: Histogram(buckets_ms)
+                           for phase in self.PHASES}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        global enabled
+        enabled = True
+        # Registered before any hooks of the application's own, so the
+        # timings include them.
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.teardown_request(self._teardown)
+        app.extensions['scaffold_instrumentation'] = self
+
+    def histogram(self, phase):
+        """
+        Return the histogram for a phase, creating it for phases recorded by
+        add_timing.
+        """
+        try:
+            return self.histograms[phase]
+        except KeyError:
+            with self._lock:
+                return self.histograms.setdefault(
+                    phase, Histogram(self.buckets_ms))
+
+    def snapshot(self):
+        """
+        :return: A dict of phase to Histogram.snapshot()
+        """
+        return {phase: histogram.snapshot()
+                for phase, histogram in list(self.histograms.items())}
+
+    @staticmethod
+    def _start():
+        request.environ[TIMINGS_ENVIRON_KEY] = {'start': perf_counter_ns(),
+                                                'validation': 0}
+
+    def _finish(self, response):
+        timings = request.environ.get(TIMINGS_ENVIRON_KEY)
+        if timings is None:
+            return response
+        timings['app'] = perf_counter_ns() - timings['start']
+        timings['view'] = timings['app'] - timings['validation']
+        if self.server_timing:
+            response.headers.add('Server-Timing', ', '.join(
+                f'{name};dur={value / 1000000:.3f}'
+                for name, value in timings.items() if name != 'start'))
+        return response
+
+    def _teardown(self, exc):
+        timings = request.environ.pop(TIMINGS_ENVIRON_KEY, None)
+        if timings is None:
+            return
+        start = timings.pop('start')
+        timings['total'] = perf_counter_ns() - start
+        # A request that failed before after_request has no app/view timing.
+        for phase, value in timings.items():
+            self.histogram(phase).observe(value)
@@ -1,8 +1,19 @@
+import atexit
+import json
 import logging
+import queue
+import time
+from logging.handlers import QueueHandler, QueueListener
 
-from flask import has_request_context
+from flask import current_app, has_request_context, request
 
-from flask_container_scaffold.network import get_remote_addr_from_flask
+from flask_container_scaffold.network import get_remote_addr
+
+#: The WSGI environ key holding the time.perf_counter() value of when the
+#: request started. Set by a before_request hook on scaffolded apps with
+#: SCAFFOLD_METRICS or SCAFFOLD_LOG_LATENCY set, or earlier by WSGI
+#: middleware for a more accurate latency.
+REQUEST_START_ENVIRON_KEY = 'flask_container_scaffold.request_start'
 
 
 class FlaskRequestFormatter(logging.Formatter):
@@ -30,9 +41,285 @@ class FlaskRequestFormatter(logging.Formatter):
             return super().format(record)
 
         if has_request_context():
-            remote_addr = get_remote_addr_from_flask()
-            record.remote_addr = remote_addr
+            record.remote_addr = get_remote_addr()
         else:
             record.remote_addr = "-"
 
         return super().format(record)
+
+
+def mark_request_start():
+    """
+    Record when the current request started, unless middleware already did.
+    Registered as a before_request hook by BaseScaffold when the
+    SCAFFOLD_METRICS or SCAFFOLD_LOG_LATENCY setting is true.
+    """
+    request.environ.setdefault(REQUEST_START_ENVIRON_KEY, time.perf_counter())
+
+
+def _json_encoder():
+    """
+    Return a function encoding a dict as a compact JSON str, using orjson if
+    it is installed.
+    """
+    try:
+        import orjson
+    except ImportError:
+        encoder = json.JSONEncoder(separators=(',', ':'), default=str)
+        return encoder.encode
+
+    def encode(data):
+        return orjson.dumps(data, default=str).decode()
+    return encode
+
+
+#: Set on a record once capture_request_fields has run, as other formatters,
+#: like FlaskRequestFormatter, may already have set some of its fields.
+_CAPTURED_ATTRIBUTE = '_scaffold_request_fields'
+
+
+def capture_request_fields(record):
+    """
+    Store details of the current request on a log record, as the
+    remote_addr, request_id, request_method, request_path and latency_ms
+    attributes, so they can be formatted later, outside of the request
+    context. Records are only updated once, and a remote_addr that is
+    already set is kept. Outside of a request, only remote_addr is set, to
+    '-'.
+
+    The request id is read from the header named by the
+    SCAFFOLD_REQUEST_ID_HEADER setting, X-Request-ID by default.
+
+    :param LogRecord record: The record to update
+    """
+    if getattr(record, _CAPTURED_ATTRIBUTE, False):
+        return
+    setattr(record, _CAPTURED_ATTRIBUTE, True)
+    has_remote_addr = getattr(record, 'remote_addr', None) is not None
+    if not has_request_context():
+        if not has_remote_addr:
+            record.remote_addr = "-"
+        return
+    if not has_remote_addr:
+        record.remote_addr = get_remote_addr()
+    record.request_id = request.headers.get(current_app.config.get(
+        'SCAFFOLD_REQUEST_ID_HEADER', 'X-Request-ID'))
+    record.request_method = request.method
+    record.request_path = request.path
+    start = request.environ.get(REQUEST_START_ENVIRON_KEY)
+    record.latency_ms = (None if start is None else
+                         round((time.perf_counter() - start) * 1000, 3))
+
+
+class JSONRequestFormatter(logging.Formatter):
+    """
+    A Formatter logging class that emits each record as a single line of
+    JSON, including details of the request being handled, if any.
+
+    Usage example::
+
+      from flask_container_scaffold.logging import JSONRequestFormatter
+
+      dictConfig({
+          'version': 1,
+          'formatters': {
+              'json': {
+                  '()': JSONRequestFormatter,
+                  'static_fields': {'service': 'myapp'},
+              },
+          },
+          ...
+      })
+
+    :param list fields: The fields to emit, in order, from the keys of
+        FIELDS. Defaults to DEFAULT_FIELDS. Request fields are null outside
+        of a request.
+    :param dict static_fields: Extra fields added to every line, eg. the
+        service name.
+    :param bool include_extra: Whether to add attributes passed to a logging
+        call with extra={...}.
+    :param str datefmt: Passed to formatTime for the 'time' field.
+    """
+
+    #: Each field that can be emitted, and the LogRecord attribute it is
+    #: read from.
+    FIELDS = {
+        'time': 'asctime',
+        'level': 'levelname',
+        'logger': 'name',
+        'message': 'message',
+        'module': 'module',
+        'function': 'funcName',
+        'line': 'lineno',
+        'process': 'process',
+        'thread': 'threadName',
+        'remote_addr': 'remote_addr',
+        'request_id': 'request_id',
+        'method': 'request_method',
+        'path': 'request_path',
+        'latency_ms': 'latency_ms',
+    }
+    REQUEST_FIELDS = ('remote_addr', 'request_id', 'method', 'path',
+                      'latency_ms')
+    DEFAULT_FIELDS = ('time', 'level', 'logger', 'message') + REQUEST_FIELDS
+    # Attributes which are never treated as extras.
+    _STANDARD_ATTRIBUTES = frozenset(
+        logging.LogRecord('', 0, '', 0, '', None, None).__dict__).union(
+            FIELDS.values(), (_CAPTURED_ATTRIBUTE,))
+
+    def __init__(self, fields=None, static_fields=None, include_extra=True,
+                 datefmt=None):
+        super().__init__(datefmt=datefmt)
+        fields = tuple(fields or self.DEFAULT_FIELDS)
+        unknown = [field for field in fields if field not in self.FIELDS]
+        if unknown:
+            raise ValueError(f'Unknown log fields: {unknown}')
+        self.static_fields = dict(static_fields or {})
+        self.include_extra = include_extra
+        self._encode = _json_encoder()
+        # Work out the layout once, so formatting a record is a single pass
+        # over (key, attribute) pairs rather than parsing a format string.
+        self._plan = tuple((field, self.FIELDS[field]) for field in fields)
+        self._wants_time = 'time' in fields
+        self._wants_request = any(field in self.REQUEST_FIELDS
+                                  for field in fields)
+
+    def format(self, record):
+        record.message = record.getMessage()
+        if self._wants_time:
+            record.asctime = self.formatTime(record, self.datefmt)
+        if self._wants_request:
+            capture_request_fields(record)
+        data = {field: getattr(record, attribute, None)
+                for field, attribute in self._plan}
+        if self.static_fields:
+            data.update(self.static_fields)
+        if self.include_extra:
+            for key, value in record.__dict__.items():
+                if key not in self._STANDARD_ATTRIBUTES:
+                    data[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data['exc_info'] = record.exc_text
+        if record.stack_info:
+            data['stack_info'] = self.formatStack(record.stack_info)
+        return self._encode(data)
+
+
+class RequestContextQueueHandler(QueueHandler):
+    """
+    A QueueHandler that captures request details on the record before it is
+    queued (see capture_request_fields), while still in the request thread,
+    so that FlaskRequestFormatter and JSONRequestFormatter work on the
+    listener thread, which has no request context.
+
+    :param Queue queue: The queue to put records on
+    :param str drop_policy: What to do when the queue is full. 'drop_newest'
+        discards the record being logged, 'drop_oldest' discards the oldest
+        queued record to make room, and 'block' waits for room.
+    """
+
+    DROP_POLICIES = ('drop_newest', 'drop_oldest', 'block')
+
+    def __init__(self, queue, drop_policy='drop_newest'):
+        if drop_policy not in self.DROP_POLICIES:
+            raise ValueError(f"drop_policy must be one of {self.DROP_POLICIES}")
+        super().__init__(queue)
+        self.drop_policy = drop_policy
+        self.dropped = 0
+
+    def prepare(self, record):
+        capture_request_fields(record)
+        return super().prepare(record)
+
+    def enqueue(self, record):
+        if self.drop_policy == 'block':
+            self.queue.put(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            if self.drop_policy == 'drop_oldest':
+                try:
+                    self.queue.get_nowait()
+                    self.queue.put_nowait(record)
+                except (queue.Empty, queue.Full):
+                    pass
+            self.dropped += 1
+
+
+# Listeners started by setup_queued_logging, stopped (flushing any queued
+# records) at exit.
+_listeners = []
+_restart_registered = False
+
+
+def setup_queued_logging(handlers=None, logger=None, maxsize=10000,
+                         drop_policy='drop_newest'):
+    """
+    Move logging I/O off of request threads. The given handlers (by default,
+    those already attached to the logger, eg. by dictConfig) are removed
+    from the logger and run by a QueueListener on a background thread,
+    while the logger gets a RequestContextQueueHandler feeding a bounded
+    queue in their place. Forked child processes start their own listener
+    threads, with new queues.
+
+    :param list handlers: The handlers to run on the background thread.
+        Defaults to the logger's current handlers.
+    :param Logger logger: The logger to set up, defaults to the root logger.
+    :param int maxsize: The most records to queue before drop_policy applies.
+    :param str drop_policy: See RequestContextQueueHandler.
+    :return: The started QueueListener. Its handler attribute is the
+        RequestContextQueueHandler, whose dropped attribute counts discarded
+        records.
+    """
+    logger = logger or logging.getLogger()
+    if handlers is None:
+        handlers = list(logger.handlers)
+    for handler in handlers:
+        logger.removeHandler(handler)
+    log_queue = queue.Queue(maxsize)
+    queue_handler = RequestContextQueueHandler(log_queue, drop_policy)
+    listener = QueueListener(log_queue, *handlers,
+                             respect_handler_level=True)
+    listener.handler = queue_handler
+    logger.addHandler(queue_handler)
+    listener.start()
+    global _restart_registered
+    if not _restart_registered:
+        from flask_container_scaffold.prefork import register_after_fork
+
+        register_after_fork(restart_queued_logging)
+        _restart_registered = True
+    _listeners.append(listener)
+    return listener
+
+
+def restart_queued_logging():
+    """
+    Start every listener set up by setup_queued_logging again, each with a
+    fresh queue. Use this in a forked child process, where the listener
+    threads of the parent do not exist and the inherited queues may be
+    locked. This is registered to run after every fork once
+    setup_queued_logging has been called.
+    """
+    for listener in _listeners:
+        if listener._thread is None:
+            # Stopped before the fork.
+            continue
+        log_queue = queue.Queue(listener.queue.maxsize)
+        listener.queue = log_queue
+        listener.handler.queue = log_queue
+        listener.handler.dropped = 0
+        listener._thread = None
+        listener.start()
+
+
+@atexit.register
+def _stop_listeners():
+    while _listeners:
+        listener = _listeners.pop()
+        # Listeners may already have been stopped by the application.
+        if listener._thread is not None:
+            listener.stop()
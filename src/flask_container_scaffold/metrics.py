@@ -0,0 +1,441 @@
+import glob
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+from flask import Blueprint, Response, request
+
+from flask_container_scaffold.logging import REQUEST_START_ENVIRON_KEY
+from flask_container_scaffold.signals import (custom_settings_reloaded,
+                                              input_validation_failed)
+from flask_container_scaffold.validation import model_name
+
+"""
+Prometheus style metrics, shared between the worker processes of a pre-fork
+server such as gunicorn.
+
+Each process writes its samples to its own memory mapped file in a shared
+directory, so recording a value is a dictionary lookup and a write to
+memory, with no locking between processes. When /metrics is scraped, the
+files of every process are read and summed, so the scraper sees the whole
+pod rather than whichever worker answered.
+
+Each file is a header holding the number of bytes used, followed by
+entries of a 4 byte key length, the key (padded to 8 bytes) and an 8 byte
+double. Entries are only ever appended, and the header is updated after the
+entry is written, so readers never see a partial entry.
+"""
+
+#: Default upper bounds of the latency histogram buckets, in seconds.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_HEADER = struct.Struct('i4x')
+_LENGTH = struct.Struct('i')
+_VALUE = struct.Struct('d')
+_INITIAL_SIZE = 64 * 1024
+
+
+def default_metrics_dir(name=None):
+    """
+    The directory metrics files are written to, when SCAFFOLD_METRICS_DIR is
+    not set: $PROMETHEUS_MULTIPROC_DIR if set, otherwise a directory under
+    the system temporary directory.
+
+    :param str name: The app's name, giving each app a directory of its own
+        under the temporary directory.
+    """
+    directory = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if directory:
+        return directory
+    directory = os.path.join(tempfile.gettempdir(), 'flask_container_scaffold')
+    if name:
+        directory = os.path.join(directory, name.replace(os.sep, '_'))
+    return directory
+
+
+def clear_directory(directory):
+    """
+    Remove the metrics files of every other process, eg. left by an earlier
+    run of the server. Only call this before any workers start, as the files
+    of workers that have exited are still counted, so totals do not fall
+    when a worker is restarted.
+
+    :param str directory: The metrics directory
+    """
+    own = f'metrics_{os.getpid()}.db'
+    for path in glob.glob(os.path.join(directory, 'metrics_*.db')):
+        if os.path.basename(path) != own:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+#: The MmapedValues of this process, by path, shared by every registry
+#: writing to the same directory so their entries do not overwrite each
+#: other's.
+_process_values = {}
+_process_values_pid = None
+_process_values_lock = threading.Lock()
+
+
+def _values_for(directory):
+    global _process_values_pid
+    pid = os.getpid()
+    path = os.path.realpath(os.path.join(directory, f'metrics_{pid}.db'))
+    with _process_values_lock:
+        if _process_values_pid != pid:
+            # Files opened before a fork belong to the parent.
+            _process_values.clear()
+            _process_values_pid = pid
+        values = _process_values.get(path)
+        if values is None:
+            values = _process_values[path] = MmapedValues(path)
+        return values
+
+
+class MmapedValues(object):
+
+    def __init__(self, path):
+        """
+        A file of named float values, memory mapped so that updating a value
+        is a write to memory.
+
+        :param str path: The file to create or append to
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._positions = {}
+        self._file = open(path, 'a+b')
+        if os.fstat(self._file.fileno()).st_size == 0:
+            self._file.truncate(_INITIAL_SIZE)
+        self._capacity = os.fstat(self._file.fileno()).st_size
+        self._map = mmap.mmap(self._file.fileno(), self._capacity)
+        self._used = _HEADER.unpack_from(self._map, 0)[0] or _HEADER.size
+        for key, _, position in self._entries(self._map, self._used):
+            self._positions[key] = position
+
+    @staticmethod
+    def _entries(data, used):
+        position = _HEADER.size
+        while position < used:
+            length = _LENGTH.unpack_from(data, position)[0]
+            start = position + _LENGTH.size
+            key = bytes(data[start:start + length]).decode()
+            position = start + length + (-(_LENGTH.size + length) % 8)
+            yield key, _VALUE.unpack_from(data, position)[0], position
+            position += _VALUE.size
+
+    @classmethod
+    def read(cls, path):
+        """
+        Read every value from a file, without mapping it.
+
+        :param str path: The file to read
+        :return: A list of (key, value) tuples
+        """
+        with open(path, 'rb') as handle:
+            data = handle.read()
+        if len(data) < _HEADER.size:
+            return []
+        used = _HEADER.unpack_from(data, 0)[0]
+        return [(key, value) for key, value, _ in cls._entries(data, used)]
+
+    def add(self, key, amount):
+        """
+        Add to a value, creating it at zero first if needed.
+
+        :param str key: The name of the value
+        :param float amount: The amount to add
+        """
+        with self._lock:
+            position = self._positions.get(key)
+            if position is None:
+                position = self._append(key)
+            value = _VALUE.unpack_from(self._map, position)[0]
+            _VALUE.pack_into(self._map, position, value + amount)
+
+    def _append(self, key):
+        encoded = key.encode()
+        padding = -(_LENGTH.size + len(encoded)) % 8
+        size = _LENGTH.size + len(encoded) + padding + _VALUE.size
+        while self._used + size > self._capacity:
+            self._capacity *= 2
+            self._map.close()
+            self._file.truncate(self._capacity)
+            self._map = mmap.mmap(self._file.fileno(), self._capacity)
+        start = self._used
+        _LENGTH.pack_into(self._map, start, len(encoded))
+        self._map[start + _LENGTH.size:start + _LENGTH.size +
+                  len(encoded)] = encoded
+        position = start + _LENGTH.size + len(encoded) + padding
+        _VALUE.pack_into(self._map, position, 0.0)
+        self._used += size
+        _HEADER.pack_into(self._map, 0, self._used)
+        self._positions[key] = position
+        return position
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+def _sample_key(name, labels):
+    return json.dumps([name, labels], separators=(',', ':'))
+
+
+class Counter(object):
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        """
+        A value that only goes up. Create through MetricsRegistry.counter.
+        """
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        self.registry.add(_sample_key(
+            f'{self.name}_total',
+            [labels[name] for name in self.labelnames]), amount)
+
+    def lines(self, values):
+        for label_values, value in values.get(f'{self.name}_total',
+                                              {}).items():
+            yield f'{self.name}_total', self.labelnames, label_values, value
+
+
+class Histogram(object):
+
+    def __init__(self, registry, name, documentation, labelnames=(),
+                 buckets=DEFAULT_BUCKETS):
+        """
+        Observations counted into fixed buckets. Create through
+        MetricsRegistry.histogram.
+        """
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(float(bound) for bound in buckets)
+        self.type = 'histogram'
+        # Bucket counts are stored per bucket and made cumulative at scrape
+        # time, so an observation only updates one of them.
+        self._bucket_labels = [_format_value(bound) for bound in self.buckets]
+        self._bucket_labels.append('+Inf')
+
+    def observe(self, value, **labels):
+        label_values = [labels[name] for name in self.labelnames]
+        index = bisect_left(self.buckets, value)
+        self.registry.add(_sample_key(
+            f'{self.name}_bucket',
+            label_values + [self._bucket_labels[index]]), 1)
+        self.registry.add(_sample_key(f'{self.name}_sum', label_values),
+                          value)
+        self.registry.add(_sample_key(f'{self.name}_count', label_values), 1)
+
+    def lines(self, values):
+        buckets = defaultdict(dict)
+        for label_values, value in values.get(f'{self.name}_bucket',
+                                              {}).items():
+            buckets[label_values[:-1]][label_values[-1]] = value
+        bucket_labelnames = self.labelnames + ('le',)
+        for label_values, counts in buckets.items():
+            total = 0
+            for bucket in self._bucket_labels:
+                total += counts.get(bucket, 0)
+                yield (f'{self.name}_bucket', bucket_labelnames,
+                       label_values + (bucket,), total)
+        for suffix in ('sum', 'count'):
+            for label_values, value in values.get(f'{self.name}_{suffix}',
+                                                  {}).items():
+                yield (f'{self.name}_{suffix}', self.labelnames,
+                       label_values, value)
+
+
+def _format_value(value):
+    if value == int(value):
+        return f'{value:.1f}'
+    return repr(value)
+
+
+def _escape(value):
+    return (str(value).replace('\\', '\\\\').replace('\n', '\\n')
+            .replace('"', '\\"'))
+
+
+class MetricsRegistry(object):
+
+    def __init__(self, directory=None):
+        """
+        The metrics of an app, and the per-process file their values are
+        written to.
+
+        :param str directory: Where every process writes its metrics file.
+            Defaults to default_metrics_dir(). Values from every file in it
+            are included, including those of processes that have exited, so
+            it should be emptied when the server starts, eg. with clear().
+        """
+        self.directory = directory
+        self.metrics = []
+        self._values = None
+        self._pid = None
+        self._prepared = False
+        self._lock = threading.Lock()
+
+    def _prepare(self):
+        if self.directory is None:
+            self.directory = default_metrics_dir()
+        os.makedirs(self.directory, exist_ok=True)
+        self._prepared = True
+
+    def clear(self):
+        """
+        Remove the files of every other process from the directory. See
+        clear_directory.
+        """
+        with self._lock:
+            if not self._prepared:
+                self._prepare()
+        clear_directory(self.directory)
+
+    def counter(self, name, documentation, labelnames=()):
+        metric = Counter(self, name, documentation, labelnames)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(),
+                  buckets=DEFAULT_BUCKETS):
+        metric = Histogram(self, name, documentation, labelnames, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def add(self, key, amount):
+        """
+        Add to a value in this process's file, opening a new file after a
+        fork, so each worker has its own.
+        """
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    if not self._prepared:
+                        self._prepare()
+                    self._values = _values_for(self.directory)
+                    self._pid = pid
+        self._values.add(key, amount)
+
+    def collect(self):
+        """
+        Sum the values from the file of every process.
+
+        :return: A dict of sample name to a dict of label values to value
+        """
+        if not self._prepared:
+            with self._lock:
+                if not self._prepared:
+                    self._prepare()
+        values = defaultdict(lambda: defaultdict(float))
+        for path in glob.glob(os.path.join(self.directory, 'metrics_*.db')):
+            try:
+                entries = MmapedValues.read(path)
+            except FileNotFoundError:
+                continue
+            for key, value in entries:
+                name, label_values = json.loads(key)
+                values[name][tuple(label_values)] += value
+        return values
+
+    def generate_latest(self):
+        """
+        Render every metric, summed over all processes, in the Prometheus
+        text exposition format.
+
+        :return: The exposition as a str
+        """
+        values = self.collect()
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            for name, labelnames, label_values, value in metric.lines(
+                    values):
+                labels = ','.join(f'{label}="{_escape(label_value)}"'
+                                  for label, label_value
+                                  in zip(labelnames, label_values))
+                lines.append(f'{name}{{{labels}}} {_format_value(value)}'
+                             if labels else f'{name} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+class ScaffoldMetrics(object):
+
+    def __init__(self, app=None, directory=None, path='/metrics',
+                 buckets=DEFAULT_BUCKETS):
+        """
+        Records request counts and latency, parse_input/parse_body
+        validation failures per model and custom settings reloads, and
+        serves them at path. Available as app.extensions['scaffold_metrics']
+        once registered, where registry can be used to add metrics of your
+        own.
+
+        :param obj app: The Flask app to record metrics for
+        :param str directory: Passed to MetricsRegistry. Defaults to
+            default_metrics_dir(app.name).
+        :param str path: Where to serve the metrics
+        :param tuple buckets: Latency histogram bucket bounds, in seconds
+        """
+        self.path = path
+        self.registry = MetricsRegistry(directory)
+        self.requests = self.registry.counter(
+            'scaffold_requests', 'Requests handled', ('method', 'status'))
+        self.latency = self.registry.histogram(
+            'scaffold_request_duration_seconds', 'Request latency',
+            ('method',), buckets)
+        self.validation_failures = self.registry.counter(
+            'scaffold_validation_failures',
+            'Requests that failed parse_input/parse_body validation',
+            ('model',))
+        self.config_reloads = self.registry.counter(
+            'scaffold_config_reloads', 'Custom settings files reloaded')
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if self.registry.directory is None:
+            self.registry.directory = default_metrics_dir(app.name)
+        blueprint = Blueprint('scaffold_metrics', __name__)
+        blueprint.add_url_rule(self.path, 'metrics', self.scrape)
+        app.register_blueprint(blueprint)
+        app.after_request(self._after_request)
+        input_validation_failed.connect(self._validation_failed, app)
+        custom_settings_reloaded.connect(self._config_reloaded, app)
+        app.extensions['scaffold_metrics'] = self
+
+    def scrape(self):
+        return Response(self.registry.generate_latest(),
+                        mimetype='text/plain; version=0.0.4')
+
+    def _after_request(self, response):
+        if request.endpoint == 'scaffold_metrics.metrics':
+            return response
+        self.requests.inc(method=request.method, status=response.status_code)
+        start = request.environ.get(REQUEST_START_ENVIRON_KEY)
+        if start is not None:
+            self.latency.observe(time.perf_counter() - start,
+                                 method=request.method)
+        return response
+
+    def _validation_failed(self, sender, model, **kwargs):
+        self.validation_failures.inc(model=model_name(model))
+
+    def _config_reloaded(self, sender, **kwargs):
+        self.config_reloads.inc()
@@ -1,24 +1,263 @@
-from flask import request
+import ipaddress
+import re
+from functools import lru_cache
+
+from flask import current_app, request
+
+#: The WSGI environ key the resolved client address is cached under. WSGI
+#: middleware can read it, or set it to override the address for a request.
+REMOTE_ADDR_ENVIRON_KEY = 'flask_container_scaffold.remote_addr'
+
+# One name=value pair of a Forwarded header (or a malformed chunk, with no
+# name), and the delimiter after it. Values may be quoted strings containing
+# escaped characters and delimiters, captured without their quotes, or
+# plain tokens.
+_FORWARDED_PAIR = re.compile(
+    r'\s*(?:([^=,;\s]+)\s*=\s*(?:"((?:[^"\\]|\\.)*)"|([^,;]*))|[^,;]*)'
+    r'\s*([,;]|$)')
+_ESCAPE = re.compile(r'\\(.)')
+# The 'for' value of a hop whose quoted value is never closed.
+_MALFORMED = object()
+
+
+@lru_cache(maxsize=1024)
+def parse_forwarded(field):
+    """
+    Parse an RFC 7239 Forwarded header in a single pass, handling quoted
+    values and escapes.
+
+    :param str field: The raw header value, eg.
+        'for=192.0.2.60;proto=http, for="[2001:db8::1]:4711"'
+    :return: A tuple of the raw 'for' value of each hop, from the client to
+        the nearest proxy. Hops without a 'for' parameter, or whose value is
+        a quoted string that is not closed, are None.
+    """
+    if '"' not in field:
+        # Without quoted values, delimiters can not appear inside a value,
+        # so splitting is safe and much faster than scanning.
+        hops = []
+        for element in field.split(','):
+            node = None
+            for pair in element.split(';'):
+                name, sep, value = pair.partition('=')
+                if sep and name.strip().lower() == 'for':
+                    node = value.strip()
+                    break
+            hops.append(node)
+        return tuple(hops)
+    hops = []
+    node = None
+    position = 0
+    length = len(field)
+    while position < length:
+        match = _FORWARDED_PAIR.match(field, position)
+        name, quoted, value, delimiter = match.groups()
+        if name is not None and node is None and name.lower() == 'for':
+            if quoted is not None:
+                node = _ESCAPE.sub(r'\1', quoted).strip()
+            elif value.startswith('"'):
+                node = _MALFORMED
+            else:
+                node = value.strip()
+        if delimiter == ',':
+            hops.append(None if node is _MALFORMED else node)
+            node = None
+        if match.end() == position:
+            break
+        position = match.end()
+    hops.append(None if node is _MALFORMED else node)
+    return tuple(hops)
+
+
+@lru_cache(maxsize=1024)
+def parse_x_forwarded_for(field):
+    """
+    Parse an X-Forwarded-For header.
+
+    :param str field: The raw header value, eg. '192.0.2.60, 10.0.0.1'
+    :return: A tuple of the address of each hop, from the client to the
+        nearest proxy.
+    """
+    return tuple(part.strip() or None for part in field.split(','))
+
+
+def normalize_node(node):
+    """
+    Strip the port, and the brackets around an IPv6 address, from a
+    forwarded node. Obfuscated identifiers like '_hidden' or 'unknown' are
+    returned as they are.
+
+    :param str node: A node, eg. '[2001:db8::1]:4711' or '192.0.2.60:80'
+    :return: The address, eg. '2001:db8::1' or '192.0.2.60'
+    """
+    if not node:
+        return None
+    if node[0] == '[':
+        end = node.find(']')
+        return node[1:end] if end != -1 else None
+    if node.count(':') == 1:
+        return node.split(':', 1)[0]
+    return node
+
+
+def _proxies_key(proxies):
+    """
+    Turn trusted proxies in any accepted form into a hashable tuple.
+    """
+    if not proxies:
+        return ()
+    if isinstance(proxies, str):
+        proxies = proxies.split(',')
+    return tuple(proxy.strip() for proxy in proxies if proxy.strip())
+
+
+@lru_cache(maxsize=64)
+def _compile_networks(proxies):
+    return tuple(ipaddress.ip_network(proxy, strict=False)
+                 for proxy in proxies)
+
+
+def trusted_networks(proxies):
+    """
+    Compile a list of trusted proxy addresses or CIDR ranges, once per
+    distinct list.
+
+    :param proxies: An iterable of addresses/ranges, or a comma separated
+        string of them, eg. '10.0.0.0/8, 192.168.1.1'
+    :return: A tuple of ipaddress network objects
+    """
+    return _compile_networks(_proxies_key(proxies))
+
+
+def is_trusted(addr, networks):
+    """
+    Check if an address is in any of the trusted networks.
+
+    :param str addr: The address to check
+    :param tuple networks: The result of trusted_networks
+    :return: False for anything that is not an IP address
+    """
+    try:
+        ip = ipaddress.ip_address(addr)
+    except ValueError:
+        return False
+    return any(ip in network for network in networks)
+
+
+def get_client_from_hops(hops, remote_addr, networks):
+    """
+    Find the client address in a chain of forwarded hops, by walking from
+    the nearest hop (the peer that connected to us) towards the client and
+    stopping at the first address that is not a trusted proxy.
+
+    :param tuple hops: The normalized addresses from a forwarding header,
+        client first
+    :param str remote_addr: The address of the peer that connected to us
+    :param tuple networks: The result of trusted_networks
+    :return: The client address
+    """
+    if not is_trusted(remote_addr, networks):
+        return remote_addr
+    client = remote_addr
+    for hop in reversed(hops):
+        if hop is None:
+            continue
+        client = hop
+        if not is_trusted(hop, networks):
+            break
+    return client
+
+
+@lru_cache(maxsize=1024)
+def _normalized_hops(header, field):
+    if header == 'HTTP_FORWARDED':
+        nodes = parse_forwarded(field)
+    elif header == 'HTTP_X_FORWARDED_FOR':
+        nodes = parse_x_forwarded_for(field)
+    else:
+        nodes = (field.strip(),)
+    return tuple(normalize_node(node) for node in nodes)
+
+
+def _forwarded_hops(environ):
+    """
+    Return the normalized hops from the first forwarding header present,
+    checking Forwarded, then X-Forwarded-For, then X-Real-IP.
+    """
+    for header in ('HTTP_FORWARDED', 'HTTP_X_FORWARDED_FOR',
+                   'HTTP_X_REAL_IP'):
+        field = environ.get(header)
+        if field:
+            return _normalized_hops(header, field)
+    return ()
+
+
+@lru_cache(maxsize=4096)
+def _resolve_client(hops, remote_addr, proxies):
+    return get_client_from_hops(hops, remote_addr,
+                                _compile_networks(proxies))
 
 
 def get_ip_from_forwarded_field(field):
     # RFC 7239 defines the following format for the Forwarded field:
     # for=12.34.56.78;host=example.com;proto=https, for=23.45.67.89
     # In testing, the first IP has consistently been the real user IP.
-    forwarded = field.split(",")[0]
-    for value in forwarded.split(";"):
-        if value.startswith("for="):
-            return value.split("=")[1]
-    else:
-        return None
+    return normalize_node(parse_forwarded(field)[0])
 
 
-def get_remote_addr_from_flask():
+def get_remote_addr_from_environ(environ, trusted_proxies=None):
+    """
+    Resolve the client address from a WSGI environ, without caching it.
+
+    With no trusted proxies, the first (client) hop of the Forwarded,
+    X-Forwarded-For or X-Real-IP header is used, falling back to the peer
+    address. With trusted proxies, hops are walked from the peer towards the
+    client, and the first address that is not a trusted proxy is used, so
+    clients can not spoof their address by sending the headers themselves.
+
+    :param dict environ: The WSGI environ of a request
+    :param trusted_proxies: Addresses or CIDR ranges of trusted proxies, as
+        accepted by trusted_networks
+    :return: The client address, or None if it can not be determined
+    """
+    remote_addr = environ.get('REMOTE_ADDR')
+    hops = _forwarded_hops(environ)
+    proxies = _proxies_key(trusted_proxies)
+    if proxies:
+        return _resolve_client(hops, remote_addr, proxies)
     # HTTP_FORWARDED seems to be the most reliable way to get the
     # user real IP.
-    forwarded = request.environ.get('HTTP_FORWARDED')
-    if forwarded:
-        ip = get_ip_from_forwarded_field(forwarded)
-        return ip or request.remote_addr
-    else:
-        return request.remote_addr
+    if hops and hops[0]:
+        return hops[0]
+    return remote_addr
+
+
+def get_remote_addr_from_flask():
+    return get_remote_addr_from_environ(
+        request.environ, current_app.config.get('SCAFFOLD_TRUSTED_PROXIES'))
+
+
+def get_remote_addr(environ=None, trusted_proxies=None):
+    """
+    Return the client address of a request, resolving it only the first
+    time it is asked for and caching it in the environ under
+    REMOTE_ADDR_ENVIRON_KEY for the rest of the request.
+
+    :param dict environ: The WSGI environ of the request, for use outside of
+        a Flask request context (eg. in WSGI middleware). Defaults to that of
+        the current Flask request.
+    :param trusted_proxies: Trusted proxy addresses or CIDR ranges. Defaults
+        to the SCAFFOLD_TRUSTED_PROXIES setting of the current app.
+    :return: The client address, or None if it can not be determined
+    """
+    if environ is None:
+        environ = request.environ
+        if trusted_proxies is None and REMOTE_ADDR_ENVIRON_KEY not in environ:
+            trusted_proxies = current_app.config.get(
+                'SCAFFOLD_TRUSTED_PROXIES')
+    try:
+        return environ[REMOTE_ADDR_ENVIRON_KEY]
+    except KeyError:
+        remote_addr = environ[REMOTE_ADDR_ENVIRON_KEY] = (
+            get_remote_addr_from_environ(environ, trusted_proxies))
+        return remote_addr
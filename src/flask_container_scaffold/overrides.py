@@ -0,0 +1,172 @@
+import json
+import os
+from collections.abc import Mapping
+
+"""
+Overrides of individual, possibly nested, settings from environment
+variables, eg. SCAFFOLD__DB__POOL_SIZE=20 for app.config['DB']['pool_size'],
+so a deployment can change one value without providing a whole settings
+file.
+
+The environment is scanned once, and each variable is turned into its place
+in a tree of overrides, finding the matching key of the existing config at
+each level without regard to case. The value is converted to the type of the
+setting it replaces, or of the matching field of a pydantic schema.
+"""
+
+#: Separates the prefix and the keys of each level in a variable's name.
+SEPARATOR = '__'
+
+_BOOLEANS = {'1': True, 'true': True, 'yes': True, 'on': True,
+             '0': False, 'false': False, 'no': False, 'off': False}
+_MISSING = object()
+
+
+def _lookup(mapping, segment, key_maps):
+    """
+    Find the key of mapping that segment names, matching exactly if possible
+    and otherwise ignoring case.
+
+    :return: The key, or None
+    """
+    if segment in mapping:
+        return segment
+    # Build each mapping's lower case index once, however many variables
+    # refer to it.
+    key_map = key_maps.get(id(mapping))
+    if key_map is None:
+        key_map = key_maps[id(mapping)] = {
+            key.lower(): key for key in mapping if isinstance(key, str)}
+    return key_map.get(segment.lower())
+
+
+def _schema_fields(schema):
+    fields = getattr(schema, 'model_fields', None)
+    return fields if isinstance(fields, Mapping) else None
+
+
+def _coerce(raw, existing):
+    """
+    Convert a variable's value to the type of the value it replaces.
+    """
+    if isinstance(existing, bool):
+        try:
+            return _BOOLEANS[raw.strip().lower()]
+        except KeyError:
+            raise ValueError(f'{raw!r} is not a boolean') from None
+    if isinstance(existing, int):
+        return int(raw)
+    if isinstance(existing, float):
+        return float(raw)
+    if isinstance(existing, (list, tuple, Mapping)):
+        value = json.loads(raw)
+        expected = Mapping if isinstance(existing, Mapping) else list
+        if not isinstance(value, expected):
+            raise ValueError(f'{raw!r} is not a JSON {expected.__name__}')
+        return tuple(value) if isinstance(existing, tuple) else value
+    return raw
+
+
+def _validate(raw, annotation):
+    """
+    Convert a variable's value to the type of a schema field, parsing it as
+    JSON if it is not a plain value, like a list or a nested model.
+    """
+    from pydantic import ValidationError
+
+    from flask_container_scaffold.validation import get_validator
+
+    validator = get_validator(annotation)
+    try:
+        value = validator.validate_strings(raw)
+    except ValidationError:
+        value = validator.validate_json(raw)
+    return validator.dump_python(value)
+
+
+def read_env_overrides(prefix, config, schema=None, environ=None,
+                       separator=SEPARATOR):
+    """
+    Build the tree of overrides set by environment variables named
+    prefix, separator, then the key of each level joined by separator.
+
+    :param str prefix: eg. 'SCAFFOLD' for SCAFFOLD__DB__POOL_SIZE
+    :param Mapping config: The config being overridden, used to find the
+        keys and types of existing settings.
+    :param schema: An optional pydantic model, whose field types are used
+        in preference to the type of the existing setting.
+    :param Mapping environ: Defaults to os.environ
+    :param str separator: Separates the prefix and keys
+    :return: A dict of top level key to its override, with nested dicts
+        holding overrides of nested settings.
+    :raises: ValueError if a value can not be converted, or two variables
+        set the same setting.
+    """
+    environ = os.environ if environ is None else environ
+    start = prefix + separator
+    overrides = {}
+    key_maps = {}
+    for name, raw in environ.items():
+        if not name.startswith(start):
+            continue
+        segments = name[len(start):].split(separator)
+        if not all(segments):
+            raise ValueError(f'Environment variable {name} has an empty key')
+        existing = config
+        fields = _schema_fields(schema)
+        annotation = None
+        node = overrides
+        for depth, segment in enumerate(segments):
+            key = None
+            if isinstance(existing, Mapping):
+                key = _lookup(existing, segment, key_maps)
+            if key is None and fields is not None:
+                key = _lookup(fields, segment, key_maps)
+            if key is None:
+                key = segment
+            existing = (existing.get(key, _MISSING)
+                        if isinstance(existing, Mapping) else _MISSING)
+            field = fields.get(key) if fields is not None else None
+            annotation = field.annotation if field is not None else None
+            fields = _schema_fields(annotation)
+            if depth == len(segments) - 1:
+                break
+            node = node.setdefault(key, {})
+            if not isinstance(node, dict):
+                raise ValueError(f'Environment variable {name} conflicts '
+                                 f'with another override')
+        if key in node:
+            raise ValueError(f'Environment variable {name} conflicts with '
+                             f'another override')
+        try:
+            if annotation is not None:
+                node[key] = _validate(raw, annotation)
+            else:
+                node[key] = _coerce(raw, existing)
+        except ValueError as exc:
+            raise ValueError(f'Invalid value for environment variable '
+                             f'{name}: {exc}') from exc
+    return overrides
+
+
+def _merge(value, override):
+    if not isinstance(override, dict):
+        return override
+    # Copy rather than update, as the existing value may be shared, eg. by
+    # the parsed file cache.
+    merged = dict(value) if isinstance(value, Mapping) else {}
+    for key, item in override.items():
+        merged[key] = _merge(merged.get(key), item)
+    return merged
+
+
+def merge_overrides(config, overrides):
+    """
+    Apply overrides from read_env_overrides to config, in a single update.
+    Nested settings that are not overridden keep their existing values.
+
+    :param dict config: eg. app.config
+    :param dict overrides: The overrides to apply
+    """
+    config.update({key: _merge(config.get(key), override)
+                   for key, override in overrides.items()})
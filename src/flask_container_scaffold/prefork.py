@@ -0,0 +1,61 @@
+import gc
+import logging
+import os
+import threading
+
+"""
+Support for pre-fork servers, like gunicorn with --preload, which build the
+app once in a master process and then fork workers from it.
+
+Memory pages the master filled in are shared with the workers until either
+side writes to them, and merely looking at a Python object writes to its
+reference count, while every garbage collection writes to the header of
+every object it tracks. freeze() moves everything built so far out of the
+collector's reach, so those pages stay shared. Threads, locks, queues and
+network connections do not survive a fork in a usable state, so code owning
+them registers a callback with register_after_fork to set them up again in
+each worker.
+"""
+
+_after_fork_callbacks = []
+_lock = threading.Lock()
+_registered = False
+_logger = logging.getLogger(__name__)
+
+
+def register_after_fork(func):
+    """
+    Call func in every child process forked after this point, before any
+    other code runs in the child.
+
+    :param callable func: Called with no arguments
+    """
+    global _registered
+    with _lock:
+        if not _registered and hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=run_after_fork)
+            _registered = True
+        _after_fork_callbacks.append(func)
+
+
+def run_after_fork():
+    """
+    Run the registered after fork callbacks. This is called automatically in
+    forked children, and only needs calling directly for servers that start
+    workers some other way.
+    """
+    for func in list(_after_fork_callbacks):
+        try:
+            func()
+        except Exception:
+            _logger.exception(f'After fork callback {func!r} failed')
+
+
+def freeze():
+    """
+    Collect garbage, then move every remaining object into the permanent
+    generation, so the collector never touches them again. Call this last
+    thing before forking.
+    """
+    gc.collect()
+    gc.freeze()
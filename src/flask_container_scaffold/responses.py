@@ -0,0 +1,144 @@
+import json
+
+from flask import Response, has_request_context, stream_with_context
+from pydantic import BaseModel
+
+from flask_container_scaffold.validation import get_validator
+
+"""
+Helpers to return pydantic models (like BaseApiView subclasses) as JSON
+responses. The models are serialized by pydantic straight to bytes, which
+become the response body as they are, rather than being dumped to a dict and
+encoded again by jsonify.
+"""
+
+
+def to_json(item, **dump_kwargs):
+    """
+    Serialize a pydantic model, or any value pydantic can serialize, to JSON
+    bytes.
+
+    :param item: The model or value
+    :param dump_kwargs: Passed to the serializer, eg. by_alias=True or
+        exclude_none=True
+    :return: bytes
+    """
+    if isinstance(item, BaseModel):
+        return item.__pydantic_serializer__.to_json(item, **dump_kwargs)
+    return get_validator(type(item)).dump_json(item, **dump_kwargs)
+
+
+def json_response(model, status=None, headers=None, **dump_kwargs):
+    """
+    Return a model as a JSON response, with its Content-Length set.
+
+    Usage example::
+
+      @app.route('/thing')
+      def thing():
+          return json_response(MyView(name='thing'))
+
+    :param BaseModel model: The model to return
+    :param int status: The response status, defaults to 200
+    :param dict headers: Extra response headers
+    :param dump_kwargs: Passed to the serializer, eg. exclude_none=True
+    :return: A Flask Response
+    """
+    # A bytes body is used as is, and its length is known without copying.
+    return Response(to_json(model, **dump_kwargs), status=status,
+                    headers=headers, mimetype='application/json')
+
+
+def _resolve_envelope(envelope, dump_kwargs):
+    """
+    Serialize an envelope, calling it first if it is a callable, so it can
+    describe errors found while the items were produced.
+    """
+    if callable(envelope):
+        envelope = envelope()
+    return to_json(envelope, **dump_kwargs)
+
+
+def _stream(chunks):
+    # Keep the request context available to generators producing items.
+    if has_request_context():
+        return stream_with_context(chunks)
+    return chunks
+
+
+def _json_array(items, envelope, items_key, dump_kwargs):
+    if envelope is not None:
+        yield b'{' + json.dumps(items_key).encode() + b':['
+    else:
+        yield b'['
+    first = True
+    for item in items:
+        if first:
+            first = False
+            yield to_json(item, **dump_kwargs)
+        else:
+            yield b',' + to_json(item, **dump_kwargs)
+    if envelope is None:
+        yield b']'
+        return
+    # Splice the envelope's fields in after the items.
+    fields = _resolve_envelope(envelope, dump_kwargs)[1:]
+    yield b']' + (fields if fields == b'}' else b',' + fields)
+
+
+def json_array_response(items, status=None, headers=None, envelope=None,
+                        items_key='items', **dump_kwargs):
+    """
+    Stream an iterable of models as a JSON array. Items are serialized one at
+    a time, as the response is sent, so a large list does not need to be
+    encoded in memory all at once, and a generator of items never needs to be
+    held in memory at all.
+
+    :param iterable items: The models (or other values) to return
+    :param int status: The response status, defaults to 200
+    :param dict headers: Extra response headers
+    :param envelope: A model, eg. a BaseApiView with msg and errors, whose
+        fields are sent after the items in a JSON object, as
+        {items_key: [...], "msg": ..., "errors": ...}. May be a callable
+        returning the model, which is called once every item has been sent.
+    :param str items_key: The key of the items, when an envelope is used
+    :param dump_kwargs: Passed to the serializer, eg. exclude_none=True
+    :return: A streamed Flask Response
+    """
+    return Response(_stream(_json_array(items, envelope, items_key,
+                                        dump_kwargs)),
+                    status=status, headers=headers,
+                    mimetype='application/json')
+
+
+def _ndjson(items, envelope, envelope_first, dump_kwargs):
+    if envelope is not None and envelope_first:
+        yield _resolve_envelope(envelope, dump_kwargs) + b'\n'
+    for item in items:
+        yield to_json(item, **dump_kwargs) + b'\n'
+    if envelope is not None and not envelope_first:
+        yield _resolve_envelope(envelope, dump_kwargs) + b'\n'
+
+
+def ndjson_response(items, status=None, headers=None, envelope=None,
+                    envelope_first=False, **dump_kwargs):
+    """
+    Stream an iterable of models as newline delimited JSON, one item per
+    line, serializing each item as it is sent so memory use stays flat
+    however many items there are.
+
+    :param iterable items: The models (or other values) to return
+    :param int status: The response status, defaults to 200
+    :param dict headers: Extra response headers
+    :param envelope: A model, eg. a BaseApiView with msg and errors, sent as
+        an extra line after the items. May be a callable returning the
+        model, which is called once every item has been sent.
+    :param bool envelope_first: Send the envelope as the first line instead.
+        A callable envelope is then called before any item is produced.
+    :param dump_kwargs: Passed to the serializer, eg. exclude_none=True
+    :return: A streamed Flask Response
+    """
+    return Response(_stream(_ndjson(items, envelope, envelope_first,
+                                    dump_kwargs)),
+                    status=status, headers=headers,
+                    mimetype='application/x-ndjson')
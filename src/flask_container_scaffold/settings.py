@@ -0,0 +1,136 @@
+from collections.abc import Mapping
+from functools import lru_cache
+from types import MappingProxyType
+
+from flask import current_app
+
+"""
+Read only views of an app's configuration, for code that reads settings on
+every request. Nested dictionaries become FrozenSettings objects whose
+values are stored in __slots__, so ``settings.DB.pool.size`` is a chain of
+plain attribute lookups, rather than hashing every key on the way down as
+``app.config['DB']['pool']['size']`` does. Lists become tuples and sets
+become frozensets, so the whole view is immutable and can be shared freely
+between threads and forked workers.
+"""
+
+
+class FrozenSettings(object):
+    """
+    A read only mapping whose keys are also attributes. Keys that are not
+    valid identifiers, start with '__' or clash with a method name (like
+    'keys') are only available by item access, eg. settings['my-key'].
+    Create these with freeze_settings.
+    """
+
+    __slots__ = ('_items',)
+
+    def __init__(self, items):
+        object.__setattr__(self, '_items', MappingProxyType(items))
+        for name in type(self).__slots__:
+            object.__setattr__(self, name, items[name])
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Settings are read only')
+
+    def __delattr__(self, name):
+        raise AttributeError('Settings are read only')
+
+    def __getitem__(self, key):
+        return self._items[key]
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __eq__(self, other):
+        if isinstance(other, FrozenSettings):
+            return self._items == other._items
+        return NotImplemented
+
+    def __hash__(self):
+        return id(self)
+
+    def __repr__(self):
+        return f'FrozenSettings({dict(self._items)!r})'
+
+    def __reduce__(self):
+        return freeze_settings, (self.to_dict(),)
+
+    def get(self, key, default=None):
+        return self._items.get(key, default)
+
+    def keys(self):
+        return self._items.keys()
+
+    def items(self):
+        return self._items.items()
+
+    def values(self):
+        return self._items.values()
+
+    def to_dict(self):
+        """
+        :return: A mutable copy of the settings, as nested dicts and lists
+        """
+        return {key: _thaw(value) for key, value in self._items.items()}
+
+
+def _thaw(value):
+    if isinstance(value, FrozenSettings):
+        return value.to_dict()
+    if isinstance(value, tuple):
+        return [_thaw(item) for item in value]
+    if isinstance(value, frozenset):
+        return set(value)
+    return value
+
+
+@lru_cache(maxsize=None)
+def _settings_class(names):
+    """
+    Return a FrozenSettings subclass with a slot for each of names, shared
+    by every mapping with the same attribute keys.
+    """
+    return type('FrozenSettings', (FrozenSettings,), {'__slots__': names})
+
+
+def _is_attribute(key):
+    return (isinstance(key, str) and key.isidentifier() and
+            not key.startswith('__') and not hasattr(FrozenSettings, key))
+
+
+def freeze_settings(value):
+    """
+    Build a read only view of a value, recursively: mappings become
+    FrozenSettings, lists and tuples become tuples and sets become
+    frozensets. Other values are used as they are.
+
+    :param value: The value to freeze, eg. app.config
+    :return: The frozen value
+    """
+    if isinstance(value, Mapping):
+        items = {key: freeze_settings(item) for key, item in value.items()}
+        return _settings_class(tuple(key for key in items
+                                     if _is_attribute(key)))(items)
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze_settings(item) for item in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(value)
+    return value
+
+
+def get_settings(app=None):
+    """
+    Return the settings built by BaseScaffold.build_settings for an app.
+
+    :param obj app: Defaults to the current app
+    :return: The FrozenSettings (or schema instance), or None if the app has
+        none.
+    """
+    return (app or current_app).extensions.get('scaffold_settings')
@@ -0,0 +1,19 @@
+from blinker import Namespace
+
+"""
+Signals sent by flask_container_scaffold. Like Flask's own signals, the
+sender is the Flask app the signal relates to, so subscribers can connect for
+a single app with ``signal.connect(func, app)``.
+"""
+
+_signals = Namespace()
+
+#: Sent after a watched custom settings file was re-parsed and its keys were
+#: swapped into app.config. Receivers get the ``path`` that changed and the
+#: ``keys`` that were updated or removed.
+custom_settings_reloaded = _signals.signal('custom-settings-reloaded')
+
+#: Sent when parse_input or parse_body fails to validate a request.
+#: Receivers get the ``model`` that was being validated and the pydantic
+#: ``error``.
+input_validation_failed = _signals.signal('input-validation-failed')
@@ -0,0 +1,133 @@
+import hashlib
+import marshal
+import os
+
+"""
+Precompiled configuration snapshots.
+
+A snapshot holds the fully resolved configuration of a scaffold (everything
+loaded from the config mapping, settings.cfg, FLASK_SETTINGS and the
+CUSTOM_SETTINGS tree) in a single marshal encoded file, so that a container
+can start without reading or parsing any of those files again. It records
+the inputs it was built from and a digest of every file that was read, and
+is only used while all of those still match.
+
+The file layout is the MAGIC bytes, a sha256 digest of the payload, then the
+marshal encoded payload itself.
+"""
+
+MAGIC = b'FCSS\x01'
+_DIGEST_SIZE = hashlib.sha256().digest_size
+
+
+class SnapshotError(ValueError):
+    """
+    Raised when a configuration can not be written to a snapshot.
+    """
+
+
+def file_digest(path):
+    """
+    Return the sha256 hex digest of a file's contents, or None if the file
+    does not exist.
+
+    :param str path: The file to digest
+    """
+    try:
+        with open(path, 'rb') as handle:
+            return hashlib.sha256(handle.read()).hexdigest()
+    except FileNotFoundError:
+        return None
+
+
+def build_inputs(scaffold):
+    """
+    Describe everything other than file contents that affects how a scaffold
+    resolves its configuration. A snapshot is only valid for the same inputs.
+
+    :param BaseScaffold scaffold: The scaffold being configured
+    :return: A tuple of strings
+    """
+    app = scaffold.flask_app
+    return (app.instance_path, app.config.root_path, repr(scaffold.config),
+            repr((scaffold.silent, scaffold.relative)),
+            os.environ.get('FLASK_SETTINGS', ''),
+            os.environ.get('CUSTOM_SETTINGS', ''),
+            repr(_env_overrides(scaffold.env_prefix())))
+
+
+def _env_overrides(prefix):
+    # The overrides are stored in the snapshot along with everything else,
+    # so it is only valid for the same override variables.
+    from flask_container_scaffold.overrides import SEPARATOR
+
+    if not prefix:
+        return []
+    return sorted((name, value) for name, value in os.environ.items()
+                  if name.startswith(prefix + SEPARATOR))
+
+
+def write_snapshot(path, inputs, sources, config, loaded_files):
+    """
+    Write a snapshot file.
+
+    :param str path: Where to write the snapshot
+    :param tuple inputs: The result of build_inputs for the scaffold
+    :param list sources: Paths of every file read while configuring
+    :param dict config: The configuration to store
+    :param list loaded_files: AppConfigurator.loaded_files as a list of
+        (path, file_type, keys) tuples
+    :raises: SnapshotError if a config value can not be marshalled
+    """
+    for key, value in config.items():
+        try:
+            marshal.dumps(value)
+        except ValueError:
+            raise SnapshotError(
+                f'Config value for {key!r} of type {type(value).__name__} '
+                f'can not be stored in a snapshot') from None
+    payload = marshal.dumps({
+        'inputs': tuple(inputs),
+        'sources': [(source, file_digest(source)) for source in sources],
+        'config': config,
+        'loaded_files': [tuple(entry) for entry in loaded_files],
+    })
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as handle:
+        handle.write(MAGIC)
+        handle.write(hashlib.sha256(payload).digest())
+        handle.write(payload)
+    os.replace(tmp_path, path)
+
+
+def read_snapshot(path, inputs):
+    """
+    Read a snapshot file, checking that it is intact and still matches the
+    given inputs and the current contents of every source file.
+
+    :param str path: The snapshot file
+    :param tuple inputs: The result of build_inputs for the scaffold
+    :return: The snapshot payload dict, or None if the snapshot is missing
+        or no longer valid.
+    """
+    try:
+        with open(path, 'rb') as handle:
+            data = handle.read()
+    except FileNotFoundError:
+        return None
+    header_size = len(MAGIC) + _DIGEST_SIZE
+    if not data.startswith(MAGIC) or len(data) < header_size:
+        return None
+    payload = data[header_size:]
+    if hashlib.sha256(payload).digest() != data[len(MAGIC):header_size]:
+        return None
+    try:
+        snapshot = marshal.loads(payload)
+    except (EOFError, ValueError, TypeError):
+        return None
+    if snapshot.get('inputs') != tuple(inputs):
+        return None
+    for source, digest in snapshot['sources']:
+        if file_digest(source) != digest:
+            return None
+    return snapshot
@@ -1,26 +1,56 @@
 import configparser
-import json
+import importlib
+import logging
 
-from flask import request
-from pydantic import ValidationError
-from toolchest.yaml import parse
+_logger = logging.getLogger(__name__)
 
-from flask_container_scaffold.base import BaseApiView
+# The request validation helpers need pydantic, which is slow to import, so
+# they live in their own module and are only loaded when first used. They are
+# still importable from here for backwards compatibility.
+_LAZY_ATTRIBUTES = {
+    'get_validator': 'flask_container_scaffold.validation',
+    'parse_body': 'flask_container_scaffold.validation',
+    'parse_input': 'flask_container_scaffold.validation',
+    'parse_input_async': 'flask_container_scaffold.validation',
+}
 
 
-# TODO: extract this method out to toolchest library.
-def load_yaml(filename='config.yml', logger=None):
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        return getattr(importlib.import_module(_LAZY_ATTRIBUTES[name]), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def load_yaml(filename='config.yml', logger=None, strict=False):
     """
-    Convenience wrapper around toolchest.yaml::parse to allow you to parse a
-    file by path+name
+    Safely parse a yaml file by path+name, using libyaml's C parser when
+    PyYAML was built with it, and the pure Python parser otherwise.
 
     :param str filename: A yaml file to be parsed
-    :param Logger logger: Optional logger for potential errors
-    :return: A dictionary formed out of the yaml data
+    :param Logger logger: Optional logger for potential errors, defaults to
+                          this module's logger
+    :param bool strict: Raise errors in the yaml data, rather than logging
+                        them and returning an empty dictionary
+    :return: A dictionary formed out of the yaml data, or an empty dictionary
+             if the data is not valid yaml
+    :raises: yaml.YAMLError if strict and the data is not valid yaml
     """
+    import yaml
+
+    loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
     config = {}
-    with open(filename, 'r') as file_handle:
-        config = parse(file_handle, logger=logger)
+    # libyaml detects the encoding itself, so pass it the raw bytes.
+    with open(filename, 'rb') as file_handle:
+        try:
+            config = yaml.load(file_handle, Loader=loader)
+        except yaml.YAMLError as exc:
+            if strict:
+                raise
+            msg = 'Error in yaml data'
+            if getattr(exc, 'problem_mark', None) is not None:
+                msg = (f'Yaml Error at: (line: {exc.problem_mark.line + 1}, '
+                       f'column: {exc.problem_mark.column + 1})')
+            (logger or _logger).error(msg)
     return config
 
 
@@ -45,43 +75,11 @@ def load_cfg(conf_file):
 def _parse_cfg(config):
     config_dict = {}
     for section in config.sections():
-        settings_dict = {}
-        for key in config[section]:
-            settings_dict[key] = config[section][key]
-        config_dict.update({section: settings_dict})
+        # Raw items include the DEFAULT section's values. Interpolation only
+        # changes values containing '%', so only those are looked up again.
+        settings_dict = dict(config.items(section, raw=True))
+        for key, value in settings_dict.items():
+            if '%' in value:
+                settings_dict[key] = config.get(section, key)
+        config_dict[section] = settings_dict
     return config_dict
-
-
-def parse_input(logger, obj, default_return=BaseApiView):
-    """
-    Parses incoming request, returns a serializable object to return
-    to the client in all cases. When there is a failure, the
-    object contains error information.
-
-    :param Logger logger: Instantiated logger object
-    :param BaseModel obj: An object type based on a pydantic BaseModel to
-                          attempt to parse.
-    :param BaseApiView default_return: An object type that will be returned if
-                                       validation of obj fails. This object
-                                       must descend from BaseApiView or
-                                       implement an errors field of type dict.
-    :returns: Instantiated object of type obj on success, or default_return
-              on failure to parse.
-    """
-    try:
-        if request.is_json:
-            parsed_args = obj.model_validate_json(json.dumps(request.json))
-        else:
-            if request.args:
-                args = request.args
-            else:
-                args = request.form
-            parsed_args = obj.model_validate_json(json.dumps(args.to_dict()))
-    except ValidationError as e:
-        logger.error(f"Validation error is: {e}")
-        errors_result = {}
-        errors_message = f"Errors detected: {e.error_count()}"
-        for error in e.errors():
-            errors_result[error.get("loc")[0]] = error.get("msg")
-        parsed_args = default_return(msg=errors_message, errors=errors_result)
-    return parsed_args
@@ -0,0 +1,388 @@
+import asyncio
+import contextvars
+import inspect
+import threading
+import typing
+from collections import Counter
+from functools import lru_cache, partial, wraps
+from time import perf_counter_ns
+
+from flask import current_app, request
+from pydantic import TypeAdapter, ValidationError
+from pydantic_core import from_json, to_json
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from flask_container_scaffold import instrumentation
+from flask_container_scaffold.base import BaseApiView
+from flask_container_scaffold.signals import input_validation_failed
+
+
+@lru_cache(maxsize=256)
+def get_validator(obj):
+    """
+    Return a cached TypeAdapter for the given type, so the validator for a
+    model is only looked up/built once per process rather than per request.
+
+    :param type obj: A pydantic BaseModel (or any type pydantic can validate)
+    :returns: A pydantic TypeAdapter for obj
+    """
+    return TypeAdapter(obj)
+
+
+#: The number of failed validations per model name, since the process
+#: started. Read it with get_failure_counts().
+failure_counts = Counter()
+_failure_counts_lock = threading.Lock()
+
+
+def get_failure_counts():
+    """
+    :return: A dict of model name to the number of requests that failed to
+        validate against it, in this process.
+    """
+    with _failure_counts_lock:
+        return dict(failure_counts)
+
+
+def model_name(obj):
+    """
+    Return a short name for a type being validated, eg. 'MyModel' or
+    'typing.List[MyModel]'.
+    """
+    return obj.__name__ if isinstance(obj, type) else repr(obj)
+
+
+def _errors_to_dict(error, max_rendered=None):
+    """
+    Shape a ValidationError into the dict format used by BaseApiView.errors,
+    keyed by the top level field name. Errors that do not belong to a field
+    (invalid JSON, a non-object body) are keyed by '__root__'. Errors in the
+    items of a list are grouped by item index, then keyed by field name.
+    Only the location and message of each error are used, so the URL,
+    context and input are not rendered, and only the first max_rendered
+    errors are included, if it is set.
+    """
+    errors_result = {}
+    error_items = error.errors(include_url=False, include_context=False,
+                               include_input=False)
+    for error_item in error_items[:max_rendered]:
+        loc = error_item.get("loc")
+        if loc and isinstance(loc[0], int):
+            item_errors = errors_result.setdefault(loc[0], {})
+            item_errors[loc[1] if len(loc) > 1 else '__root__'] = (
+                error_item.get("msg"))
+        else:
+            errors_result[loc[0] if loc else '__root__'] = (
+                error_item.get("msg"))
+    return errors_result
+
+
+class BatchValidationError(ValueError):
+    """
+    The errors found validating a list in chunks, before validation stopped.
+    Provides the errors() and error_count() methods of a ValidationError.
+
+    :param list errors: The error dicts, with item indexes in their loc
+    """
+
+    def __init__(self, errors):
+        super().__init__(f'{len(errors)} validation errors in batch')
+        self._errors = errors
+
+    def errors(self, **kwargs):
+        # The errors were collected without urls, context or input already.
+        return self._errors
+
+    def error_count(self):
+        return len(self._errors)
+
+
+#: How many items of a list are validated at a time when max_errors is used.
+BATCH_CHUNK_SIZE = 100
+
+
+def _is_list_type(obj):
+    return typing.get_origin(obj) is list
+
+
+def _validate_batch(validator, body, max_errors):
+    """
+    Validate a JSON array against a list type in chunks, stopping once
+    max_errors errors have been found, so a bad batch costs no more than a
+    good one.
+    """
+    try:
+        items = from_json(body)
+    except ValueError:
+        # Let pydantic report the invalid JSON in its usual way.
+        return validator.validate_json(body)
+    if not isinstance(items, list):
+        return validator.validate_json(body)
+    result = []
+    errors = []
+    for offset in range(0, len(items), BATCH_CHUNK_SIZE):
+        chunk = items[offset:offset + BATCH_CHUNK_SIZE]
+        try:
+            result.extend(validator.validate_python(chunk))
+            continue
+        except ValidationError:
+            pass
+        # The parsed items are valid if the JSON is for lax models. Strict
+        # ones only accept types like datetime and UUID from strings in JSON,
+        # so a chunk that fails is validated again as JSON, as the whole
+        # body would be, which also gives the errors it would.
+        try:
+            result.extend(validator.validate_json(to_json(chunk)))
+        except ValidationError as e:
+            for error_item in e.errors(include_url=False,
+                                       include_context=False,
+                                       include_input=False):
+                loc = error_item['loc']
+                error_item['loc'] = (loc[0] + offset,) + loc[1:]
+                errors.append(error_item)
+            if len(errors) >= max_errors:
+                break
+    if errors:
+        raise BatchValidationError(errors[:max_errors])
+    return result
+
+
+def _timed(func):
+    """
+    Add the time spent in func to the request's 'validation' timing, when
+    instrumentation is enabled.
+    """
+    if inspect.iscoroutinefunction(func):
+        @wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            if not instrumentation.enabled:
+                return await func(*args, **kwargs)
+            timings = request.environ.get(
+                instrumentation.TIMINGS_ENVIRON_KEY)
+            if timings is None:
+                return await func(*args, **kwargs)
+            start = perf_counter_ns()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                timings['validation'] = (timings.get('validation', 0) +
+                                         perf_counter_ns() - start)
+        return async_wrapper
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if not instrumentation.enabled:
+            return func(*args, **kwargs)
+        timings = request.environ.get(instrumentation.TIMINGS_ENVIRON_KEY)
+        if timings is None:
+            return func(*args, **kwargs)
+        start = perf_counter_ns()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            timings['validation'] = (timings.get('validation', 0) +
+                                     perf_counter_ns() - start)
+    return wrapper
+
+
+def _validation_failed(logger, obj, error, default_return):
+    """
+    Build the default_return object describing a ValidationError, count the
+    failure and send the input_validation_failed signal.
+
+    With the SCAFFOLD_VALIDATION_ERRORS setting set to 'compact', only the
+    model and number of errors are logged, rather than the full text of
+    every error, and SCAFFOLD_MAX_RENDERED_ERRORS limits how many errors are
+    put in the returned errors dict.
+    """
+    name = model_name(obj)
+    with _failure_counts_lock:
+        failure_counts[name] += 1
+    app = current_app._get_current_object()
+    if input_validation_failed.receivers:
+        input_validation_failed.send(app, model=obj, error=error)
+    error_count = error.error_count()
+    if app.config.get('SCAFFOLD_VALIDATION_ERRORS') == 'compact':
+        logger.error("Validation of %s failed with %d errors", name,
+                     error_count)
+    else:
+        # Only rendered if the record is emitted.
+        logger.error("Validation error is: %s", error)
+    errors_message = f"Errors detected: {error_count}"
+    return default_return(msg=errors_message, errors=_errors_to_dict(
+        error, app.config.get('SCAFFOLD_MAX_RENDERED_ERRORS')))
+
+
+@_timed
+def parse_input(logger, obj, default_return=BaseApiView, max_errors=None):
+    """
+    Parses incoming request, returns a serializable object to return
+    to the client in all cases. When there is a failure, the
+    object contains error information.
+
+    JSON bodies are validated directly from the raw request bytes, and
+    query string/form data is validated from the decoded values, so the
+    request data is never re-encoded before validation.
+
+    To validate a JSON array of models, pass a list type such as
+    List[MyModel] as obj. The whole array is validated in one call, and on
+    failure the errors are grouped by item index, eg.
+    {0: {'name': 'Field required'}, 3: {'__root__': '...'}}.
+
+    :param Logger logger: Instantiated logger object
+    :param BaseModel obj: An object type based on a pydantic BaseModel to
+                          attempt to parse.
+    :param BaseApiView default_return: An object type that will be returned if
+                                       validation of obj fails. This object
+                                       must descend from BaseApiView or
+                                       implement an errors field of type dict.
+    :param int max_errors: For list types, stop validating once this many
+                           errors have been found. The array is then
+                           validated BATCH_CHUNK_SIZE items at a time.
+    :returns: Instantiated object of type obj on success, or default_return
+              on failure to parse.
+    :raises: ValueError if max_errors is less than 1
+    """
+    try:
+        parsed_args = _validate_input(obj, *_read_input(),
+                                      max_errors=max_errors)
+    except (ValidationError, BatchValidationError) as e:
+        parsed_args = _validation_failed(logger, obj, e, default_return)
+    return parsed_args
+
+
+def _read_input():
+    """
+    Read the data parse_input validates from the current request.
+
+    :return: A tuple of whether the data is a JSON body, and the data,
+        either the raw body or a dict of the query string or form values.
+    """
+    if request.is_json:
+        return True, request.get_data()
+    if request.args:
+        args = request.args
+    else:
+        args = request.form
+    return False, args.to_dict()
+
+
+def _validate_input(obj, is_json, data, max_errors=None):
+    if max_errors is not None and max_errors < 1:
+        raise ValueError('max_errors must be at least 1')
+    validator = get_validator(obj)
+    if is_json:
+        if max_errors is not None and _is_list_type(obj):
+            return _validate_batch(validator, data, max_errors)
+        return validator.validate_json(data)
+    return validator.validate_strings(data)
+
+
+async def _run_in_thread(func, *args):
+    """
+    Run func in the event loop's default executor, in a copy of the current
+    context so the request and app context are available to it.
+    """
+    context = contextvars.copy_context()
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, partial(context.run, func,
+                                                    *args))
+
+
+@_timed
+async def parse_input_async(logger, obj, default_return=BaseApiView,
+                            offload_size=None, max_errors=None):
+    """
+    The same as parse_input, for async views. The request body is read in a
+    worker thread, so a slow client does not block the event loop, and
+    bodies larger than offload_size are validated in a worker thread too.
+    Small payloads are validated inline, where that is cheaper than handing
+    them to a thread. Failures return the same default_return object as
+    parse_input.
+
+    :param Logger logger: Instantiated logger object
+    :param BaseModel obj: An object type based on a pydantic BaseModel to
+                          attempt to parse.
+    :param BaseApiView default_return: An object type that will be returned if
+                                       validation of obj fails.
+    :param int offload_size: The size in bytes above which validation is run
+                             in a thread. Defaults to the app's
+                             SCAFFOLD_ASYNC_OFFLOAD_SIZE setting, or 64KiB.
+    :param int max_errors: See parse_input.
+    :returns: Instantiated object of type obj on success, or default_return
+              on failure to parse.
+    """
+    if offload_size is None:
+        offload_size = current_app.config.get('SCAFFOLD_ASYNC_OFFLOAD_SIZE',
+                                              64 * 1024)
+    is_json, data = await _run_in_thread(_read_input)
+    try:
+        if is_json and len(data) > offload_size:
+            parsed_args = await _run_in_thread(_validate_input, obj, is_json,
+                                               data, max_errors)
+        else:
+            parsed_args = _validate_input(obj, is_json, data, max_errors)
+    except (ValidationError, BatchValidationError) as e:
+        parsed_args = _validation_failed(logger, obj, e, default_return)
+    return parsed_args
+
+
+def _body_too_large(logger, default_return, max_length):
+    """
+    Build the default_return object for a body that exceeds max_length.
+    """
+    logger.error(f"Rejected request body larger than {max_length} bytes")
+    return default_return(
+        msg="Request body too large",
+        errors={'__root__': f"Request body exceeds {max_length} bytes"})
+
+
+@_timed
+def parse_body(logger, obj, default_return=BaseApiView, max_length=None,
+               max_errors=None):
+    """
+    Parses the raw JSON body of the incoming request, returns a serializable
+    object to return to the client in all cases. When there is a failure, the
+    object contains error information.
+
+    Unlike parse_input, the body is read from the input stream exactly once
+    and is not cached on the request, so only a single copy of the body is
+    held in memory while it is validated. This means request.json and
+    request.get_data() will not return the body after this is called.
+
+    :param Logger logger: Instantiated logger object
+    :param BaseModel obj: An object type based on a pydantic BaseModel to
+                          attempt to parse.
+    :param BaseApiView default_return: An object type that will be returned if
+                                       validation of obj fails. This object
+                                       must descend from BaseApiView or
+                                       implement an errors field of type dict.
+    :param int max_length: The largest body, in bytes, that will be read.
+                           Defaults to the app's MAX_CONTENT_LENGTH setting.
+                           Larger bodies are rejected before being buffered.
+    :param int max_errors: See parse_input.
+    :returns: Instantiated object of type obj on success, or default_return
+              on failure to parse.
+    """
+    if max_length is None:
+        max_length = request.max_content_length
+    content_length = request.content_length
+    if (max_length is not None and content_length is not None and
+            content_length > max_length):
+        return _body_too_large(logger, default_return, max_length)
+    try:
+        if max_length is not None and content_length is None:
+            # Chunked requests do not declare a length up front, so only
+            # read one byte past the limit to find out if it is exceeded.
+            body = request.stream.read(max_length + 1)
+        else:
+            body = request.get_data(cache=False)
+    except RequestEntityTooLarge:
+        body = None
+    if body is None or (max_length is not None and len(body) > max_length):
+        return _body_too_large(logger, default_return, max_length)
+    try:
+        parsed_args = _validate_input(obj, True, body, max_errors)
+    except (ValidationError, BatchValidationError) as e:
+        parsed_args = _validation_failed(logger, obj, e, default_return)
+    return parsed_args
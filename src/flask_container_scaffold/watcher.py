@@ -0,0 +1,251 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import sys
+import threading
+
+from flask_container_scaffold.signals import custom_settings_reloaded
+
+# Flags from <sys/inotify.h>. Directories are watched rather than the files
+# themselves, so atomic replacements (including the symlink swap Kubernetes
+# uses to update a mounted ConfigMap) are seen as well as in-place writes.
+_IN_MODIFY = 0x00000002
+_IN_ATTRIB = 0x00000004
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_WATCH_MASK = (_IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM |
+               _IN_MOVED_TO | _IN_CREATE | _IN_DELETE)
+
+
+def _load_libc():
+    """
+    Return libc if it provides inotify, otherwise None.
+    """
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6',
+                           use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+class _Inotify(object):
+    """
+    Minimal ctypes wrapper around an inotify instance watching directories.
+    """
+
+    def __init__(self, libc):
+        self._libc = libc
+        self._watched = set()
+        self.fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+
+    def watch(self, directory):
+        if directory in self._watched:
+            return
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(directory),
+                                          _WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(),
+                          f'inotify_add_watch failed for {directory}')
+        self._watched.add(directory)
+
+    def drain(self):
+        # Events only tell us to look, the files are compared by stat.
+        try:
+            while os.read(self.fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+
+    def close(self):
+        os.close(self.fd)
+
+
+class SettingsWatcher(object):
+
+    def __init__(self, configurator, interval=1.0, settle=0.1,
+                 use_inotify=True):
+        """
+        Watches the custom settings files loaded by an AppConfigurator, and
+        reloads any file that changes into the app's config, sending the
+        custom_settings_reloaded signal afterwards.
+
+        On Linux, inotify is used so the watcher thread sleeps until a
+        watched directory changes. Elsewhere, or if inotify can not be used,
+        the files are polled with os.stat every interval seconds.
+
+        :param AppConfigurator configurator: The configurator that loaded the
+            files to watch.
+        :param float interval: Seconds between checks when polling.
+        :param float settle: Seconds to wait after an inotify event before
+            reading files, so that writers have finished.
+        :param bool use_inotify: Set to False to always poll.
+        """
+        self.configurator = configurator
+        self.app = configurator.app
+        self.interval = interval
+        self.settle = settle
+        self._libc = _load_libc() if use_inotify else None
+        self._states = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self._inotify = None
+        self._wake = None
+
+    @property
+    def mode(self):
+        """
+        Either 'inotify' or 'poll', depending on how changes are detected.
+        """
+        return 'inotify' if self._libc is not None else 'poll'
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """
+        Record the current state of every loaded file and start watching
+        them in a background daemon thread.
+        """
+        if self.running:
+            return self
+        self._stop.clear()
+        self._record_states()
+        target = self._poll
+        if self._libc is not None:
+            try:
+                self._inotify = _Inotify(self._libc)
+                self._watch_directories()
+                self._wake = os.pipe()
+                target = self._wait_for_events
+            except OSError:
+                self.app.logger.warning(
+                    'inotify unavailable, polling custom settings instead')
+                if self._inotify is not None:
+                    self._inotify.close()
+                    self._inotify = None
+                self._libc = None
+        self._thread = threading.Thread(target=target,
+                                        name='scaffold-settings-watcher',
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stop watching and wait for the background thread to exit.
+        """
+        self._stop.set()
+        if self._wake is not None:
+            os.write(self._wake[1], b'x')
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+        if self._wake is not None:
+            for fd in self._wake:
+                os.close(fd)
+            self._wake = None
+
+    def restart_after_fork(self):
+        """
+        Start watching again in a forked child process. The watcher thread
+        of the parent does not exist in the child, and the descriptors it
+        used are still the parent's to use, so the child's copies are closed
+        and new ones are opened. Does nothing if the watcher was not running
+        when the process forked.
+        """
+        if self._thread is None:
+            return self
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+        if self._wake is not None:
+            for fd in self._wake:
+                os.close(fd)
+            self._wake = None
+        self._thread = None
+        self._stop = threading.Event()
+        return self.start()
+
+    def check(self):
+        """
+        Reload every loaded file whose inode, size or mtime has changed since
+        it was last seen. Files that are missing, eg. in the middle of being
+        replaced, are skipped until they reappear.
+
+        :return: A list of the paths that were reloaded
+        """
+        reloaded = []
+        for path in list(self.configurator.loaded_files):
+            state = self._stat(path)
+            if state is None or self._states.get(path) == state:
+                continue
+            # Record the new state first, so a broken file is only retried
+            # once it changes again.
+            self._states[path] = state
+            try:
+                keys = self.configurator.reload(path)
+            except Exception:
+                self.app.logger.exception(
+                    f'Failed to reload custom settings from {path}')
+                continue
+            reloaded.append(path)
+            custom_settings_reloaded.send(self.app, path=path, keys=keys)
+        # Pick up any files newly included by a reloaded file.
+        self._record_states(only_new=True)
+        return reloaded
+
+    def _poll(self):
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def _wait_for_events(self):
+        while not self._stop.is_set():
+            readable, _, _ = select.select([self._inotify.fd, self._wake[0]],
+                                           [], [])
+            if self._wake[0] in readable:
+                break
+            if self._stop.wait(self.settle):
+                break
+            self._inotify.drain()
+            self.check()
+            try:
+                self._watch_directories()
+            except OSError:
+                self.app.logger.exception('Unable to add inotify watch')
+
+    def _watch_directories(self):
+        for path in self._states:
+            self._inotify.watch(os.path.dirname(path))
+
+    def _record_states(self, only_new=False):
+        for path in self.configurator.loaded_files:
+            if only_new and path in self._states:
+                continue
+            state = self._stat(path)
+            if state is not None:
+                self._states[path] = state
+
+    @staticmethod
+    def _stat(path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
@@ -0,0 +1,68 @@
+import os
+import tracemalloc
+
+import pytest
+
+from flask_container_scaffold.config_cache import file_cache
+
+# Each generated config file includes up to this many other files, so the
+# trees are several levels deep rather than one flat list of references.
+FANOUT = 10
+SETTINGS_PER_FILE = 20
+
+
+def generate_config_tree(directory, count):
+    """
+    Write count yaml files into directory, where file N includes files
+    FANOUT*N+1 to FANOUT*N+FANOUT, and return the path of the root file.
+    """
+    for index in range(count):
+        lines = [f'section_{index}:']
+        lines += [f'  key_{key}: value_{key}'
+                  for key in range(SETTINGS_PER_FILE)]
+        children = range(FANOUT * index + 1,
+                         min(FANOUT * index + FANOUT + 1, count))
+        lines += [f'include_{child}: {directory}/file_{child}.yml'
+                  for child in children]
+        with open(os.path.join(directory, f'file_{index}.yml'), 'w') as out:
+            out.write('\n'.join(lines) + '\n')
+    return os.path.join(directory, 'file_0.yml')
+
+
+@pytest.fixture(scope='session', params=[10, 100, 1000])
+def config_tree(request, tmp_path_factory):
+    """
+    The root file of a generated tree of nested yaml config files.
+    """
+    directory = tmp_path_factory.mktemp(f'tree_{request.param}')
+    return request.param, generate_config_tree(str(directory), request.param)
+
+
+@pytest.fixture
+def cold_cache():
+    """
+    Make sure the shared parse cache is empty before, and after, a benchmark
+    that should measure the cost of reading files from disk.
+    """
+    file_cache.invalidate()
+    yield file_cache.invalidate
+    file_cache.invalidate()
+
+
+@pytest.fixture
+def record_peak_memory(benchmark):
+    """
+    Run a callable once under tracemalloc and record its peak allocation in
+    the benchmark's extra_info, so it is reported alongside the timings.
+    """
+    def record(func, setup=None):
+        if setup is not None:
+            setup()
+        tracemalloc.start()
+        try:
+            func()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        benchmark.extra_info['peak_memory_kb'] = round(peak / 1024, 1)
+    return record
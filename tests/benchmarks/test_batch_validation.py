@@ -0,0 +1,78 @@
+import io
+import json
+import logging
+from typing import List
+
+import pytest
+from flask import Flask
+from pydantic import BaseModel, ValidationError
+
+from flask_container_scaffold.validation import get_validator, parse_body
+
+LOGGER = logging.getLogger('bench')
+LOGGER.disabled = True
+
+
+class Item(BaseModel):
+    id: int
+    name: str
+    price: float
+
+
+GOOD = json.dumps([{'id': i, 'name': f'item {i}', 'price': i / 10}
+                   for i in range(1000)]).encode()
+BAD = json.dumps([{'id': 'x', 'price': 'y'} for _ in range(1000)]).encode()
+
+
+def per_item(body):
+    # Validating each item separately, as views did before list mode.
+    validator = get_validator(Item)
+    results, errors = [], {}
+    for index, item in enumerate(json.loads(body)):
+        try:
+            results.append(validator.validate_python(item))
+        except ValidationError as e:
+            errors[index] = {error['loc'][0]: error['msg']
+                             for error in e.errors()}
+    return results, errors
+
+
+def _parse_body(body, **kwargs):
+    app = Flask('bench')
+    with app.test_request_context(data=body,
+                                  content_type='application/json'):
+        return parse_body(LOGGER, List[Item], **kwargs)
+
+
+@pytest.mark.parametrize('body', [GOOD, BAD], ids=['good', 'bad'])
+def test_per_item(benchmark, body):
+    benchmark(per_item, body)
+
+
+@pytest.mark.parametrize('body', [GOOD, BAD], ids=['good', 'bad'])
+def test_list_mode(benchmark, body):
+    benchmark(_parse_body, body)
+
+
+@pytest.mark.parametrize('body', [GOOD, BAD], ids=['good', 'bad'])
+def test_list_mode_max_errors(benchmark, body):
+    benchmark(_parse_body, body, max_errors=10)
+
+
+@pytest.mark.parametrize('mode', ['full', 'compact'])
+def test_error_modes(benchmark, mode):
+    # A fully invalid batch, with the log output written to memory.
+    app = Flask('bench')
+    app.config['SCAFFOLD_VALIDATION_ERRORS'] = mode
+    if mode == 'compact':
+        app.config['SCAFFOLD_MAX_RENDERED_ERRORS'] = 20
+    logger = logging.getLogger(f'bench.{mode}')
+    logger.propagate = False
+    logger.addHandler(logging.StreamHandler(io.StringIO()))
+
+    def run():
+        with app.test_request_context(data=BAD,
+                                      content_type='application/json'):
+            return parse_body(logger, List[Item])
+
+    benchmark(run)
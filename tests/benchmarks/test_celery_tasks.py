@@ -0,0 +1,66 @@
+import contextvars
+import threading
+
+import pytest
+from celery import Celery
+from celery.app.trace import build_tracer
+
+from flask_container_scaffold import celery_task
+from flask_container_scaffold.celery_scaffold import CeleryScaffold
+
+
+def _add(x, y):
+    return x + y
+
+
+def _no_context_task():
+    return Celery('plain').task(_add, ignore_result=True)
+
+
+def _push_per_task_task():
+    # The previous pattern: a plain task pushing the app context itself.
+    flask_app = CeleryScaffold().flask_app
+
+    @Celery('plain').task(ignore_result=True)
+    def add(x, y):
+        with flask_app.app_context():
+            return _add(x, y)
+    return add
+
+
+def _scaffold_task(reuse):
+    scaffold = CeleryScaffold(
+        config={'SCAFFOLD_CELERY_REUSE_CONTEXT': reuse})
+    return scaffold.celery_app.task(_add, ignore_result=True)
+
+
+TASKS = {'no_context': _no_context_task,
+         'push_per_task': _push_per_task_task,
+         'scaffold_per_task': lambda: _scaffold_task(False),
+         'scaffold_reused': lambda: _scaffold_task(True)}
+
+
+def _traces(tracer):
+    for _ in range(100):
+        tracer('id', (1, 2), {})
+
+
+def _applies(task):
+    for _ in range(100):
+        task.apply((1, 2))
+
+
+@pytest.mark.parametrize('name', list(TASKS))
+def test_solo_task_overhead(benchmark, monkeypatch, name):
+    # What the solo pool, and each prefork child, runs for every message.
+    monkeypatch.setattr(celery_task, '_worker_thread', threading.get_ident())
+    task = TASKS[name]()
+    tracer = build_tracer(task.name, task, app=task.app)
+    # Keep the worker's app context from outliving the benchmark.
+    benchmark(contextvars.copy_context().run, _traces, tracer)
+
+
+@pytest.mark.parametrize('name', ['no_context', 'push_per_task',
+                                  'scaffold_per_task'])
+def test_eager_task_overhead(benchmark, name):
+    benchmark(_applies, TASKS[name]())
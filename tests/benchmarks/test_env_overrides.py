@@ -0,0 +1,19 @@
+import pytest
+
+from flask_container_scaffold.overrides import read_env_overrides
+
+
+@pytest.fixture(scope='module')
+def config():
+    return {f'SECTION_{section}': {f'key_{key}': key for key in range(20)}
+            for section in range(100)}
+
+
+@pytest.mark.parametrize('size', [100, 2000])
+def test_read_env_overrides(benchmark, config, size):
+    # A pod's environment: mostly unrelated variables, with one in ten an
+    # override of a nested setting.
+    environ = {f'UNRELATED_{index}': 'value' for index in range(size)}
+    environ.update({f'SCAFFOLD__SECTION_{index % 100}__KEY_{index % 20}': '1'
+                    for index in range(size // 10)})
+    benchmark(read_env_overrides, 'SCAFFOLD', config, environ=environ)
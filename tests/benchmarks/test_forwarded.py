@@ -0,0 +1,48 @@
+import pytest
+
+from flask_container_scaffold.network import (get_remote_addr_from_environ,
+                                              parse_forwarded, trusted_networks)
+
+SINGLE = 'for=192.0.2.60;host=example.com;proto=https'
+MULTI_HOP = ('for=203.0.113.7;proto=https, for="[2001:db8:cafe::17]:4711", '
+             'for=10.1.2.3;by=10.0.0.1, for=10.0.0.2')
+TRUSTED = ['10.0.0.0/8', '2001:db8::/32']
+
+
+def legacy_get_ip_from_forwarded_field(field):
+    """
+    The original implementation, which only looks at the first hop and
+    splits naively on ';' and '=', kept here for comparison.
+    """
+    forwarded = field.split(",")[0]
+    for value in forwarded.split(";"):
+        if value.startswith("for="):
+            return value.split("=")[1]
+    else:
+        return None
+
+
+@pytest.mark.parametrize('field', [SINGLE, MULTI_HOP],
+                         ids=['single', 'multi_hop'])
+def test_legacy_first_hop(benchmark, field):
+    benchmark(legacy_get_ip_from_forwarded_field, field)
+
+
+@pytest.mark.parametrize('field', [SINGLE, MULTI_HOP],
+                         ids=['single', 'multi_hop'])
+def test_parse_forwarded_uncached(benchmark, field):
+    benchmark(parse_forwarded.__wrapped__, field)
+
+
+@pytest.mark.parametrize('field', [SINGLE, MULTI_HOP],
+                         ids=['single', 'multi_hop'])
+def test_parse_forwarded_cached(benchmark, field):
+    benchmark(parse_forwarded, field)
+
+
+@pytest.mark.parametrize('trusted', [None, TRUSTED],
+                         ids=['first_hop', 'trusted_walk'])
+def test_resolve_client_addr(benchmark, trusted):
+    environ = {'REMOTE_ADDR': '10.0.0.3', 'HTTP_FORWARDED': MULTI_HOP}
+    trusted_networks(trusted)
+    benchmark(get_remote_addr_from_environ, environ, trusted)
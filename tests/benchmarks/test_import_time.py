@@ -0,0 +1,63 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+# Extra time, in milliseconds, that importing app_scaffold may take on top of
+# importing flask itself. This is generous, pulling pydantic back in alone
+# costs more than this, but can be raised on very slow machines.
+IMPORT_OVERHEAD_BUDGET_MS = float(
+    os.environ.get('SCAFFOLD_IMPORT_BUDGET_MS', 50))
+HEAVY_MODULES = ['celery', 'pydantic', 'toolchest', 'yaml']
+
+
+def _importtime(module):
+    """
+    Import module in a fresh interpreter with -X importtime, and return the
+    cumulative import time in microseconds of every module it imported.
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True, text=True, check=True)
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        timings[name.strip()] = int(cumulative)
+    return timings
+
+
+@pytest.mark.parametrize('module', ['flask_container_scaffold',
+                                    'flask_container_scaffold.app_scaffold',
+                                    'flask_container_scaffold.util'])
+def test_no_heavy_imports(module):
+    """
+    GIVEN a fresh interpreter
+    WHEN we import a module an app needs to build an AppScaffold
+    THEN none of the optional, slow to import dependencies are imported
+    """
+    timings = _importtime(module)
+    for heavy in HEAVY_MODULES:
+        assert heavy not in timings, f'{module} imports {heavy}'
+
+
+def test_app_scaffold_import_overhead(benchmark):
+    """
+    GIVEN a fresh interpreter
+    WHEN we import app_scaffold
+    THEN the time spent on top of importing flask stays within budget
+    """
+    # Wall clock budgets are flaky on loaded machines, so this uses the
+    # benchmark fixture to only run with the benchmarks, not with
+    # --benchmark-skip.
+    overheads = []
+
+    def measure():
+        timings = _importtime('flask_container_scaffold.app_scaffold')
+        overheads.append((timings['flask_container_scaffold.app_scaffold'] -
+                          timings['flask']) / 1000)
+
+    benchmark.pedantic(measure, rounds=3, iterations=1)
+    assert min(overheads) < IMPORT_OVERHEAD_BUDGET_MS
@@ -0,0 +1,90 @@
+import configparser
+
+import pytest
+import yaml
+
+from flask_container_scaffold.util import _parse_cfg, load_cfg, load_yaml
+
+
+def _generate_yaml(path, size_mb):
+    """
+    Write a yaml file of roughly size_mb megabytes, of nested sections with
+    mixed value types like a generated CUSTOM_SETTINGS file.
+    """
+    with open(path, 'w') as out:
+        section = 0
+        while out.tell() < size_mb * 1024 * 1024:
+            out.write(f'section_{section}:\n')
+            for key in range(20):
+                out.write(f'  key_{key}: "value {section}-{key}"\n')
+            out.write('  numbers: [1, 2.5, 3]\n  nested:\n'
+                      '    enabled: true\n    name: thing\n')
+            section += 1
+    return str(path)
+
+
+@pytest.fixture(scope='module', params=[2, 5], ids=['2MB', '5MB'])
+def large_yaml(request, tmp_path_factory):
+    return _generate_yaml(tmp_path_factory.mktemp('yaml') / 'large.yml',
+                          request.param)
+
+
+@pytest.fixture(scope='module')
+def large_cfg(tmp_path_factory):
+    path = tmp_path_factory.mktemp('cfg') / 'large.cfg'
+    with open(path, 'w') as out:
+        out.write('[DEFAULT]\nshared = yes\n')
+        for section in range(5000):
+            out.write(f'[section_{section}]\n')
+            out.write(''.join(f'key_{key} = value {key}\n'
+                              for key in range(20)))
+    return str(path)
+
+
+def _pure_python_load(path):
+    # The previous path: the pure Python safe loader on a text stream.
+    with open(path) as handle:
+        return yaml.safe_load(handle)
+
+
+def test_yaml_pure_python(benchmark, large_yaml):
+    benchmark.pedantic(_pure_python_load, (large_yaml,), rounds=1)
+
+
+@pytest.mark.skipif(not hasattr(yaml, 'CSafeLoader'),
+                    reason='PyYAML was built without libyaml')
+def test_yaml_libyaml(benchmark, large_yaml):
+    result = benchmark.pedantic(load_yaml, (large_yaml,), rounds=3)
+    assert result == _pure_python_load(large_yaml)
+
+
+def _copy_key_by_key(config):
+    # The previous _parse_cfg, for comparison.
+    config_dict = {}
+    for section in config.sections():
+        settings_dict = {}
+        for key in config[section]:
+            settings_dict[key] = config[section][key]
+        config_dict.update({section: settings_dict})
+    return config_dict
+
+
+@pytest.fixture(scope='module')
+def parsed_cfg(large_cfg):
+    config = configparser.ConfigParser()
+    config.optionxform = lambda option: option
+    with open(large_cfg) as handle:
+        config.read_file(handle)
+    return config
+
+
+def test_cfg_copy_key_by_key(benchmark, parsed_cfg):
+    benchmark(_copy_key_by_key, parsed_cfg)
+
+
+def test_cfg_single_pass(benchmark, parsed_cfg):
+    assert benchmark(_parse_cfg, parsed_cfg) == _copy_key_by_key(parsed_cfg)
+
+
+def test_load_cfg(benchmark, large_cfg):
+    benchmark(load_cfg, large_cfg)
@@ -0,0 +1,35 @@
+import logging
+
+import pytest
+from flask import Flask
+
+from flask_container_scaffold.logging import (FlaskRequestFormatter,
+                                              JSONRequestFormatter)
+
+TEXT_FORMAT = ('[%(asctime)s] %(remote_addr)s %(levelname)s in %(module)s: '
+               '%(message)s')
+ENVIRON = {'REMOTE_ADDR': '10.0.0.1',
+           'HTTP_FORWARDED': 'for=192.0.2.60;proto=https'}
+
+
+@pytest.fixture
+def request_context():
+    app = Flask('bench')
+    with app.test_request_context('/things', environ_base=ENVIRON,
+                                  headers={'X-Request-ID': 'abc'}):
+        yield
+
+
+def _record():
+    return logging.LogRecord('bench', logging.INFO, __file__, 1,
+                             'Handled %s items', (42,), None)
+
+
+def test_text_formatter(benchmark, request_context):
+    formatter = FlaskRequestFormatter(TEXT_FORMAT)
+    benchmark(lambda: formatter.format(_record()))
+
+
+def test_json_formatter(benchmark, request_context):
+    formatter = JSONRequestFormatter()
+    benchmark(lambda: formatter.format(_record()))
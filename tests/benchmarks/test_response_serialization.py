@@ -0,0 +1,57 @@
+from typing import List
+
+import pytest
+from flask import Flask, jsonify
+
+from flask_container_scaffold.base import BaseApiView
+from flask_container_scaffold.responses import json_response, ndjson_response
+
+
+class Item(BaseApiView):
+    id: int
+    name: str
+    tags: List[str]
+
+
+class Listing(BaseApiView):
+    items: List[Item]
+
+
+LISTING = Listing(items=[Item(id=i, name=f'item {i}', tags=['a', 'b'])
+                         for i in range(1000)])
+
+
+def test_model_dump_jsonify(benchmark):
+    with Flask('bench').app_context():
+        benchmark(lambda: jsonify(LISTING.model_dump()).get_data())
+
+
+def test_json_response(benchmark):
+    with Flask('bench').app_context():
+        benchmark(lambda: json_response(LISTING).get_data())
+
+
+def _items(count):
+    for i in range(count):
+        yield Item(id=i, name=f'item {i}', tags=['a', 'b'])
+
+
+@pytest.mark.parametrize('count', [1000, 10000, 100000])
+def test_built_listing_peak_memory(benchmark, record_peak_memory, count):
+    # The whole listing built and encoded in memory, for comparison.
+    with Flask('bench').app_context():
+        record_peak_memory(lambda: json_response(
+            Listing(items=list(_items(count)))).get_data())
+        benchmark.pedantic(lambda: json_response(
+            Listing(items=list(_items(count)))).get_data(), rounds=1)
+
+
+@pytest.mark.parametrize('count', [1000, 10000, 100000])
+def test_ndjson_peak_memory(benchmark, record_peak_memory, count):
+    def consume():
+        for _ in ndjson_response(_items(count), envelope=BaseApiView()
+                                 ).response:
+            pass
+
+    record_peak_memory(consume)
+    benchmark.pedantic(consume, rounds=1)
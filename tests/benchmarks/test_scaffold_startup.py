@@ -0,0 +1,97 @@
+import pytest
+
+from flask_container_scaffold.base_scaffold import BaseScaffold
+
+CONFIG = {'TESTING': True,
+          'CUSTOM_SETTINGS': {'GIT_BASE_URL': 'http://foo.com/cgit'}}
+
+
+def _bench(benchmark, record_peak_memory, func, setup=None, rounds=20):
+    record_peak_memory(func, setup)
+    benchmark.pedantic(func, setup=setup, rounds=rounds, iterations=1)
+
+
+def test_dict_config(benchmark, record_peak_memory):
+    """
+    Construct a BaseScaffold from a config mapping only.
+    """
+    _bench(benchmark, record_peak_memory, lambda: BaseScaffold(config=CONFIG))
+
+
+def test_settings_cfg(benchmark, record_peak_memory, mock_instance_folder,
+                      cold_cache):
+    """
+    Construct a BaseScaffold from an instance folder with a settings.cfg,
+    which in turn references a custom settings yaml file.
+    """
+    _bench(benchmark, record_peak_memory,
+           lambda: BaseScaffold(instance_path=mock_instance_folder),
+           setup=cold_cache)
+
+
+def test_flask_settings_env(benchmark, record_peak_memory, mock_env_vars,
+                            mock_instance_folder, cold_cache):
+    """
+    Construct a BaseScaffold that also loads the FLASK_SETTINGS file.
+    """
+    _bench(benchmark, record_peak_memory,
+           lambda: BaseScaffold(config={'TESTING': True},
+                                instance_path=mock_instance_folder),
+           setup=cold_cache)
+
+
+@pytest.mark.parametrize('cached', [False, True], ids=['cold', 'cached'])
+def test_custom_settings_tree(benchmark, record_peak_memory, config_tree,
+                              cold_cache, cached):
+    """
+    Construct a BaseScaffold whose CUSTOM_SETTINGS is a tree of 10, 100 or
+    1000 nested yaml files, either parsing every file or with all of them
+    already in the parse cache.
+    """
+    count, root = config_tree
+    benchmark.extra_info['files'] = count
+    setup = None if cached else cold_cache
+    _bench(benchmark, record_peak_memory,
+           lambda: BaseScaffold(config={'CUSTOM_SETTINGS': root}),
+           setup=setup, rounds=5)
+
+
+def test_celery_scaffold(benchmark, record_peak_memory):
+    """
+    Construct a CeleryScaffold from a config mapping.
+    """
+    celery_scaffold = pytest.importorskip(
+        'flask_container_scaffold.celery_scaffold')
+    config = dict(CONFIG, CELERY={'broker': 'memory://'})
+    _bench(benchmark, record_peak_memory,
+           lambda: celery_scaffold.CeleryScaffold(config=config))
+
+
+@pytest.mark.parametrize('workers', [4, 16])
+def test_custom_settings_tree_parallel(benchmark, record_peak_memory,
+                                       config_tree, cold_cache, workers):
+    """
+    Construct a BaseScaffold from the same trees, parsing the files on a
+    thread pool via SCAFFOLD_CONFIG_WORKERS.
+    """
+    count, root = config_tree
+    benchmark.extra_info['files'] = count
+    config = {'CUSTOM_SETTINGS': root, 'SCAFFOLD_CONFIG_WORKERS': workers}
+    _bench(benchmark, record_peak_memory,
+           lambda: BaseScaffold(config=config), setup=cold_cache, rounds=5)
+
+
+def test_custom_settings_tree_snapshot(benchmark, record_peak_memory,
+                                       config_tree, tmp_path, monkeypatch):
+    """
+    Construct a BaseScaffold for the same trees from a precompiled config
+    snapshot instead of parsing the files.
+    """
+    count, root = config_tree
+    benchmark.extra_info['files'] = count
+    config = {'CUSTOM_SETTINGS': root}
+    path = str(tmp_path / 'config.snapshot')
+    BaseScaffold(config=config).write_config_snapshot(path)
+    monkeypatch.setenv('SCAFFOLD_CONFIG_SNAPSHOT', path)
+    _bench(benchmark, record_peak_memory,
+           lambda: BaseScaffold(config=config), rounds=5)
@@ -0,0 +1,32 @@
+from flask import Config
+
+from flask_container_scaffold.settings import freeze_settings
+
+
+def _config():
+    config = Config('.')
+    config['DB'] = {'pool': {'size': 20, 'timeout': 5}, 'host': 'db'}
+    config.update({f'KEY_{index}': index for index in range(200)})
+    return config
+
+
+def _dict_lookups(config):
+    for _ in range(1000):
+        config['DB']['pool']['size']
+
+
+def _attribute_lookups(settings):
+    for _ in range(1000):
+        settings.DB.pool.size
+
+
+def test_nested_config_lookup(benchmark):
+    benchmark(_dict_lookups, _config())
+
+
+def test_frozen_settings_lookup(benchmark):
+    benchmark(_attribute_lookups, freeze_settings(_config()))
+
+
+def test_freeze_config(benchmark):
+    benchmark(freeze_settings, _config())
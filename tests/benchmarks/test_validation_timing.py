@@ -0,0 +1,30 @@
+import pytest
+from pydantic import BaseModel
+
+from flask_container_scaffold.base_scaffold import BaseScaffold
+from flask_container_scaffold import instrumentation
+from flask_container_scaffold.instrumentation import TIMINGS_ENVIRON_KEY
+from flask_container_scaffold.validation import parse_input
+
+
+class Model(BaseModel):
+    name: str
+    count: int
+
+
+@pytest.mark.parametrize('enabled', [False, True],
+                         ids=['disabled', 'enabled'])
+def test_parse_input_overhead(benchmark, monkeypatch, enabled):
+    app = BaseScaffold(name='bench').flask_app
+    monkeypatch.setattr(instrumentation, 'enabled', enabled)
+    with app.test_request_context('/?name=x&count=1') as context:
+        if enabled:
+            context.request.environ[TIMINGS_ENVIRON_KEY] = {'validation': 0}
+        benchmark(parse_input, app.logger, Model)
+
+
+def test_parse_input_unwrapped(benchmark):
+    # parse_input without the timing wrapper, as a baseline.
+    app = BaseScaffold(name='bench').flask_app
+    with app.test_request_context('/?name=x&count=1'):
+        benchmark(parse_input.__wrapped__, app.logger, Model)
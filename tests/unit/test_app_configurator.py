@@ -0,0 +1,128 @@
+import pytest
+from flask import Flask
+
+from flask_container_scaffold.app_configurator import (AppConfigurator,
+                                                       IncludeCycleError)
+from flask_container_scaffold.app_scaffold import AppScaffold
+
+
+@pytest.fixture
+def config_tree(tmp_path):
+    """
+    A dict of custom settings referencing several files, some of which
+    include further files and set overlapping keys.
+    """
+    for index in range(6):
+        lines = [f'shared: file_{index}', f'own_{index}: {index}']
+        for child in (index * 2 + 6, index * 2 + 7):
+            (tmp_path / f'child_{child}.yml').write_text(
+                f'shared: child_{child}\nchild_{child}: yes\n')
+            lines.append(f'include_{child}: {tmp_path}/child_{child}.yml')
+        (tmp_path / f'file_{index}.yml').write_text('\n'.join(lines) + '\n')
+    (tmp_path / 'extra.cfg').write_text('[section]\nkey=value\n')
+    return {'first': str(tmp_path / 'file_0.yml'),
+            'nested': {'files': [str(tmp_path / 'file_1.yml')],
+                       'more': str(tmp_path / 'file_2.yml'),
+                       'cfg': str(tmp_path / 'extra.cfg')},
+            'rest': {f'file_{index}': str(tmp_path / f'file_{index}.yml')
+                     for index in range(3, 6)},
+            'not_a_file': 'some value'}
+
+
+@pytest.mark.parametrize('max_workers', [2, 8])
+def test_parallel_matches_sequential(app, config_tree, max_workers):
+    """
+    GIVEN custom settings referencing many files
+    WHEN we parse them sequentially, and on a thread pool
+    THEN the resulting config is identical, including which file won
+    """
+    sequential = AppConfigurator(Flask('sequential'), cache=None)
+    sequential.parse(config_tree)
+    parallel = AppConfigurator(app, cache=None, max_workers=max_workers)
+    parallel.parse(config_tree)
+    assert app.config == sequential.app.config
+    assert app.config['shared'] == 'file_5'
+    assert list(parallel.loaded_files) == list(sequential.loaded_files)
+    assert parallel._pending == {}
+
+
+def test_parallel_missing_file(app, config_tree, tmp_path):
+    """
+    GIVEN custom settings where one of the referenced files is missing
+    WHEN we parse them on a thread pool
+    THEN it raises a FileNotFoundError
+    """
+    config_tree['rest']['missing'] = str(tmp_path / 'missing.yml')
+    with pytest.raises(FileNotFoundError):
+        AppConfigurator(app, cache=None, max_workers=4).parse(config_tree)
+
+
+def test_scaffold_config_workers(config_tree):
+    """
+    GIVEN SCAFFOLD_CONFIG_WORKERS is set in the config
+    WHEN we create the scaffold
+    THEN the custom settings are loaded on a thread pool of that size
+    """
+    scaffold = AppScaffold(config={'CUSTOM_SETTINGS': config_tree,
+                                   'SCAFFOLD_CONFIG_WORKERS': 4})
+    assert scaffold.configurator.max_workers == 4
+    assert scaffold.app.config['section'] == {'key': 'value'}
+    assert scaffold.app.config['child_17'] is True
+
+
+@pytest.mark.parametrize('max_workers', [None, 4])
+def test_shared_include_parsed_once(app, tmp_path, max_workers):
+    """
+    GIVEN two custom settings files that both include a third file
+    WHEN we parse them
+    THEN the shared file is only parsed once
+    AND the include graph records both files including it
+    """
+    shared = tmp_path / 'shared.yml'
+    shared.write_text('shared: value\n')
+    for name in ('one', 'two'):
+        (tmp_path / f'{name}.yml').write_text(
+            f'{name}: set\ninclude: {shared}\n')
+    configurator = AppConfigurator(app, cache=None, max_workers=max_workers)
+    configurator.parse({'one': str(tmp_path / 'one.yml'),
+                        'two': str(tmp_path / 'two.yml')})
+    assert app.config['shared'] == 'value'
+    assert app.config['two'] == 'set'
+    graph = configurator.include_graph
+    assert graph.roots == [str(tmp_path / 'one.yml'),
+                           str(tmp_path / 'two.yml')]
+    node = graph.nodes[str(shared)]
+    assert node.reused == 1
+    assert node.parse_time is not None
+    assert node.included_by == graph.roots
+    assert graph.format().splitlines()[1].startswith(f'  {shared} [')
+
+
+@pytest.mark.parametrize('max_workers', [None, 4])
+def test_include_cycle(app, tmp_path, max_workers):
+    """
+    GIVEN custom settings files that include each other in a loop
+    WHEN we parse them
+    THEN it raises an IncludeCycleError describing the loop
+    """
+    first = tmp_path / 'first.yml'
+    second = tmp_path / 'second.yml'
+    first.write_text(f'include: {second}\n')
+    second.write_text(f'include: {first}\n')
+    configurator = AppConfigurator(app, cache=None, max_workers=max_workers)
+    with pytest.raises(IncludeCycleError) as error:
+        configurator.parse({'first': str(first)})
+    assert error.value.cycle == [str(first), str(second), str(first)]
+    assert configurator._loading == []
+
+
+def test_file_including_itself(app, tmp_path):
+    """
+    GIVEN a custom settings file that includes itself
+    WHEN we parse it
+    THEN it raises an IncludeCycleError
+    """
+    looped = tmp_path / 'looped.cfg'
+    looped.write_text(f'[section]\nitself={looped}\n')
+    with pytest.raises(IncludeCycleError, match='looped.cfg -> '):
+        AppConfigurator(app, cache=None).parse(str(looped))
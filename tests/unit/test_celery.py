@@ -1,8 +1,14 @@
+import contextvars
+import threading
+
 import pytest
 
 from celery import Celery
-from flask import Flask
+from celery.app.trace import build_tracer
+from flask import Flask, current_app, g, has_app_context
+from flask.globals import app_ctx
 
+from flask_container_scaffold import celery_task
 from flask_container_scaffold.celery_scaffold import CeleryScaffold
 
 
@@ -63,3 +69,90 @@ def test_celery_bad_config():
     assert isinstance(app, Celery)
     with pytest.raises(KeyError):
         app.conf.find_value_for_key('bad_config_item')
+
+
+def _context_task(scaffold, **options):
+    """
+    Register a task that records the app context it ran in, and fails if g
+    still holds a value from an earlier run.
+    """
+    contexts = []
+    teardowns = []
+    scaffold.flask_app.teardown_appcontext(teardowns.append)
+
+    @scaffold.celery_app.task(**options)
+    def task():
+        assert 'seen' not in g
+        g.seen = True
+        contexts.append(app_ctx._get_current_object())
+        return current_app.name
+
+    return task, contexts, teardowns
+
+
+def test_tasks_run_in_app_context():
+    """
+    GIVEN a CeleryScaffold task, outside of a worker
+    WHEN it is called directly, eagerly and in another thread
+    THEN each run has an app context of its own, popped afterwards
+    """
+    scaffold = CeleryScaffold(config={'CELERY': {'task_always_eager': True}})
+    task, contexts, teardowns = _context_task(scaffold)
+    assert task() == scaffold.flask_app.name
+    assert task.delay().get() == scaffold.flask_app.name
+    thread = threading.Thread(target=task)
+    thread.start()
+    thread.join()
+    assert len(contexts) == 3 and len(set(map(id, contexts))) == 3
+    assert len(teardowns) == 3
+    assert not has_app_context()
+
+
+def _worker_call(task):
+    """
+    Run a task as a solo or prefork worker process does.
+    """
+    task.ignore_result = True
+    return build_tracer(task.name, task, app=task.app)('id', (), {}).retval
+
+
+def test_worker_reuses_app_context(monkeypatch):
+    """
+    GIVEN a CeleryScaffold task, in a prefork or solo worker process
+    WHEN it runs several times, the last run failing
+    THEN one app context is pushed and kept for every run
+    AND teardown functions are called and g is emptied after each run
+    """
+    scaffold = CeleryScaffold()
+    task, contexts, teardowns = _context_task(scaffold)
+    monkeypatch.setattr(celery_task, '_worker_thread', threading.get_ident())
+
+    def run():
+        assert _worker_call(task) == scaffold.flask_app.name
+        _worker_call(task)
+        g.seen = True
+        _worker_call(task)
+        assert has_app_context()
+
+    # Run in a copy of the current context, so the worker's app context does
+    # not outlive the test.
+    contextvars.copy_context().run(run)
+    assert len(contexts) == 2 and contexts[0] is contexts[1]
+    assert [type(exc) for exc in teardowns] == [
+        type(None), type(None), AssertionError]
+    assert not has_app_context()
+
+
+def test_reuse_app_context_disabled(monkeypatch):
+    """
+    GIVEN SCAFFOLD_CELERY_REUSE_CONTEXT is False
+    WHEN a task runs several times in a worker process
+    THEN each run has its own app context
+    """
+    scaffold = CeleryScaffold(config={'SCAFFOLD_CELERY_REUSE_CONTEXT': False})
+    task, contexts, _ = _context_task(scaffold)
+    monkeypatch.setattr(celery_task, '_worker_thread', threading.get_ident())
+    contextvars.copy_context().run(
+        lambda: (_worker_call(task), _worker_call(task)))
+    assert len(contexts) == 2 and contexts[0] is not contexts[1]
+    assert not has_app_context()
@@ -0,0 +1,114 @@
+import os
+
+import pytest
+
+from flask_container_scaffold.app_configurator import AppConfigurator
+from flask_container_scaffold.config_cache import ConfigFileCache
+from flask_container_scaffold.util import load_yaml
+
+
+@pytest.fixture
+def yaml_file(tmp_path):
+    path = tmp_path / 'settings.yml'
+    path.write_text("section:\n  key: one\n")
+    return str(path)
+
+
+def test_unchanged_file_is_parsed_once(yaml_file):
+    """
+    GIVEN an empty ConfigFileCache
+    WHEN we load the same unchanged file twice
+    THEN the file is only parsed once
+    AND the hit and miss counters reflect that
+    """
+    cache = ConfigFileCache()
+    assert cache.load(yaml_file, load_yaml) == {'section': {'key': 'one'}}
+    assert cache.load(yaml_file, load_yaml) == {'section': {'key': 'one'}}
+    info = cache.info()
+    assert (info.hits, info.misses, info.currsize) == (1, 1, 1)
+
+
+def test_changed_file_is_parsed_again(yaml_file):
+    """
+    GIVEN a ConfigFileCache holding a parsed file
+    WHEN the file changes on disk
+    THEN the next load parses the new contents
+    """
+    cache = ConfigFileCache()
+    cache.load(yaml_file, load_yaml)
+    with open(yaml_file, 'w') as handle:
+        handle.write("section:\n  key: three\n")
+    stat = os.stat(yaml_file)
+    os.utime(yaml_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000))
+    assert cache.load(yaml_file, load_yaml) == {'section': {'key': 'three'}}
+    assert cache.misses == 2
+
+
+def test_returns_copies(yaml_file):
+    """
+    GIVEN a ConfigFileCache holding a parsed file
+    WHEN a caller modifies the data it was given
+    THEN later loads are not affected
+    """
+    cache = ConfigFileCache()
+    cache.load(yaml_file, load_yaml)['section']['key'] = 'changed'
+    assert cache.load(yaml_file, load_yaml) == {'section': {'key': 'one'}}
+
+
+def test_lru_eviction(tmp_path):
+    """
+    GIVEN a ConfigFileCache with a maxsize of 2
+    WHEN we load three different files
+    THEN the least recently used file is evicted
+    """
+    cache = ConfigFileCache(maxsize=2)
+    paths = []
+    for name in ('a', 'b', 'c'):
+        path = tmp_path / f'{name}.yml'
+        path.write_text(f"{name}: 1\n")
+        paths.append(str(path))
+        cache.load(str(path), load_yaml)
+    assert cache.info().currsize == 2
+    cache.load(paths[0], load_yaml)
+    assert cache.misses == 4
+
+
+def test_invalidate(yaml_file):
+    """
+    GIVEN a ConfigFileCache holding a parsed file
+    WHEN we invalidate that file, and then the whole cache
+    THEN the file is parsed again
+    AND the counters are reset when the whole cache is cleared
+    """
+    cache = ConfigFileCache()
+    cache.load(yaml_file, load_yaml)
+    cache.invalidate(yaml_file)
+    cache.load(yaml_file, load_yaml)
+    assert cache.misses == 2
+    cache.invalidate()
+    assert cache.info() == (0, 0, 128, 0)
+
+
+def test_missing_file(tmp_path):
+    """
+    GIVEN a ConfigFileCache
+    WHEN we load a file that does not exist
+    THEN it raises a FileNotFoundError
+    """
+    with pytest.raises(FileNotFoundError):
+        ConfigFileCache().load(str(tmp_path / 'missing.yml'), load_yaml)
+
+
+def test_configurator_uses_cache(app, mock_custom_only_settings_file):
+    """
+    GIVEN two AppConfigurators sharing a ConfigFileCache
+    WHEN they parse the same custom settings file
+    THEN both apps get the settings
+    AND the file is only parsed once
+    """
+    cache = ConfigFileCache()
+    AppConfigurator(app, cache=cache).parse(mock_custom_only_settings_file)
+    other = AppConfigurator(app, cache=cache)
+    other.parse(mock_custom_only_settings_file)
+    assert app.config['extra_config'] == {'important_stuff': 'abc'}
+    assert (cache.hits, cache.misses) == (1, 1)
@@ -0,0 +1,130 @@
+import pytest
+
+from flask_container_scaffold.base import BaseApiView
+from flask_container_scaffold.base_scaffold import BaseScaffold
+from flask_container_scaffold.instrumentation import Histogram, add_timing
+from flask_container_scaffold.validation import parse_input
+
+
+class FakeModel(BaseApiView):
+    name: str
+
+
+def _app(**config):
+    app = BaseScaffold(name='test', config=config).flask_app
+
+    @app.route('/things')
+    def things():
+        parsed = parse_input(app.logger, FakeModel)
+        return {'name': getattr(parsed, 'name', None)}
+    return app
+
+
+def test_histogram_buckets():
+    """
+    GIVEN a Histogram with fixed buckets
+    WHEN durations are observed
+    THEN each is counted in the first bucket whose bound is not exceeded
+    AND values over every bound go in the unbounded bucket
+    """
+    histogram = Histogram(buckets_ms=(1, 10))
+
+    for value_ms in (0.5, 1, 5, 11, 20):
+        histogram.observe(int(value_ms * 1000000))
+
+    assert histogram.snapshot() == {'buckets_ms': [1, 10, None],
+                                    'counts': [2, 1, 2],
+                                    'count': 5,
+                                    'sum_ms': 37.5}
+
+
+def test_instrumentation_disabled():
+    """
+    GIVEN a scaffolded app without SCAFFOLD_INSTRUMENTATION
+    WHEN a request is made
+    THEN no timing hooks are registered and no Server-Timing header is sent
+    """
+    app = _app()
+
+    response = app.test_client().get('/things?name=x')
+
+    assert response.json == {'name': 'x'}
+    assert 'Server-Timing' not in response.headers
+    assert 'scaffold_instrumentation' not in app.extensions
+
+
+def test_instrumentation_enabled():
+    """
+    GIVEN a scaffolded app with SCAFFOLD_INSTRUMENTATION set
+    WHEN a request calling parse_input is made
+    THEN a Server-Timing header reports the validation, view and app phases
+    AND every phase is recorded in its histogram
+    """
+    app = _app(SCAFFOLD_INSTRUMENTATION=True)
+
+    response = app.test_client().get('/things?name=x')
+
+    assert response.json == {'name': 'x'}
+    phases = [entry.split(';')[0] for entry in
+              response.headers['Server-Timing'].split(', ')]
+    assert phases == ['validation', 'app', 'view']
+    snapshot = app.extensions['scaffold_instrumentation'].snapshot()
+    assert {phase: data['count'] for phase, data in snapshot.items()} == {
+        'validation': 1, 'view': 1, 'app': 1, 'total': 1}
+    assert snapshot['validation']['sum_ms'] > 0
+
+
+@pytest.mark.parametrize('server_timing', [True, False])
+def test_instrumentation_server_timing_setting(server_timing):
+    """
+    GIVEN SCAFFOLD_SERVER_TIMING is set
+    WHEN a request is made to an instrumented app
+    THEN the Server-Timing header is only sent if it is true
+    AND the timings are recorded either way
+    """
+    app = _app(SCAFFOLD_INSTRUMENTATION=True,
+               SCAFFOLD_SERVER_TIMING=server_timing)
+
+    response = app.test_client().get('/things?name=x')
+
+    assert ('Server-Timing' in response.headers) is server_timing
+    instrumentation = app.extensions['scaffold_instrumentation']
+    assert instrumentation.histograms['total'].count == 1
+
+
+def test_instrumentation_custom_phase():
+    """
+    GIVEN an instrumented app
+    WHEN a view records its own phase with add_timing
+    THEN it is reported in the Server-Timing header and a new histogram
+    """
+    app = _app(SCAFFOLD_INSTRUMENTATION=True)
+
+    @app.route('/db')
+    def db():
+        add_timing('db', 2000000)
+        return ''
+
+    response = app.test_client().get('/db')
+
+    assert 'db;dur=2.000' in response.headers['Server-Timing']
+    instrumentation = app.extensions['scaffold_instrumentation']
+    assert instrumentation.histograms['db'].count == 1
+
+
+def test_instrumentation_with_shared_app():
+    """
+    GIVEN an app already instrumented by one scaffold
+    WHEN another scaffold is created around the same app
+    THEN it is not instrumented a second time
+    AND responses have a single Server-Timing header
+    """
+    app = _app(SCAFFOLD_INSTRUMENTATION=True)
+    instrumentation = app.extensions['scaffold_instrumentation']
+
+    BaseScaffold(app=app, config={'SCAFFOLD_INSTRUMENTATION': True})
+    response = app.test_client().get('/things?name=x')
+
+    assert app.extensions['scaffold_instrumentation'] is instrumentation
+    assert len(response.headers.getlist('Server-Timing')) == 1
+    assert instrumentation.histograms['total'].count == 1
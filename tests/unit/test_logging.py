@@ -1,8 +1,20 @@
+import io
+import json
+import logging
+import queue
+import sys
+import threading
 from logging import LogRecord
 
+import pytest
 from flask import Flask
 
-from flask_container_scaffold.logging import FlaskRequestFormatter
+from flask_container_scaffold.base_scaffold import BaseScaffold
+from flask_container_scaffold.logging import (FlaskRequestFormatter,
+                                              JSONRequestFormatter,
+                                              RequestContextQueueHandler,
+                                              mark_request_start,
+                                              setup_queued_logging)
 
 
 FORMAT = "[%(remote_addr)s] %(msg)s"
@@ -98,3 +110,264 @@ def test_request_formatter_with_remote_addr_already_set():
     with Flask("test").test_request_context(environ_base=env):
         formatter = FlaskRequestFormatter(FORMAT)
         assert formatter.format(record) == "[1.1.1.1] Test message"
+
+
+class _ListHandler(logging.Handler):
+
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+        self.threads = []
+
+    def emit(self, record):
+        self.threads.append(threading.current_thread())
+        self.lines.append(self.format(record))
+
+
+def _queued_logger(name, **kwargs):
+    logger = logging.getLogger(name)
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    handler = _ListHandler()
+    handler.setFormatter(FlaskRequestFormatter(FORMAT))
+    logger.addHandler(handler)
+    return logger, handler, setup_queued_logging(logger=logger, **kwargs)
+
+
+def test_queued_logging_captures_request_context():
+    """
+    GIVEN a logger set up with setup_queued_logging
+    WHEN a message is logged within a request context
+    THEN the original handler emits it on the listener thread
+    AND the remote address captured in the request thread is used
+    """
+    logger, handler, listener = _queued_logger('test.queued.context')
+    try:
+        assert logger.handlers == [listener.handler]
+        with Flask("test").test_request_context(
+                environ_base=(("REMOTE_ADDR", "1.2.3.4"),)):
+            logger.info('Test %s', 'message')
+        logger.info('No request')
+    finally:
+        listener.stop()
+
+    assert handler.lines == ["[1.2.3.4] Test message", "[-] No request"]
+    assert threading.current_thread() not in handler.threads
+
+
+@pytest.mark.parametrize('policy,expected', [
+    ('drop_newest', ['0', '1']),
+    ('drop_oldest', ['1', '2']),
+])
+def test_queued_logging_drop_policy(policy, expected):
+    """
+    GIVEN a RequestContextQueueHandler with a full queue
+    WHEN another record is logged
+    THEN the drop policy decides which record is discarded
+    AND the dropped counter is incremented
+    """
+    log_queue = queue.Queue(2)
+    handler = RequestContextQueueHandler(log_queue, drop_policy=policy)
+    for i in range(3):
+        handler.handle(LogRecord('', logging.INFO, '', 1, str(i), None, None))
+
+    assert [log_queue.get_nowait().msg for _ in range(2)] == expected
+    assert handler.dropped == 1
+
+
+def test_queued_logging_invalid_drop_policy():
+    """
+    GIVEN an unknown drop policy
+    WHEN a RequestContextQueueHandler is created
+    THEN a ValueError is raised
+    """
+    with pytest.raises(ValueError):
+        RequestContextQueueHandler(queue.Queue(), drop_policy='sometimes')
+
+
+def test_json_formatter_no_context():
+    """
+    GIVEN a JSONRequestFormatter
+    WHEN it is called without a request context
+    THEN a single JSON line is returned
+    AND the request fields are null, apart from remote_addr which is "-"
+    """
+    record = LogRecord('test.json', logging.INFO, '', 1, 'Test %s',
+                       ('message',), None)
+
+    line = JSONRequestFormatter(static_fields={'service': 'test'}).format(
+        record)
+
+    assert '\n' not in line
+    data = json.loads(line)
+    assert list(data)[:4] == ['time', 'level', 'logger', 'message']
+    assert data['level'] == 'INFO'
+    assert data['logger'] == 'test.json'
+    assert data['message'] == 'Test message'
+    assert data['remote_addr'] == '-'
+    assert data['method'] is None
+    assert data['service'] == 'test'
+
+
+def test_json_formatter_with_request():
+    """
+    GIVEN a scaffolded app with SCAFFOLD_LOG_LATENCY set
+    AND a JSONRequestFormatter
+    WHEN a record is formatted while handling a request
+    THEN the request details, request id and latency are included
+    AND extra fields passed to the logging call are included
+    """
+    app = BaseScaffold(name='test',
+                       config={'SCAFFOLD_LOG_LATENCY': True}).flask_app
+    formatter = JSONRequestFormatter(fields=['message', 'remote_addr',
+                                             'request_id', 'method', 'path',
+                                             'latency_ms'])
+    lines = []
+
+    @app.route('/things', methods=['POST'])
+    def things():
+        record = LogRecord('', logging.INFO, '', 1, 'handled', None, None)
+        record.user = 'bob'
+        lines.append(formatter.format(record))
+        return ''
+
+    app.test_client().post('/things', headers={'X-Request-ID': 'abc'},
+                           environ_base={'REMOTE_ADDR': '1.2.3.4'})
+
+    data = json.loads(lines[0])
+    assert data['remote_addr'] == '1.2.3.4'
+    assert data['request_id'] == 'abc'
+    assert data['method'] == 'POST'
+    assert data['path'] == '/things'
+    assert data['latency_ms'] >= 0
+    assert data['user'] == 'bob'
+    assert 'time' not in data
+
+
+@pytest.mark.parametrize('config, registered', [
+    ({}, 0),
+    ({'SCAFFOLD_LOG_LATENCY': True}, 1),
+    ({'SCAFFOLD_METRICS': True}, 1),
+])
+def test_request_start_hook(tmp_path, config, registered):
+    """
+    GIVEN an app shared by two scaffolds
+    WHEN neither, or both, have latency logging or metrics enabled
+    THEN the request start hook is only registered when they do, and once
+    """
+    config['SCAFFOLD_METRICS_DIR'] = str(tmp_path)
+    app = BaseScaffold(name='test', config=config).flask_app
+    BaseScaffold(app=app, config=config)
+
+    assert app.before_request_funcs.get(None, []).count(
+        mark_request_start) == registered
+
+
+def test_json_formatter_after_request_formatter():
+    """
+    GIVEN a logger with a FlaskRequestFormatter handler and then a
+        JSONRequestFormatter handler
+    WHEN a record is logged while handling a request
+    THEN the JSON line still has every request detail
+    """
+    app = BaseScaffold(name='test',
+                       config={'SCAFFOLD_LOG_LATENCY': True}).flask_app
+    text_stream = io.StringIO()
+    json_stream = io.StringIO()
+    text_handler = logging.StreamHandler(text_stream)
+    text_handler.setFormatter(FlaskRequestFormatter(FORMAT))
+    json_handler = logging.StreamHandler(json_stream)
+    json_handler.setFormatter(JSONRequestFormatter())
+    logger = logging.getLogger('test_json_formatter_after_request_formatter')
+    logger.addHandler(text_handler)
+    logger.addHandler(json_handler)
+
+    @app.route('/things')
+    def things():
+        logger.warning('handled')
+        return ''
+
+    app.test_client().get('/things', headers={'X-Request-ID': 'abc'},
+                          environ_base={'REMOTE_ADDR': '1.2.3.4'})
+
+    assert text_stream.getvalue() == '[1.2.3.4] handled\n'
+    data = json.loads(json_stream.getvalue())
+    assert data['remote_addr'] == '1.2.3.4'
+    assert data['request_id'] == 'abc'
+    assert data['method'] == 'GET'
+    assert data['path'] == '/things'
+    assert data['latency_ms'] >= 0
+    assert '_scaffold_request_fields' not in data
+
+
+def test_json_formatter_exception():
+    """
+    GIVEN a JSONRequestFormatter
+    WHEN a record with exception info is formatted
+    THEN the traceback is included in the exc_info field
+    """
+    try:
+        raise RuntimeError('boom')
+    except RuntimeError:
+        record = LogRecord('', logging.ERROR, '', 1, 'failed', None,
+                           sys.exc_info())
+
+    data = json.loads(JSONRequestFormatter().format(record))
+
+    assert 'RuntimeError: boom' in data['exc_info']
+
+
+def test_json_formatter_unknown_field():
+    """
+    GIVEN a field that does not exist
+    WHEN a JSONRequestFormatter is created with it
+    THEN a ValueError is raised
+    """
+    with pytest.raises(ValueError):
+        JSONRequestFormatter(fields=['message', 'colour'])
+
+
+def test_json_formatter_queued():
+    """
+    GIVEN a JSONRequestFormatter behind setup_queued_logging
+    WHEN a message is logged while handling a request
+    THEN the request details captured in the request thread are emitted
+    """
+    logger = logging.getLogger('test.queued.json')
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    handler = _ListHandler()
+    handler.setFormatter(JSONRequestFormatter(fields=['message', 'path']))
+    logger.addHandler(handler)
+    listener = setup_queued_logging(logger=logger)
+    app = BaseScaffold(name='test').flask_app
+
+    @app.route('/queued')
+    def queued():
+        logger.info('handled')
+        return ''
+
+    try:
+        app.test_client().get('/queued')
+    finally:
+        listener.stop()
+
+    assert json.loads(handler.lines[0]) == {'message': 'handled',
+                                            'path': '/queued'}
+
+
+def test_json_formatter_without_orjson(monkeypatch):
+    """
+    GIVEN orjson is not installed
+    WHEN a JSONRequestFormatter formats a record
+    THEN the standard library encoder is used with the same output
+    """
+    record = LogRecord('', logging.INFO, '', 1, 'Test message', None, None)
+    record.when = object()
+    expected = JSONRequestFormatter(fields=['message']).format(record)
+    monkeypatch.setitem(sys.modules, 'orjson', None)
+
+    line = JSONRequestFormatter(fields=['message']).format(record)
+
+    assert line == expected
+    assert json.loads(line)['when'].startswith('<object object')
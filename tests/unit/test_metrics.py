@@ -0,0 +1,248 @@
+import gc
+import os
+
+import pytest
+
+from flask_container_scaffold.base import BaseApiView
+from flask_container_scaffold.base_scaffold import BaseScaffold
+from flask_container_scaffold.metrics import (MetricsRegistry, MmapedValues,
+                                              _sample_key,
+                                              default_metrics_dir)
+from flask_container_scaffold.signals import custom_settings_reloaded
+from flask_container_scaffold.validation import parse_input
+
+
+class FakeModel(BaseApiView):
+    count: int
+
+
+@pytest.fixture
+def unfreeze():
+    yield
+    gc.unfreeze()
+
+
+def _app(tmp_path, **config):
+    config = dict(SCAFFOLD_METRICS=True, SCAFFOLD_METRICS_DIR=str(tmp_path),
+                  **config)
+    app = BaseScaffold(name='test', config=config).flask_app
+
+    @app.route('/things')
+    def things():
+        return parse_input(app.logger, FakeModel).model_dump()
+    return app
+
+
+def test_mmaped_values_round_trip(tmp_path):
+    """
+    GIVEN an MmapedValues file
+    WHEN values are added, including more than fit in the initial mapping
+    THEN they can be read back from the file, and by a new mapping
+    """
+    path = str(tmp_path / 'values.db')
+    values = MmapedValues(path)
+    values.add('a', 1)
+    values.add('a', 2.5)
+    for i in range(5000):
+        values.add(f'key-{i}', i)
+    values.close()
+
+    read = dict(MmapedValues.read(path))
+    assert read['a'] == 3.5
+    assert read['key-4999'] == 4999
+    reopened = MmapedValues(path)
+    reopened.add('a', 1)
+    assert dict(MmapedValues.read(path))['a'] == 4.5
+
+
+def test_registry_aggregates_processes(tmp_path):
+    """
+    GIVEN metrics files written by several processes
+    WHEN the registry renders them
+    THEN the values of every process are summed
+    AND histogram buckets are cumulative
+    """
+    registry = MetricsRegistry(str(tmp_path))
+    counter = registry.counter('jobs', 'Jobs run', ('kind',))
+    histogram = registry.histogram('job_seconds', 'Job time', buckets=(1, 5))
+    counter.inc(kind='a')
+    histogram.observe(0.5)
+    other = MmapedValues(str(tmp_path / 'metrics_1.db'))
+    other.add(_sample_key('jobs_total', ['a']), 2)
+    other.add(_sample_key('jobs_total', ['b']), 1)
+    other.add(_sample_key('job_seconds_bucket', ['5.0']), 1)
+    other.add(_sample_key('job_seconds_sum', []), 3)
+    other.add(_sample_key('job_seconds_count', []), 1)
+
+    lines = registry.generate_latest().splitlines()
+
+    assert lines == [
+        '# HELP jobs Jobs run',
+        '# TYPE jobs counter',
+        'jobs_total{kind="a"} 3.0',
+        'jobs_total{kind="b"} 1.0',
+        '# HELP job_seconds Job time',
+        '# TYPE job_seconds histogram',
+        'job_seconds_bucket{le="1.0"} 1.0',
+        'job_seconds_bucket{le="5.0"} 2.0',
+        'job_seconds_bucket{le="+Inf"} 2.0',
+        'job_seconds_sum 3.5',
+        'job_seconds_count 2.0',
+    ]
+
+
+def test_metrics_disabled(tmp_path):
+    """
+    GIVEN a scaffolded app without SCAFFOLD_METRICS
+    WHEN /metrics is requested
+    THEN it is not found
+    """
+    app = BaseScaffold(name='test').flask_app
+
+    assert app.test_client().get('/metrics').status_code == 404
+    assert 'scaffold_metrics' not in app.extensions
+
+
+def test_metrics_endpoint(tmp_path):
+    """
+    GIVEN a scaffolded app with SCAFFOLD_METRICS set
+    WHEN requests are made, one failing validation, and settings reload
+    THEN /metrics reports requests, latency, failures per model and reloads
+    AND the metrics file is named after the process
+    """
+    app = _app(tmp_path)
+    client = app.test_client()
+    client.get('/things?count=1')
+    client.get('/things?count=x')
+    custom_settings_reloaded.send(app, path='custom.yml', keys=[])
+
+    response = client.get('/metrics')
+
+    assert response.mimetype == 'text/plain'
+    body = response.get_data(as_text=True)
+    assert 'scaffold_requests_total{method="GET",status="200"} 2.0' in body
+    assert ('scaffold_request_duration_seconds_count{method="GET"} 2.0'
+            in body)
+    assert 'scaffold_validation_failures_total{model="FakeModel"} 1.0' in body
+    assert 'scaffold_config_reloads_total 1.0' in body
+    assert os.listdir(tmp_path) == [f'metrics_{os.getpid()}.db']
+
+
+def test_metrics_path_setting(tmp_path):
+    """
+    GIVEN SCAFFOLD_METRICS_PATH is set
+    WHEN that path is requested
+    THEN the metrics are served there
+    """
+    app = _app(tmp_path, SCAFFOLD_METRICS_PATH='/internal/metrics')
+
+    response = app.test_client().get('/internal/metrics')
+
+    assert response.status_code == 200
+    assert b'# TYPE scaffold_requests counter' in response.data
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='requires os.fork')
+def test_registry_after_fork(tmp_path):
+    """
+    GIVEN a registry used before forking
+    WHEN a forked worker records values
+    THEN the worker writes its own file, and both are aggregated
+    """
+    registry = MetricsRegistry(str(tmp_path))
+    counter = registry.counter('jobs', 'Jobs run')
+    counter.inc()
+    pid = os.fork()
+    if pid == 0:
+        counter.inc(2)
+        os._exit(0)
+    os.waitpid(pid, 0)
+
+    assert len(os.listdir(tmp_path)) == 2
+    assert 'jobs_total 3.0' in registry.generate_latest()
+
+
+def test_registries_share_process_file(tmp_path):
+    """
+    GIVEN two registries writing to the same directory in one process
+    WHEN they append new values in turn
+    THEN neither overwrites the other's entries
+    """
+    first = MetricsRegistry(str(tmp_path)).counter('first', 'First', ('n',))
+    second = MetricsRegistry(str(tmp_path)).counter('second', 'Second', ('n',))
+    for n in range(50):
+        first.inc(n=n)
+        second.inc(n=n)
+
+    values = MetricsRegistry(str(tmp_path)).collect()
+    assert len(values['first_total']) == 50
+    assert len(values['second_total']) == 50
+
+
+def test_metrics_with_shared_app(tmp_path):
+    """
+    GIVEN an app already set up with metrics by one scaffold
+    WHEN another scaffold is created around the same app
+    THEN the metrics are not set up a second time
+    """
+    config = dict(SCAFFOLD_METRICS=True, SCAFFOLD_METRICS_DIR=str(tmp_path))
+    app = BaseScaffold(name='test', config=config).flask_app
+    metrics = app.extensions['scaffold_metrics']
+
+    BaseScaffold(app=app, config=config)
+
+    assert app.extensions['scaffold_metrics'] is metrics
+    assert app.test_client().get('/metrics').status_code == 200
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='requires os.fork')
+def test_exited_workers_still_counted(tmp_path):
+    """
+    GIVEN a worker that recorded values and exited
+    WHEN a new worker starts and the metrics are scraped
+    THEN the exited worker's values are still included
+    """
+    registry = MetricsRegistry(str(tmp_path))
+    counter = registry.counter('jobs', 'Jobs run')
+    for amount in (5, 1):
+        pid = os.fork()
+        if pid == 0:
+            counter.inc(amount)
+            os._exit(0)
+        os.waitpid(pid, 0)
+
+    scraper = MetricsRegistry(str(tmp_path))
+    scraper.counter('jobs', 'Jobs run')
+    assert 'jobs_total 6.0' in scraper.generate_latest()
+
+
+def test_finalize_clears_directory(tmp_path, unfreeze):
+    """
+    GIVEN metrics files left by an earlier run of the server
+    WHEN the scaffold is finalized, before forking workers
+    THEN only the files of other processes are removed
+    """
+    scaffold = BaseScaffold(name='test', config={
+        'SCAFFOLD_METRICS': True, 'SCAFFOLD_METRICS_DIR': str(tmp_path)})
+    registry = scaffold.flask_app.extensions['scaffold_metrics'].registry
+    registry.counter('jobs', 'Jobs run').inc()
+    (tmp_path / 'metrics_1.db').write_bytes(b'')
+
+    scaffold.finalize()
+
+    assert os.listdir(tmp_path) == [f'metrics_{os.getpid()}.db']
+
+
+def test_default_directory_per_app(monkeypatch):
+    """
+    GIVEN no metrics directory is configured
+    WHEN metrics are set up for an app
+    THEN the directory is named after the app
+    """
+    monkeypatch.delenv('PROMETHEUS_MULTIPROC_DIR', raising=False)
+    app = BaseScaffold(name='metrics_app',
+                       config={'SCAFFOLD_METRICS': True}).flask_app
+
+    directory = app.extensions['scaffold_metrics'].registry.directory
+    assert os.path.basename(directory) == 'metrics_app'
+    assert default_metrics_dir() != directory
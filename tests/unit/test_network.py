@@ -0,0 +1,161 @@
+import pytest
+from flask import Flask, request
+
+from flask_container_scaffold.base_scaffold import BaseScaffold
+from flask_container_scaffold.network import (REMOTE_ADDR_ENVIRON_KEY,
+                                              get_remote_addr,
+                                              get_remote_addr_from_environ,
+                                              normalize_node, parse_forwarded,
+                                              trusted_networks)
+
+
+def test_remote_addr_is_cached_per_request():
+    """
+    GIVEN a request with HTTP_FORWARDED set
+    WHEN we get the remote address more than once
+    THEN it is only resolved the first time
+    AND is cached in the request environ
+    """
+    env = (("REMOTE_ADDR", "1.2.3.4"),
+           ("HTTP_FORWARDED", "for=10.10.10.10;proto=http"),)
+    with Flask("test").test_request_context(environ_base=env):
+        assert get_remote_addr() == '10.10.10.10'
+        request.environ['HTTP_FORWARDED'] = 'for=9.9.9.9'
+        assert get_remote_addr() == '10.10.10.10'
+        assert request.environ[REMOTE_ADDR_ENVIRON_KEY] == '10.10.10.10'
+    with Flask("test").test_request_context(environ_base=env):
+        request.environ['HTTP_FORWARDED'] = 'for=9.9.9.9'
+        assert get_remote_addr() == '9.9.9.9'
+
+
+def test_remote_addr_from_environ():
+    """
+    GIVEN a WSGI environ outside of any request context
+    WHEN we get the remote address for it
+    THEN it is resolved from, and cached in, that environ
+    """
+    environ = {'REMOTE_ADDR': '1.2.3.4'}
+    assert get_remote_addr(environ) == '1.2.3.4'
+    assert environ[REMOTE_ADDR_ENVIRON_KEY] == '1.2.3.4'
+
+
+def test_remote_addr_set_by_middleware():
+    """
+    GIVEN middleware that already stored an address in the environ
+    WHEN we get the remote address
+    THEN the stored address is used
+    """
+    env = (("REMOTE_ADDR", "1.2.3.4"),
+           (REMOTE_ADDR_ENVIRON_KEY, "5.6.7.8"),)
+    with Flask("test").test_request_context(environ_base=env):
+        assert get_remote_addr() == '5.6.7.8'
+
+
+@pytest.mark.parametrize('field,expected', [
+    ('for=192.0.2.60;proto=http;by=203.0.113.43', ('192.0.2.60',)),
+    ('For="[2001:db8:cafe::17]:4711"', ('[2001:db8:cafe::17]:4711',)),
+    ('for=192.0.2.43, for=198.51.100.17', ('192.0.2.43', '198.51.100.17')),
+    ('for="\\"quoted\\";x";proto=https, for=_hidden', ('"quoted";x',
+                                                       '_hidden')),
+    ('proto=https, for=unknown', (None, 'unknown')),
+    ('for="1.2.3.4, for=5.6.7.8', (None, '5.6.7.8')),
+    ('for="1.2.3.4\\";proto=http', (None,)),
+    ('host', (None,)),
+    ('', (None,)),
+])
+def test_parse_forwarded(field, expected):
+    """
+    GIVEN a Forwarded header
+    WHEN we parse it
+    THEN we get the 'for' value of each hop, client first
+    """
+    assert parse_forwarded(field) == expected
+
+
+@pytest.mark.parametrize('node,expected', [
+    ('192.0.2.60', '192.0.2.60'),
+    ('192.0.2.60:8080', '192.0.2.60'),
+    ('[2001:db8::1]:4711', '2001:db8::1'),
+    ('[2001:db8::1]', '2001:db8::1'),
+    ('2001:db8::1', '2001:db8::1'),
+    ('_hidden', '_hidden'),
+    (None, None),
+])
+def test_normalize_node(node, expected):
+    """
+    GIVEN a forwarded node
+    WHEN we normalize it
+    THEN any port and brackets are removed
+    """
+    assert normalize_node(node) == expected
+
+
+@pytest.mark.parametrize('headers,trusted,expected', [
+    # Without trusted proxies the client end of the chain is used
+    ({'HTTP_X_FORWARDED_FOR': '203.0.113.7, 10.0.0.2'}, None, '203.0.113.7'),
+    ({'HTTP_X_REAL_IP': '203.0.113.7'}, None, '203.0.113.7'),
+    ({'HTTP_FORWARDED': 'for="[2001:db8::1]:4711"'}, None, '2001:db8::1'),
+    # Forwarded takes precedence over X-Forwarded-For
+    ({'HTTP_FORWARDED': 'for=198.51.100.1',
+      'HTTP_X_FORWARDED_FOR': '203.0.113.7'}, None, '198.51.100.1'),
+    # Trusted proxies are skipped from the right, spoofed hops are ignored
+    ({'HTTP_X_FORWARDED_FOR': '1.1.1.1, 203.0.113.7, 10.0.0.2'},
+     ['10.0.0.0/8'], '203.0.113.7'),
+    ({'HTTP_FORWARDED': 'for=1.1.1.1, for=203.0.113.7, for="[fd00::5]:80"'},
+     '10.0.0.0/8, fd00::/8', '203.0.113.7'),
+    # If every hop is trusted, the client end of the chain is used
+    ({'HTTP_X_FORWARDED_FOR': '10.1.1.1, 10.0.0.2'}, ['10.0.0.0/8'],
+     '10.1.1.1'),
+    # An obfuscated hop is not trusted
+    ({'HTTP_FORWARDED': 'for=1.1.1.1, for=_proxy'}, ['10.0.0.0/8'],
+     '_proxy'),
+    # Headers sent straight from an untrusted peer are ignored
+    ({'REMOTE_ADDR': '198.51.100.9', 'HTTP_X_FORWARDED_FOR': '1.1.1.1'},
+     ['10.0.0.0/8'], '198.51.100.9'),
+])
+def test_client_addr_from_headers(headers, trusted, expected):
+    """
+    GIVEN a request with forwarding headers
+    WHEN we resolve the client address, with or without trusted proxies
+    THEN we get the expected hop
+    """
+    environ = dict({'REMOTE_ADDR': '10.0.0.1'}, **headers)
+    assert get_remote_addr_from_environ(environ, trusted) == expected
+
+
+def test_trusted_proxies_from_config():
+    """
+    GIVEN an app with SCAFFOLD_TRUSTED_PROXIES set
+    WHEN we get the remote address during a request
+    THEN the trusted proxies are skipped
+    """
+    app = Flask("test")
+    app.config['SCAFFOLD_TRUSTED_PROXIES'] = ['10.0.0.0/8']
+    env = (("REMOTE_ADDR", "10.0.0.1"),
+           ("HTTP_X_FORWARDED_FOR", "1.1.1.1, 203.0.113.7, 10.0.0.2"),)
+    with app.test_request_context(environ_base=env):
+        assert get_remote_addr() == '203.0.113.7'
+
+
+def test_trusted_networks_are_compiled_once():
+    """
+    GIVEN the same trusted proxies as a string or a list
+    WHEN we compile them
+    THEN we get the same cached networks each time
+    """
+    networks = trusted_networks('10.0.0.0/8, 192.168.1.1')
+    assert networks is trusted_networks('10.0.0.0/8, 192.168.1.1')
+    assert [str(network) for network in networks] == ['10.0.0.0/8',
+                                                      '192.168.1.1/32']
+    assert trusted_networks(None) == ()
+
+
+def test_invalid_trusted_proxies_fail_at_startup():
+    """
+    GIVEN SCAFFOLD_TRUSTED_PROXIES with an address that is not valid
+    WHEN a scaffold is created with it
+    THEN a ValueError naming the setting is raised straight away
+    """
+    with pytest.raises(ValueError, match='SCAFFOLD_TRUSTED_PROXIES'):
+        BaseScaffold(name='test', config={
+            'SCAFFOLD_TRUSTED_PROXIES': '10.0.0.0/8, not-an-address'})
@@ -0,0 +1,148 @@
+import os
+from typing import List
+
+import pytest
+from pydantic import BaseModel
+
+from flask_container_scaffold import snapshot
+from flask_container_scaffold.app_scaffold import AppScaffold
+from flask_container_scaffold.overrides import (merge_overrides,
+                                                read_env_overrides)
+from flask_container_scaffold.watcher import SettingsWatcher
+
+
+class PoolSettings(BaseModel):
+    size: int = 5
+    hosts: List[str] = []
+
+
+class DbSettings(BaseModel):
+    pool: PoolSettings = PoolSettings()
+
+
+class Schema(BaseModel):
+    DB: DbSettings = DbSettings()
+
+
+CONFIG = {'DB': {'pool_size': 5, 'debug': False, 'ratio': 0.5,
+                 'hosts': ['a'], 'name': 'db', 'extra': None},
+          'TIMEOUT': 10}
+
+
+def test_read_env_overrides():
+    """
+    GIVEN prefixed environment variables naming nested settings
+    WHEN the overrides are read
+    THEN keys are matched without regard to case
+    AND values are converted to the type of the setting they replace
+    AND variables without the prefix are ignored
+    """
+    environ = {'SCAFFOLD__DB__POOL_SIZE': '20',
+               'SCAFFOLD__DB__DEBUG': 'yes',
+               'SCAFFOLD__DB__RATIO': '0.25',
+               'SCAFFOLD__DB__HOSTS': '["b", "c"]',
+               'SCAFFOLD__DB__EXTRA': '1',
+               'SCAFFOLD__DB__NEW__KEY': '2',
+               'SCAFFOLD__TIMEOUT': '30',
+               'SCAFFOLD__NEW': 'value',
+               'OTHER__TIMEOUT': '1',
+               'SCAFFOLDTIMEOUT': '1'}
+    assert read_env_overrides('SCAFFOLD', CONFIG, environ=environ) == {
+        'DB': {'pool_size': 20, 'debug': True, 'ratio': 0.25,
+               'hosts': ['b', 'c'], 'extra': '1', 'NEW': {'KEY': '2'}},
+        'TIMEOUT': 30, 'NEW': 'value'}
+
+
+@pytest.mark.parametrize('environ', [
+    {'SCAFFOLD__TIMEOUT': 'soon'},
+    {'SCAFFOLD__DB__DEBUG': 'maybe'},
+    {'SCAFFOLD__DB__HOSTS': '{"a": 1}'},
+    {'SCAFFOLD__DB____X': '1'},
+    {'SCAFFOLD__TIMEOUT': '1', 'SCAFFOLD__TIMEOUT__X': '1'},
+])
+def test_invalid_env_overrides(environ):
+    """
+    GIVEN an environment variable that can not be applied
+    WHEN the overrides are read
+    THEN a ValueError is raised
+    """
+    with pytest.raises(ValueError):
+        read_env_overrides('SCAFFOLD', CONFIG, environ=environ)
+
+
+def test_env_overrides_with_schema():
+    """
+    GIVEN a pydantic schema
+    WHEN overrides are read for settings that are not in the config
+    THEN the values are converted to the type of the schema's fields
+    AND values that do not match the schema are rejected
+    """
+    environ = {'APP__DB__POOL__SIZE': '20', 'APP__DB__POOL__HOSTS': '["a"]'}
+    assert read_env_overrides('APP', {}, Schema, environ) == {
+        'DB': {'pool': {'size': 20, 'hosts': ['a']}}}
+    with pytest.raises(ValueError, match='APP__DB__POOL__SIZE'):
+        read_env_overrides('APP', {}, Schema, {'APP__DB__POOL__SIZE': 'x'})
+
+
+def test_merge_overrides():
+    """
+    GIVEN overrides of nested settings
+    WHEN they are merged into a config
+    THEN only the overridden settings change
+    AND the original nested values are not modified
+    """
+    nested = {'pool_size': 5, 'name': 'db'}
+    config = {'DB': nested, 'TIMEOUT': 10}
+    merge_overrides(config, {'DB': {'pool_size': 20}, 'NEW': 1})
+    assert config == {'DB': {'pool_size': 20, 'name': 'db'},
+                      'TIMEOUT': 10, 'NEW': 1}
+    assert nested['pool_size'] == 5
+
+
+def test_scaffold_env_overrides(tmp_path, monkeypatch):
+    """
+    GIVEN SCAFFOLD_ENV_PREFIX and a custom settings file
+    WHEN a scaffold is created with override variables set
+    THEN the overrides are applied on top of the file
+    AND are applied again when the file is reloaded
+    """
+    path = tmp_path / 'custom.yml'
+    path.write_text('DB:\n  pool_size: 5\n  name: one\n')
+    monkeypatch.setenv('MYAPP__DB__POOL_SIZE', '20')
+    scaffold = AppScaffold(config={'SCAFFOLD_ENV_PREFIX': 'MYAPP',
+                                   'SCAFFOLD_FROZEN_SETTINGS': True,
+                                   'CUSTOM_SETTINGS': str(path)})
+    assert scaffold.app.config['DB'] == {'pool_size': 20, 'name': 'one'}
+    watcher = SettingsWatcher(scaffold.configurator)
+    watcher._record_states()
+    stat = os.stat(path)
+    path.write_text('DB:\n  pool_size: 5\n  name: two\n')
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000))
+    watcher.check()
+    assert scaffold.app.config['DB'] == {'pool_size': 20, 'name': 'two'}
+    assert scaffold.settings.DB.pool_size == 20
+
+
+def test_env_overrides_invalidate_snapshot(mock_instance_folder, tmp_path,
+                                           monkeypatch):
+    """
+    GIVEN a snapshot written with an override variable set
+    WHEN the variable changes
+    THEN the snapshot is not used, and the new value is applied
+    """
+    monkeypatch.setenv('SCAFFOLD_ENV_PREFIX', 'MYAPP')
+    monkeypatch.setenv('MYAPP__RANDOM_VAL', 'one')
+    path = str(tmp_path / 'config.snapshot')
+    AppScaffold(
+        instance_path=mock_instance_folder).write_config_snapshot(path)
+    monkeypatch.setenv('SCAFFOLD_CONFIG_SNAPSHOT', path)
+    loaded = []
+    read_snapshot = snapshot.read_snapshot
+    monkeypatch.setattr(snapshot, 'read_snapshot', lambda *args: loaded.append(
+        read_snapshot(*args)) or loaded[-1])
+    assert AppScaffold(instance_path=mock_instance_folder)
+    assert loaded[-1] is not None
+    monkeypatch.setenv('MYAPP__RANDOM_VAL', 'two')
+    scaffold = AppScaffold(instance_path=mock_instance_folder)
+    assert loaded[-1] is None
+    assert scaffold.app.config['RANDOM_VAL'] == 'two'
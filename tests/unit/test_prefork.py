@@ -0,0 +1,151 @@
+import gc
+import logging
+import os
+from typing import List
+
+import pytest
+
+from flask_container_scaffold import prefork
+from flask_container_scaffold.app_scaffold import AppScaffold
+from flask_container_scaffold.base import BaseApiView
+from flask_container_scaffold.celery_scaffold import CeleryScaffold
+from flask_container_scaffold.logging import setup_queued_logging
+from flask_container_scaffold.validation import get_validator
+
+requires_fork = pytest.mark.skipif(not hasattr(os, 'register_at_fork'),
+                                   reason='requires os.register_at_fork')
+
+
+class PreloadedView(BaseApiView):
+    name: str
+
+
+class PreloadedChild(PreloadedView):
+    count: int
+
+
+@pytest.fixture
+def unfreeze():
+    yield
+    gc.unfreeze()
+
+
+def test_finalize_warms_validators_and_freezes(unfreeze):
+    """
+    GIVEN a scaffold and some BaseApiView subclasses
+    WHEN it is finalized with an extra model
+    THEN validators are built for every subclass and the extra model
+    AND the objects built so far are frozen
+    """
+    get_validator.cache_clear()
+    scaffold = AppScaffold()
+
+    assert scaffold.finalize(models=[List[PreloadedView]]) is scaffold
+
+    warmed = get_validator.cache_info().currsize
+    get_validator(PreloadedView)
+    get_validator(PreloadedChild)
+    get_validator(List[PreloadedView])
+    assert get_validator.cache_info().currsize == warmed
+    assert gc.get_freeze_count() > 0
+
+
+def test_finalize_without_freeze():
+    """
+    GIVEN a scaffold
+    WHEN it is finalized with freeze=False
+    THEN nothing is frozen
+    """
+    gc.unfreeze()
+    AppScaffold().finalize(freeze=False)
+    assert gc.get_freeze_count() == 0
+
+
+def test_finalize_twice(monkeypatch):
+    """
+    GIVEN a finalized scaffold
+    WHEN it is finalized again
+    THEN its after fork hook is only registered and frozen once
+    """
+    registered = []
+    frozen = []
+    monkeypatch.setattr(prefork, 'register_after_fork', registered.append)
+    monkeypatch.setattr(prefork, 'freeze', lambda: frozen.append(True))
+    scaffold = AppScaffold()
+
+    scaffold.finalize()
+    scaffold.finalize(models=[List[PreloadedChild]])
+
+    assert registered == [scaffold._after_fork]
+    assert frozen == [True]
+
+
+def test_after_fork_callback_errors_are_logged(caplog, monkeypatch):
+    """
+    GIVEN an after fork callback that fails
+    WHEN the callbacks are run
+    THEN the error is logged and the other callbacks still run
+    """
+    called = []
+
+    def broken():
+        raise RuntimeError('boom')
+
+    monkeypatch.setattr(prefork, '_after_fork_callbacks',
+                        [broken, lambda: called.append(True)])
+    prefork.run_after_fork()
+    assert called == [True]
+    assert 'boom' in caplog.text
+
+
+def test_celery_after_fork(monkeypatch):
+    """
+    GIVEN a finalized CeleryScaffold
+    WHEN a worker is forked
+    THEN the celery app resets its connection pools
+    """
+    scaffold = CeleryScaffold()
+    calls = []
+    monkeypatch.setattr(scaffold.celery_app, '_after_fork',
+                        lambda: calls.append(True))
+    scaffold._after_fork()
+    assert calls == [True]
+
+
+@requires_fork
+def test_forked_worker_restarts_logging_and_watcher(tmp_path):
+    """
+    GIVEN a finalized scaffold watching its settings, and queued logging
+    WHEN the process forks
+    THEN the child logs through a listener thread of its own
+    AND its settings watcher is running
+    """
+    settings = tmp_path / 'settings.yml'
+    settings.write_text('key: value\n')
+    log_file = tmp_path / 'child.log'
+    logger = logging.getLogger('test.prefork')
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.addHandler(logging.FileHandler(log_file))
+    listener = setup_queued_logging(logger=logger)
+    scaffold = AppScaffold(config={'CUSTOM_SETTINGS': str(settings)})
+    scaffold.watch_custom_settings(interval=0.01, use_inotify=False)
+    scaffold.finalize(freeze=False)
+    try:
+        pid = os.fork()
+        if pid == 0:
+            status = 1
+            try:
+                logger.info('from the child')
+                listener.stop()
+                if scaffold.settings_watcher.running:
+                    status = 0
+            finally:
+                os._exit(status)
+        _, status = os.waitpid(pid, 0)
+    finally:
+        scaffold.settings_watcher.stop()
+        listener.stop()
+
+    assert os.waitstatus_to_exitcode(status) == 0
+    assert log_file.read_text() == 'from the child\n'
@@ -0,0 +1,143 @@
+import datetime
+import json
+from typing import Optional
+
+from flask import Flask, request
+
+from flask_container_scaffold import (json_array_response, json_response,
+                                      ndjson_response)
+from flask_container_scaffold.base import BaseApiView
+
+
+class Thing(BaseApiView):
+    name: str
+    made: datetime.date
+    note: Optional[str] = None
+
+
+THING = Thing(name='thing', made=datetime.date(2024, 1, 2))
+
+
+def test_json_response():
+    """
+    GIVEN a BaseApiView model
+    WHEN it is returned with json_response
+    THEN the body is the model's JSON, with its length and type set
+    """
+    app = Flask('test')
+    app.add_url_rule('/', 'thing', lambda: json_response(
+        THING, status=201, headers={'X-Thing': '1'}, exclude_none=True))
+
+    response = app.test_client().get('/')
+
+    assert response.status_code == 201
+    assert response.mimetype == 'application/json'
+    assert response.headers['X-Thing'] == '1'
+    assert response.content_length == len(response.data)
+    assert response.json == {'errors': {}, 'msg': '', 'name': 'thing',
+                             'made': '2024-01-02'}
+
+
+def test_json_array_response():
+    """
+    GIVEN a generator of models and plain values
+    WHEN it is returned with json_array_response
+    THEN a streamed JSON array of every item is sent
+    """
+    def items():
+        yield THING
+        yield {'plain': 1}
+        yield THING
+
+    app = Flask('test')
+    app.add_url_rule('/', 'things', lambda: json_array_response(items()))
+
+    response = app.test_client().get('/')
+
+    assert response.is_streamed
+    assert response.mimetype == 'application/json'
+    assert json.loads(response.data) == [
+        THING.model_dump(mode='json'), {'plain': 1},
+        THING.model_dump(mode='json')]
+
+
+def test_json_array_response_empty():
+    """
+    GIVEN no items
+    WHEN they are returned with json_array_response
+    THEN an empty JSON array is sent
+    """
+    app = Flask('test')
+    app.add_url_rule('/', 'things', lambda: json_array_response([]))
+
+    assert app.test_client().get('/').data == b'[]'
+
+
+def test_json_array_response_envelope():
+    """
+    GIVEN items and a callable envelope
+    WHEN they are returned with json_array_response
+    THEN the items are sent in an object, followed by the envelope's fields
+    AND the envelope is built after every item was produced
+    """
+    seen = []
+
+    def items():
+        for i in range(3):
+            seen.append(i)
+            yield {'i': i}
+
+    def envelope():
+        return BaseApiView(msg=f'{len(seen)} items')
+
+    app = Flask('test')
+    app.add_url_rule('/', 'things', lambda: json_array_response(
+        items(), envelope=envelope, items_key='things'))
+
+    response = app.test_client().get('/')
+
+    assert json.loads(response.data) == {
+        'things': [{'i': 0}, {'i': 1}, {'i': 2}], 'errors': {},
+        'msg': '3 items'}
+
+
+def test_ndjson_response():
+    """
+    GIVEN items and an envelope
+    WHEN they are returned with ndjson_response
+    THEN each item is sent on its own line, with the envelope last
+    """
+    app = Flask('test')
+    app.add_url_rule('/', 'things', lambda: ndjson_response(
+        (THING for _ in range(2)), envelope=BaseApiView(msg='done'),
+        exclude_none=True))
+
+    response = app.test_client().get('/')
+
+    assert response.is_streamed
+    assert response.mimetype == 'application/x-ndjson'
+    lines = response.data.decode().splitlines()
+    assert [json.loads(line) for line in lines] == [
+        THING.model_dump(mode='json', exclude_none=True),
+        THING.model_dump(mode='json', exclude_none=True),
+        {'errors': {}, 'msg': 'done'}]
+
+
+def test_ndjson_response_envelope_first():
+    """
+    GIVEN an envelope to send first
+    WHEN items are returned with ndjson_response
+    THEN the envelope is the first line
+    AND the items generator can still use the request context
+    """
+    def items():
+        yield {'path': request.path}
+
+    app = Flask('test')
+    app.add_url_rule('/things', 'things', lambda: ndjson_response(
+        items(), envelope=BaseApiView(msg='start'), envelope_first=True))
+
+    response = app.test_client().get('/things')
+
+    assert response.data == (b'{"errors":{},"msg":"start"}\n'
+                             b'{"path":"/things"}\n')
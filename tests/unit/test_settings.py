@@ -0,0 +1,154 @@
+import os
+import pickle
+import threading
+
+import pytest
+from pydantic import BaseModel, ConfigDict, ValidationError
+
+from flask_container_scaffold.app_scaffold import AppScaffold
+from flask_container_scaffold.settings import (FrozenSettings,
+                                               freeze_settings, get_settings)
+from flask_container_scaffold.watcher import SettingsWatcher
+
+
+class DatabaseSettings(BaseModel):
+    model_config = ConfigDict(frozen=True)
+    host: str
+    pool_size: int = 5
+
+
+class AppSettings(BaseModel):
+    model_config = ConfigDict(frozen=True)
+    DB: DatabaseSettings
+
+
+def test_freeze_settings():
+    """
+    GIVEN nested settings with lists, sets and awkward keys
+    WHEN they are frozen
+    THEN values are available as attributes and by item access
+    AND containers are converted to immutable ones
+    AND to_dict returns the original values
+    """
+    original = {'DB': {'pool': {'size': 20}, 'hosts': ['a', 'b']},
+                'tags': {'x'}, 'my-key': 1, 'keys': 2, '__dunder': 3}
+    settings = freeze_settings(original)
+    assert isinstance(settings, FrozenSettings)
+    assert settings.DB.pool.size == 20
+    assert settings['DB']['pool']['size'] == 20
+    assert settings.DB.hosts == ('a', 'b')
+    assert settings.tags == frozenset({'x'})
+    assert settings['my-key'] == 1
+    assert settings['keys'] == 2
+    assert settings['__dunder'] == 3
+    assert set(settings.keys()) == set(original)
+    assert 'DB' in settings and len(settings) == len(original)
+    assert settings.get('missing', 'default') == 'default'
+    assert settings.to_dict() == original
+    with pytest.raises(AttributeError):
+        settings.missing
+
+
+def test_frozen_settings_are_read_only():
+    """
+    GIVEN frozen settings
+    WHEN they are modified
+    THEN an error is raised
+    AND the classes of mappings with the same keys are shared
+    """
+    settings = freeze_settings({'a': {'b': 1}, 'c': {'b': 2}})
+    with pytest.raises(AttributeError):
+        settings.a = 2
+    with pytest.raises(AttributeError):
+        del settings.a
+    with pytest.raises(TypeError):
+        settings['a'] = 2
+    with pytest.raises(AttributeError):
+        settings.a.new = 1
+    assert type(settings.a) is type(settings.c)
+
+
+def test_frozen_settings_pickle():
+    """
+    GIVEN frozen settings
+    WHEN they are pickled and unpickled, eg. to send to a worker process
+    THEN an equal FrozenSettings is returned
+    """
+    settings = freeze_settings({'a': {'b': [1, 2]}})
+    assert pickle.loads(pickle.dumps(settings)) == settings
+
+
+def test_scaffold_frozen_settings():
+    """
+    GIVEN SCAFFOLD_FROZEN_SETTINGS is set
+    WHEN a scaffold is created
+    THEN the merged config is available as read only settings
+    """
+    scaffold = AppScaffold(config={'SCAFFOLD_FROZEN_SETTINGS': True,
+                                   'DB': {'pool': {'size': 20}}})
+    assert scaffold.settings.DB.pool.size == 20
+    assert scaffold.settings.SCAFFOLD_FROZEN_SETTINGS is True
+    with scaffold.app.app_context():
+        assert get_settings() is scaffold.settings
+    assert AppScaffold().settings is None
+
+
+def test_scaffold_settings_schema():
+    """
+    GIVEN SCAFFOLD_SETTINGS_SCHEMA names a pydantic model
+    WHEN a scaffold is created with a config that matches it
+    THEN the settings are an instance of the model
+    AND a config that does not match fails at startup
+    """
+    schema = f'{__name__}:AppSettings'
+    scaffold = AppScaffold(config={'SCAFFOLD_SETTINGS_SCHEMA': schema,
+                                   'DB': {'host': 'db'}})
+    assert scaffold.settings == AppSettings(DB={'host': 'db'})
+    assert scaffold.settings.DB.pool_size == 5
+    with pytest.raises(ValidationError):
+        AppScaffold(config={'SCAFFOLD_SETTINGS_SCHEMA': AppSettings,
+                            'DB': {'pool_size': 'many'}})
+
+
+def test_settings_rebuilt_on_reload(tmp_path):
+    """
+    GIVEN a scaffold with frozen settings and a custom settings file
+    WHEN the file changes and is reloaded
+    THEN the settings are rebuilt from the new values
+    AND a reload that fails the schema keeps the previous settings
+    """
+    path = tmp_path / 'custom.yml'
+    path.write_text('DB:\n  host: one\n')
+    scaffold = AppScaffold(config={'SCAFFOLD_SETTINGS_SCHEMA': AppSettings,
+                                   'CUSTOM_SETTINGS': str(path)})
+    watcher = SettingsWatcher(scaffold.configurator)
+    watcher._record_states()
+    for content, expected in (('DB:\n  host: two\n', 'two'),
+                              ('DB:\n  pool_size: many\n', 'two')):
+        stat = os.stat(path)
+        path.write_text(content)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000))
+        watcher.check()
+        assert scaffold.settings.DB.host == expected
+        assert scaffold.app.extensions['scaffold_settings'].DB.host == (
+            expected)
+
+
+def test_frozen_settings_shared_between_threads():
+    """
+    GIVEN frozen settings
+    WHEN many threads read them at once
+    THEN every thread sees the same values
+    """
+    settings = freeze_settings({'a': {'b': {'c': 1}}})
+    results = []
+
+    def read():
+        results.append(sum(settings.a.b.c for _ in range(1000)))
+
+    threads = [threading.Thread(target=read) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [1000] * 8
@@ -0,0 +1,165 @@
+import datetime
+import os
+import shutil
+
+import pytest
+from click.testing import CliRunner
+
+from flask_container_scaffold.app_configurator import AppConfigurator
+from flask_container_scaffold.app_scaffold import AppScaffold
+from flask_container_scaffold.cli import main
+from flask_container_scaffold.snapshot import SnapshotError
+
+
+@pytest.fixture
+def instance_folder(mock_instance_folder, tmp_path):
+    folder = tmp_path / 'instance'
+    shutil.copytree(mock_instance_folder, str(folder))
+    return str(folder)
+
+
+@pytest.fixture
+def snapshot_path(instance_folder, monkeypatch):
+    """
+    A snapshot of the scaffold config for instance_folder, which new
+    scaffolds will try to load.
+    """
+    path = os.path.join(instance_folder, 'config.snapshot')
+    AppScaffold(instance_path=instance_folder).write_config_snapshot(path)
+    monkeypatch.setenv('SCAFFOLD_CONFIG_SNAPSHOT', path)
+    return path
+
+
+def _forbid_parsing(monkeypatch):
+    """
+    Make any attempt to read a custom settings file fail.
+    """
+    def fail(*args):
+        raise AssertionError('custom settings were parsed')
+    monkeypatch.setattr(AppConfigurator, '_read_file', fail)
+
+
+def test_loads_valid_snapshot(instance_folder, snapshot_path, monkeypatch):
+    """
+    GIVEN a snapshot of a scaffold's configuration
+    WHEN we create the scaffold again with SCAFFOLD_CONFIG_SNAPSHOT set
+    THEN the configuration is loaded from the snapshot without parsing
+    AND the loaded files are still known, so they can be watched
+    """
+    _forbid_parsing(monkeypatch)
+    scaffold = AppScaffold(instance_path=instance_folder)
+    assert scaffold.app.config['RANDOM_VAL'] == 'farkle'
+    assert scaffold.app.config['default_params']['a_list'] == ['list value']
+    assert scaffold.app.config['CUSTOM_SETTINGS'] == 'instance/config.yml'
+    custom = os.path.join(instance_folder, 'config.yml')
+    assert list(scaffold.configurator.loaded_files) == [custom]
+
+
+def test_mapping_is_applied_with_snapshot(instance_folder, monkeypatch):
+    """
+    GIVEN a snapshot of a scaffold created with a config mapping
+    WHEN we create the scaffold again with the same mapping
+    THEN the values from the mapping and the files are all set
+    """
+    config = {'TESTING': True, 'OBJECT': object}
+    path = os.path.join(instance_folder, 'config.snapshot')
+    AppScaffold(config=config,
+                instance_path=instance_folder).write_config_snapshot(path)
+    _forbid_parsing(monkeypatch)
+    monkeypatch.setenv('SCAFFOLD_CONFIG_SNAPSHOT', path)
+    scaffold = AppScaffold(config=config, instance_path=instance_folder)
+    assert scaffold.app.config['TESTING'] is True
+    assert scaffold.app.config['OBJECT'] is object
+    assert scaffold.app.config['default_params']['key_two'] == 3
+
+
+@pytest.mark.parametrize('changed_file', ['settings.cfg', 'config.yml'])
+def test_changed_source_invalidates(instance_folder, snapshot_path,
+                                    changed_file):
+    """
+    GIVEN a snapshot of a scaffold's configuration
+    WHEN one of the files it was built from changes
+    THEN the snapshot is ignored and the files are parsed
+    """
+    with open(os.path.join(instance_folder, changed_file), 'a') as handle:
+        handle.write('\nRANDOM_VAL="changed"\n' if changed_file.endswith('cfg')
+                     else 'new_key: 1\n')
+    scaffold = AppScaffold(instance_path=instance_folder)
+    if changed_file == 'settings.cfg':
+        assert scaffold.app.config['RANDOM_VAL'] == 'changed'
+    else:
+        assert scaffold.app.config['new_key'] == 1
+
+
+def test_changed_inputs_invalidate(instance_folder, snapshot_path,
+                                   mock_extra_settings_file, monkeypatch):
+    """
+    GIVEN a snapshot of a scaffold's configuration
+    WHEN FLASK_SETTINGS is set, which it was not when the snapshot was built
+    THEN the snapshot is ignored and the files are parsed
+    """
+    monkeypatch.setenv('FLASK_SETTINGS', mock_extra_settings_file)
+    scaffold = AppScaffold(instance_path=instance_folder)
+    assert scaffold.app.config['RANDOM_VAL'] == 'baz'
+
+
+def test_corrupt_snapshot_ignored(instance_folder, snapshot_path):
+    """
+    GIVEN a snapshot file that has been corrupted
+    WHEN we create the scaffold
+    THEN the snapshot is ignored and the files are parsed
+    """
+    with open(snapshot_path, 'r+b') as handle:
+        handle.seek(-1, os.SEEK_END)
+        handle.write(b'\x00')
+    scaffold = AppScaffold(instance_path=instance_folder)
+    assert scaffold.app.config['RANDOM_VAL'] == 'farkle'
+
+
+def test_unmarshallable_value(tmp_path):
+    """
+    GIVEN a configuration containing a value marshal can not store
+    WHEN we write a snapshot
+    THEN it raises a SnapshotError naming the key
+    """
+    custom = tmp_path / 'custom.yml'
+    custom.write_text('released: 2024-01-01\n')
+    scaffold = AppScaffold(config={'CUSTOM_SETTINGS': str(custom)})
+    assert scaffold.app.config['released'] == datetime.date(2024, 1, 1)
+    with pytest.raises(SnapshotError, match="'released'"):
+        scaffold.write_config_snapshot(str(tmp_path / 'config.snapshot'))
+
+
+def test_compile_config_cli(instance_folder, monkeypatch):
+    """
+    GIVEN an instance folder
+    WHEN we run flask-scaffold compile-config against it
+    THEN a snapshot is written to the instance folder
+    AND a scaffold for that instance folder loads it
+    """
+    result = CliRunner().invoke(main, ['compile-config', '--instance-path',
+                                       instance_folder])
+    assert result.exit_code == 0, result.output
+    path = os.path.join(instance_folder, 'config.snapshot')
+    assert os.path.exists(path)
+    _forbid_parsing(monkeypatch)
+    monkeypatch.setenv('SCAFFOLD_CONFIG_SNAPSHOT', path)
+    scaffold = AppScaffold(instance_path=instance_folder)
+    assert scaffold.app.config['default_params']['a_key'] == 'some value'
+
+
+def test_compile_config_cli_error(tmp_path, monkeypatch):
+    """
+    GIVEN custom settings with a value that can not be stored in a snapshot
+    WHEN we run flask-scaffold compile-config
+    THEN it exits with an error message, not a traceback
+    """
+    custom = tmp_path / 'custom.yml'
+    custom.write_text('released: 2024-01-01\n')
+    monkeypatch.setenv('CUSTOM_SETTINGS', str(custom))
+    result = CliRunner().invoke(main, ['compile-config', '--instance-path',
+                                       str(tmp_path)])
+    assert result.exit_code == 1
+    assert "Error: Config value for 'released'" in result.output
+    assert result.exception is None or isinstance(result.exception,
+                                                  SystemExit)
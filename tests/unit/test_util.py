@@ -1,9 +1,23 @@
+import asyncio
 import configparser
+import datetime
+import io
+import logging
+import threading
+import uuid
+from typing import List
 
 import pytest
+from flask import request
+from pydantic import BaseModel, ConfigDict, TypeAdapter
+from pydantic_core import from_json
 
 from flask_container_scaffold.base import BaseApiView
-from flask_container_scaffold.util import load_cfg, parse_input
+from flask_container_scaffold import validation
+from flask_container_scaffold.validation import get_failure_counts, model_name
+from flask_container_scaffold.util import (get_validator, load_cfg,
+                                           load_yaml, parse_body, parse_input,
+                                           parse_input_async)
 
 
 def test_valid_cfg_file(mock_custom_only_extra_cfg):
@@ -28,6 +42,70 @@ def test_invalid_cfg_file(mock_extra_settings_file):
         load_cfg(mock_extra_settings_file)
 
 
+def test_cfg_defaults_are_inherited(tmp_path):
+    """
+    GIVEN a cfg file with a DEFAULT section
+    WHEN we load it
+    THEN every section includes the defaults it does not override
+    AND keys keep their case
+    AND values are interpolated
+    """
+    cfg = tmp_path / 'defaults.cfg'
+    cfg.write_text('[DEFAULT]\nShared = base\nother = x\n'
+                   '[one]\nkey = 1\npath = %(Shared)s/%(other)s\n'
+                   '[two]\nother = y\npercent = 100%%\n')
+    assert load_cfg(str(cfg)) == {
+        'one': {'key': '1', 'path': 'base/x', 'Shared': 'base',
+                'other': 'x'},
+        'two': {'other': 'y', 'percent': '100%', 'Shared': 'base'}}
+
+
+@pytest.mark.parametrize('c_loader', [True, False],
+                         ids=['libyaml', 'pure_python'])
+def test_load_yaml_loaders(c_loader, tmp_path, monkeypatch):
+    """
+    GIVEN a yaml file
+    WHEN we load it with or without libyaml available
+    THEN we get back the same python dict
+    """
+    import yaml
+
+    if not c_loader:
+        monkeypatch.delattr(yaml, 'CSafeLoader', raising=False)
+    path = tmp_path / 'config.yml'
+    path.write_text('---\nsection:\n  key: ünïcode\n  list: [1, 2]\n',
+                    encoding='utf-8')
+    assert load_yaml(str(path)) == {'section': {'key': 'ünïcode',
+                                                'list': [1, 2]}}
+
+
+def test_load_invalid_yaml(tmp_path, caplog):
+    """
+    GIVEN a file that is not valid yaml
+    WHEN we load it
+    THEN we get back an empty dict
+    AND the position of the error is logged
+    """
+    path = tmp_path / 'bad.yml'
+    path.write_text('key: [unclosed\n')
+    logger = logging.getLogger('test.yaml')
+    assert load_yaml(str(path), logger=logger) == {}
+    assert caplog.records[-1].getMessage().startswith('Yaml Error at:')
+
+
+def test_load_invalid_yaml_default_logger(tmp_path, caplog, capsys):
+    """
+    GIVEN a file that is not valid yaml
+    WHEN we load it without a logger
+    THEN the error is logged by the util module, not printed
+    """
+    path = tmp_path / 'bad.yml'
+    path.write_text('key: [unclosed\n')
+    assert load_yaml(str(path)) == {}
+    assert caplog.records[-1].name == 'flask_container_scaffold.util'
+    assert capsys.readouterr().out == ''
+
+
 class FakeApiModelExtension(BaseApiView):
     code: int = 1
 
@@ -43,6 +121,12 @@ class FakeModel2(FakeApiModelExtension):
     status: str
 
 
+class StrictModel(BaseModel):
+    model_config = ConfigDict(strict=True)
+    when: datetime.datetime
+    id: uuid.UUID
+
+
 class TestParseInput:
 
     def test_no_data(self, app):
@@ -97,3 +181,341 @@ class TestParseInput:
             assert retval.errors == {}
             assert retval.name == 'foo'
             assert isinstance(retval, FakeModel)
+
+    def test_invalid_json_body(self, app):
+        """
+        GIVEN a request with a json content type but a malformed body
+        WHEN we call parse_input on that request
+        THEN we get a BaseApiView returned
+        AND the error is reported against the whole body
+        """
+        with app.test_request_context(data='{"name": ',
+                                      content_type='application/json'):
+            retval = parse_input(app.logger, FakeModel)
+            assert retval.msg == "Errors detected: 1"
+            assert '__root__' in retval.errors
+            assert isinstance(retval, BaseApiView)
+
+    def test_query_string_coercion(self, app):
+        """
+        GIVEN a request with a query string containing a numeric value
+        WHEN we call parse_input on that request
+        THEN the value is coerced to the type declared on the model
+        """
+        with app.test_request_context(query_string='name=foo&code=5'):
+            retval = parse_input(app.logger, FakeModel)
+            assert retval.code == 5
+            assert retval.name == 'foo'
+
+
+class TestParseInputAsync:
+
+    @pytest.mark.parametrize("context_kwargs",
+                             [{'json': {'name': 'foo'}},
+                              {'query_string': 'name=foo'},
+                              {'data': {'name': 'foo'}}])
+    def test_parses_input(self, context_kwargs, app):
+        """
+        GIVEN a request with json, a query string or form data
+        WHEN we await parse_input_async on that request
+        THEN we get a populated object returned, of the type requested
+        """
+        with app.test_request_context(**context_kwargs):
+            retval = asyncio.run(parse_input_async(app.logger, FakeModel))
+            assert retval.name == 'foo'
+            assert isinstance(retval, FakeModel)
+
+    @pytest.mark.parametrize("offload_size", [0, None])
+    def test_same_errors_as_parse_input(self, offload_size, app):
+        """
+        GIVEN an invalid json body
+        WHEN we await parse_input_async, validating in a thread or not
+        THEN the result is the same as parse_input's
+        """
+        with app.test_request_context(json={'code': 'x'}):
+            expected = parse_input(app.logger, FakeModel,
+                                   FakeApiModelExtension)
+            retval = asyncio.run(parse_input_async(
+                app.logger, FakeModel, FakeApiModelExtension,
+                offload_size=offload_size))
+            assert retval == expected
+            assert retval.errors == {'code': expected.errors['code'],
+                                     'name': 'Field required'}
+
+    def test_offloads_large_bodies(self, app, monkeypatch):
+        """
+        GIVEN a json body larger than SCAFFOLD_ASYNC_OFFLOAD_SIZE
+        WHEN we await parse_input_async
+        THEN the body is validated outside of the event loop's thread
+        """
+        threads = []
+        validate = validation._validate_input
+
+        def record_thread(*args):
+            threads.append(threading.current_thread())
+            return validate(*args)
+
+        monkeypatch.setattr(validation, '_validate_input', record_thread)
+        app.config['SCAFFOLD_ASYNC_OFFLOAD_SIZE'] = 10
+        with app.test_request_context(json={'name': 'x' * 100}):
+            retval = asyncio.run(parse_input_async(app.logger, FakeModel))
+        assert retval.name == 'x' * 100
+        assert threads and threads[0] is not threading.current_thread()
+
+    def test_offload_size_positional(self, app, monkeypatch):
+        """
+        GIVEN offload_size passed positionally, after default_return
+        WHEN we await parse_input_async
+        THEN it is used as the offload size
+        """
+        threads = []
+        validate = validation._validate_input
+
+        def record_thread(*args):
+            threads.append(threading.current_thread())
+            return validate(*args)
+
+        monkeypatch.setattr(validation, '_validate_input', record_thread)
+        with app.test_request_context(json={'name': 'x' * 100}):
+            retval = asyncio.run(parse_input_async(
+                app.logger, FakeModel, FakeApiModelExtension, 10))
+        assert retval.name == 'x' * 100
+        assert threads[0] is not threading.current_thread()
+
+
+class TestParseInputBatch:
+
+    def test_parses_array(self, app):
+        """
+        GIVEN a request with a json array of items
+        WHEN we call parse_input with a list type
+        THEN we get a list of populated objects
+        """
+        with app.test_request_context(json=[{'name': 'a'}, {'name': 'b'}]):
+            retval = parse_input(app.logger, List[FakeModel])
+            assert [item.name for item in retval] == ['a', 'b']
+            assert all(isinstance(item, FakeModel) for item in retval)
+
+    @pytest.mark.parametrize("max_errors", [None, 10])
+    def test_errors_by_index(self, max_errors, app, monkeypatch):
+        """
+        GIVEN a json array with invalid items
+        WHEN we call parse_input with a list type, in one call or in chunks
+        THEN the errors are grouped by item index, then field
+        """
+        monkeypatch.setattr(validation, 'BATCH_CHUNK_SIZE', 2)
+        body = [{'name': 'a'}, {}, {'name': 'c'}, 'x', {'code': 'y'}]
+        with app.test_request_context(json=body):
+            retval = parse_input(app.logger, List[FakeModel],
+                                 max_errors=max_errors)
+        assert isinstance(retval, BaseApiView)
+        assert retval.msg == 'Errors detected: 4'
+        assert list(retval.errors) == [1, 3, 4]
+        assert retval.errors[1] == {'name': 'Field required'}
+        assert list(retval.errors[3]) == ['__root__']
+        assert set(retval.errors[4]) == {'code', 'name'}
+
+    def test_stops_at_max_errors(self, app, monkeypatch):
+        """
+        GIVEN a json array where every item is invalid
+        WHEN we call parse_input with a list type and max_errors
+        THEN only max_errors errors are reported
+        AND validation stops after the chunk where the limit was reached
+        """
+        monkeypatch.setattr(validation, 'BATCH_CHUNK_SIZE', 10)
+        chunks = []
+        validator = get_validator(List[FakeModel])
+        original = TypeAdapter.validate_json
+
+        def count_chunks(adapter, data, *args, **kwargs):
+            if adapter is validator:
+                chunks.append(len(from_json(data)))
+            return original(adapter, data, *args, **kwargs)
+
+        monkeypatch.setattr(TypeAdapter, 'validate_json', count_chunks)
+        with app.test_request_context(json=[{}] * 1000):
+            retval = parse_input(app.logger, List[FakeModel], max_errors=15)
+        assert retval.msg == 'Errors detected: 15'
+        assert list(retval.errors) == list(range(15))
+        assert chunks == [10, 10]
+
+    def test_valid_chunks_not_reencoded(self, app, monkeypatch):
+        """
+        GIVEN a json array of valid items for a lax model
+        WHEN we call parse_input with a list type and max_errors
+        THEN the chunks are validated from the parsed items, without
+            encoding them as json again
+        """
+        monkeypatch.setattr(validation, 'BATCH_CHUNK_SIZE', 2)
+        monkeypatch.setattr(validation, 'to_json', None)
+        with app.test_request_context(json=[{'name': 'a'}] * 5):
+            retval = parse_input(app.logger, List[FakeModel], max_errors=1)
+        assert [item.name for item in retval] == ['a'] * 5
+
+    @pytest.mark.parametrize("max_errors", [0, -1])
+    def test_max_errors_must_be_positive(self, max_errors, app):
+        """
+        GIVEN a max_errors less than 1
+        WHEN we call parse_input with it
+        THEN a ValueError is raised rather than a validation failure returned
+        """
+        with app.test_request_context(json=[{'name': 'a'}]):
+            with pytest.raises(ValueError, match='max_errors'):
+                parse_input(app.logger, List[FakeModel],
+                            max_errors=max_errors)
+
+    @pytest.mark.parametrize("max_errors", [None, 10])
+    def test_strict_model_validated_as_json(self, max_errors, app,
+                                            monkeypatch):
+        """
+        GIVEN a strict model with datetime and UUID fields
+        WHEN we call parse_input with a json array of it, with or without
+            max_errors
+        THEN the values are parsed from their json strings either way
+        """
+        monkeypatch.setattr(validation, 'BATCH_CHUNK_SIZE', 2)
+        body = [{'when': '2024-01-02T03:04:05', 'id': str(uuid.UUID(int=n))}
+                for n in range(3)]
+        with app.test_request_context(json=body):
+            retval = parse_input(app.logger, List[StrictModel],
+                                 max_errors=max_errors)
+        assert [item.id for item in retval] == [uuid.UUID(int=n)
+                                                for n in range(3)]
+        assert retval[0].when == datetime.datetime(2024, 1, 2, 3, 4, 5)
+
+    @pytest.mark.parametrize("body,max_errors", [('{"name": ', None),
+                                                 ('{"name": ', 5),
+                                                 ('{"name": "x"}', 5)])
+    def test_not_an_array(self, body, max_errors, app):
+        """
+        GIVEN a request body that is not a valid json array
+        WHEN we call parse_body with a list type
+        THEN the error is reported against the whole body
+        """
+        with app.test_request_context(data=body,
+                                      content_type='application/json'):
+            retval = parse_body(app.logger, List[FakeModel],
+                                max_errors=max_errors)
+        assert list(retval.errors) == ['__root__']
+
+
+class TestValidationErrorModes:
+
+    def test_full_mode_logs_lazily(self, app, caplog):
+        """
+        GIVEN the default error mode
+        WHEN validation fails
+        THEN the full error text is logged, as an argument of the record
+        """
+        with app.test_request_context(json={'code': 'x'}):
+            parse_input(app.logger, FakeModel)
+        record = caplog.records[-1]
+        assert record.msg == "Validation error is: %s"
+        assert 'Field required' in record.getMessage()
+
+    def test_compact_mode(self, app, caplog):
+        """
+        GIVEN SCAFFOLD_VALIDATION_ERRORS is 'compact'
+        AND SCAFFOLD_MAX_RENDERED_ERRORS is set
+        WHEN validation fails with more errors than that
+        THEN only the model and error count are logged
+        AND only the first errors are rendered, with the full count in msg
+        """
+        app.config['SCAFFOLD_VALIDATION_ERRORS'] = 'compact'
+        app.config['SCAFFOLD_MAX_RENDERED_ERRORS'] = 1
+        with app.test_request_context(json={'code': 'x'}):
+            retval = parse_input(app.logger, FakeModel)
+        assert caplog.records[-1].getMessage() == (
+            "Validation of FakeModel failed with 2 errors")
+        assert retval.msg == 'Errors detected: 2'
+        assert list(retval.errors) == ['code']
+
+    def test_failure_counts(self, app):
+        """
+        GIVEN a model
+        WHEN requests fail to validate against it
+        THEN the failures are counted per model
+        """
+        before = get_failure_counts()
+        with app.test_request_context(json={}):
+            parse_input(app.logger, FakeModel2)
+            parse_body(app.logger, FakeModel2)
+            parse_input(app.logger, List[FakeModel2])
+        after = get_failure_counts()
+        assert after['FakeModel2'] - before.get('FakeModel2', 0) == 2
+        assert after[model_name(List[FakeModel2])] == (
+            before.get(model_name(List[FakeModel2]), 0) + 1)
+
+
+def test_validator_is_cached():
+    """
+    GIVEN a pydantic model
+    WHEN we request its validator more than once
+    THEN the same cached validator is returned each time
+    """
+    assert get_validator(FakeModel) is get_validator(FakeModel)
+    assert get_validator(FakeModel) is not get_validator(FakeModel2)
+
+
+class TestParseBody:
+
+    def test_parses_json_body(self, app):
+        """
+        GIVEN a request with a json body
+        WHEN we call parse_body on that request
+        THEN we get a populated object returned, of the type requested
+        AND the body is not cached on the request
+        """
+        with app.test_request_context(json={'name': 'foo'}):
+            retval = parse_body(app.logger, FakeModel)
+            assert retval.name == 'foo'
+            assert isinstance(retval, FakeModel)
+            assert request.get_data() == b''
+
+    def test_validation_failure(self, app):
+        """
+        GIVEN a request with a json body missing a required field
+        WHEN we call parse_body on that request
+        THEN we get a BaseApiView returned with the error populated
+        """
+        with app.test_request_context(json={'code': 3}):
+            retval = parse_body(app.logger, FakeModel)
+            assert retval.errors == {'name': 'Field required'}
+            assert isinstance(retval, BaseApiView)
+
+    def test_rejects_oversized_body(self, app):
+        """
+        GIVEN a request with a body larger than max_length
+        WHEN we call parse_body on that request
+        THEN the body is rejected without being read
+        """
+        with app.test_request_context(json={'name': 'x' * 100}):
+            retval = parse_body(app.logger, FakeModel, max_length=10)
+            assert retval.msg == 'Request body too large'
+            assert '__root__' in retval.errors
+            assert len(request.get_data()) > 10
+
+    def test_rejects_oversized_chunked_body(self, app):
+        """
+        GIVEN a chunked request with no content length
+        AND a body larger than max_length
+        WHEN we call parse_body on that request
+        THEN the body is rejected
+        """
+        with app.test_request_context(
+                input_stream=io.BytesIO(b'{"name": "' + b'x' * 100 + b'"}'),
+                content_type='application/json',
+                environ_overrides={'wsgi.input_terminated': True}):
+            retval = parse_body(app.logger, FakeModel, max_length=10)
+            assert retval.msg == 'Request body too large'
+
+    def test_uses_app_max_content_length(self, app):
+        """
+        GIVEN an app with MAX_CONTENT_LENGTH set
+        WHEN we call parse_body with a body larger than that
+        THEN the body is rejected
+        """
+        app.config['MAX_CONTENT_LENGTH'] = 10
+        with app.test_request_context(json={'name': 'x' * 100}):
+            retval = parse_body(app.logger, FakeModel)
+            assert retval.msg == 'Request body too large'
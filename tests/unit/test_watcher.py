@@ -0,0 +1,138 @@
+import os
+import threading
+
+import pytest
+
+from flask_container_scaffold.app_scaffold import AppScaffold
+from flask_container_scaffold.signals import custom_settings_reloaded
+from flask_container_scaffold.watcher import SettingsWatcher
+
+
+def _rewrite(path, content):
+    """
+    Write new content to path, making sure the mtime changes even on
+    filesystems with coarse timestamps.
+    """
+    stat = os.stat(path)
+    with open(path, 'w') as handle:
+        handle.write(content)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000))
+
+
+@pytest.fixture
+def custom_files(tmp_path):
+    base = tmp_path / 'base.yml'
+    base.write_text("shared: base\nbase_only: one\nremoved: soon\n")
+    override = tmp_path / 'override.yml'
+    override.write_text("shared: override\n")
+    return str(base), str(override)
+
+
+@pytest.fixture
+def scaffold(custom_files):
+    base, override = custom_files
+    return AppScaffold(config={'CUSTOM_SETTINGS': {'a': base,
+                                                   'b': override}})
+
+
+def test_check_reloads_changed_file(scaffold, custom_files):
+    """
+    GIVEN a scaffold with two custom settings files
+    WHEN the first file changes and the watcher checks for changes
+    THEN the keys it owns are updated and removed keys are dropped
+    AND keys overridden by the later file are left alone
+    AND the custom_settings_reloaded signal is sent
+    """
+    base, _ = custom_files
+    received = []
+
+    def receiver(sender, **extra):
+        received.append((sender, extra))
+
+    assert scaffold.settings_watcher is None
+    watcher = SettingsWatcher(scaffold.configurator)
+    watcher._record_states()
+    _rewrite(base, "shared: changed\nbase_only: two\nadded: new\n")
+    with custom_settings_reloaded.connected_to(receiver, scaffold.app):
+        assert watcher.check() == [base]
+    config = scaffold.app.config
+    assert config['base_only'] == 'two'
+    assert config['added'] == 'new'
+    assert config['shared'] == 'override'
+    assert 'removed' not in config
+    assert received == [(scaffold.app,
+                         {'path': base,
+                          'keys': ['added', 'base_only', 'removed']})]
+    assert watcher.check() == []
+
+
+def test_broken_file_keeps_old_config(tmp_path):
+    """
+    GIVEN a scaffold with a custom settings cfg file
+    WHEN the file is replaced with invalid content
+    THEN the existing config is kept
+    """
+    settings = tmp_path / 'settings.cfg'
+    settings.write_text("[section]\nkey=value\n")
+    scaffold = AppScaffold(config={'CUSTOM_SETTINGS': str(settings)})
+    watcher = SettingsWatcher(scaffold.configurator)
+    watcher._record_states()
+    _rewrite(str(settings), "not a cfg file")
+    assert watcher.check() == []
+    assert scaffold.app.config['section'] == {'key': 'value'}
+
+
+def test_broken_yaml_keeps_old_config(scaffold, custom_files):
+    """
+    GIVEN a scaffold with custom settings yaml files
+    WHEN a file is replaced with invalid yaml
+    THEN nothing is reloaded and the existing config is kept
+    """
+    base, _ = custom_files
+    watcher = SettingsWatcher(scaffold.configurator)
+    watcher._record_states()
+    _rewrite(base, "base_only: [unclosed\n")
+    assert watcher.check() == []
+    assert scaffold.app.config['base_only'] == 'one'
+    assert scaffold.app.config['removed'] == 'soon'
+
+
+@pytest.mark.parametrize('use_inotify', [True, False])
+def test_watcher_thread_reloads(custom_files, use_inotify):
+    """
+    GIVEN a scaffold watching its custom settings
+    WHEN a file changes on disk
+    THEN the watcher thread reloads it without being asked
+    """
+    base, override = custom_files
+    scaffold = AppScaffold(config={'CUSTOM_SETTINGS': base})
+    reloaded = threading.Event()
+
+    def receiver(sender, **extra):
+        reloaded.set()
+
+    watcher = scaffold.watch_custom_settings(interval=0.01,
+                                             use_inotify=use_inotify)
+    try:
+        with custom_settings_reloaded.connected_to(receiver, scaffold.app):
+            _rewrite(base, "shared: watched\n")
+            assert reloaded.wait(5)
+    finally:
+        watcher.stop()
+    assert not watcher.running
+    assert scaffold.app.config['shared'] == 'watched'
+
+
+def test_watch_from_config(custom_files):
+    """
+    GIVEN SCAFFOLD_WATCH_SETTINGS is set in the config
+    WHEN we create the scaffold
+    THEN the watcher is started automatically
+    """
+    base, _ = custom_files
+    scaffold = AppScaffold(config={'CUSTOM_SETTINGS': base,
+                                   'SCAFFOLD_WATCH_SETTINGS': True})
+    try:
+        assert scaffold.settings_watcher.running
+    finally:
+        scaffold.settings_watcher.stop()